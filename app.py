@@ -4,22 +4,49 @@ OmniSearch Ultimate Backend - Everything Works Edition 🥔
 Features: ChatGPT proxy, DuckDuckGo AI, Fixed search engines, Advanced bypass
 """
 
-from flask import Flask, request, jsonify, render_template_string, Response
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
+import http_client
+from cache import TTLCache, normalize_query
+from html_backend import parse_html
+from rewriter import rewrite_stream
+from asset_cache import AssetCache
+from page_cache import PageCache
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+import timing
+import compression
+import event_stream
+import circuit
+import latency
+from engine_health import EngineHealth
+import result_model
+from result_model import Result
+from singleflight import SingleFlight
+import singleflight
+from relevance import fuse_rankings, RRF_K
+import contextvars
 import requests
-from bs4 import BeautifulSoup
+import tempfile
 import re
+import functools
+import os
 import random
 import time
-from urllib.parse import urljoin, urlparse, quote, unquote
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+from collections import Counter
+from urllib.parse import urlparse, quote, unquote
 import base64
-import json
 import warnings
 
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 CORS(app)
+app.json.default = functools.partial(result_model.json_default, fallback=app.json.default)
+
+def json_response(payload, status=200):
+    """jsonify(payload), encoded through result_model's fast path"""
+    return Response(result_model.dumps(payload) + '\n', status=status, mimetype='application/json')
 
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
@@ -27,8 +54,174 @@ USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
 ]
 
-def fetch_with_retry(url, timeout=15, retries=2):
-    """Fetch with protocol switching and retries"""
+# Per-request budget for /api/search (seconds). The instant answer and the
+# engine scrape run side by side and both are bounded by the deadline.
+# INSTANT_ANSWER_GRACE (unset by default) also caps how long the instant
+# answer may keep results that are already in waiting.
+SEARCH_DEADLINE = float(os.environ.get('SEARCH_DEADLINE', '12'))
+INSTANT_ANSWER_GRACE = float(os.environ['INSTANT_ANSWER_GRACE']) if os.environ.get('INSTANT_ANSWER_GRACE') else None
+
+def instant_answer_wait(deadline, results_done_at, now):
+    """Seconds left for the instant answer once results came in at `results_done_at`"""
+    remaining = deadline - now
+    if INSTANT_ANSWER_GRACE is not None:
+        remaining = min(remaining, results_done_at + INSTANT_ANSWER_GRACE - now)
+    return max(0, remaining)
+
+# engine=all (or a comma list) queries several engines under the same
+# deadline and merges their lists with reciprocal rank fusion
+FUSION_RRF_K = int(os.environ.get('FUSION_RRF_K', str(RRF_K)))
+
+search_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('SEARCH_WORKERS', '16')))
+
+# Streaming passthrough for non-HTML proxy responses
+PROXY_CHUNK_SIZE = 64 * 1024
+PASSTHROUGH_RESPONSE_HEADERS = (
+    'Content-Length', 'Content-Range', 'Content-Encoding', 'Accept-Ranges',
+    'ETag', 'Last-Modified', 'Cache-Control', 'Expires',
+)
+
+# Content encodings requests can decode for us when rewriting HTML
+UPSTREAM_ENCODINGS = ['gzip', 'deflate']
+try:
+    import brotli  # noqa: F401
+    UPSTREAM_ENCODINGS.append('br')
+except ImportError:
+    pass
+
+# Proxied static assets (CSS/JS/fonts/images) kept on disk; 0 bytes disables it
+asset_cache = AssetCache(
+    os.environ.get('ASSET_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'omnisearch-assets')),
+    max_bytes=int(os.environ.get('ASSET_CACHE_BYTES', str(512 * 1024 * 1024))),
+    max_object_bytes=int(os.environ.get('ASSET_CACHE_MAX_OBJECT', str(32 * 1024 * 1024))),
+)
+
+# Rewritten proxy HTML, reused while the upstream page is unchanged
+page_cache = PageCache(
+    ttl=int(os.environ.get('PAGE_CACHE_TTL', '3600')),
+    max_entries=int(os.environ.get('PAGE_CACHE_ENTRIES', '512')),
+    max_bytes=int(os.environ.get('PAGE_CACHE_BYTES', str(128 * 1024 * 1024))),
+    max_page_bytes=int(os.environ.get('PAGE_CACHE_MAX_PAGE', str(4 * 1024 * 1024))),
+)
+
+# Engine results keyed on (normalized query, engine, page depth)
+search_cache = TTLCache(
+    'search',
+    ttl=int(os.environ.get('SEARCH_CACHE_TTL', '300')),
+    stale_ttl=int(os.environ.get('SEARCH_CACHE_STALE_TTL', '1800')),
+    max_entries=int(os.environ.get('SEARCH_CACHE_ENTRIES', '2048')),
+    max_bytes=int(os.environ.get('SEARCH_CACHE_BYTES', str(64 * 1024 * 1024))),
+)
+
+# Identical concurrent misses share one upstream scrape or instant answer lookup
+# (same keys as search_cache and answer_cache); a follower whose leader is
+# still going at the deadline gives up waiting and fetches for itself
+search_flights = SingleFlight('search', timeout=SEARCH_DEADLINE)
+answer_flights = SingleFlight('instant_answer', timeout=SEARCH_DEADLINE)
+# Identical concurrent proxy fetches: followers wait for the first request to
+# fill the asset/page cache, up to this many seconds, then fetch themselves
+proxy_flights = SingleFlight('proxy')
+PROXY_COALESCE_WAIT = float(os.environ.get('PROXY_COALESCE_WAIT', '10'))
+# A cacheable proxy body is read this far ahead of a slow client, so the
+# cache (and everyone waiting on it) gets it at upstream speed
+PROXY_READ_AHEAD_BYTES = int(os.environ.get('PROXY_READ_AHEAD_BYTES', str(4 * 1024 * 1024)))
+
+# Instant answers keyed on normalized query. Most queries have no answer,
+# so "no answer" is cached too, for a shorter time.
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', '3600'))
+ANSWER_CACHE_NEGATIVE_TTL = int(os.environ.get('ANSWER_CACHE_NEGATIVE_TTL', '600'))
+answer_cache = TTLCache(
+    'instant_answer',
+    ttl=ANSWER_CACHE_TTL,
+    max_entries=int(os.environ.get('ANSWER_CACHE_ENTRIES', '8192')),
+    max_bytes=int(os.environ.get('ANSWER_CACHE_BYTES', str(16 * 1024 * 1024))),
+)
+
+# Prometheus metrics served on /metrics
+metrics = Registry()
+upstream_latency = metrics.histogram('omnisearch_upstream_request_seconds', 'Upstream request time to response headers', ('source',))
+upstream_requests = metrics.counter('omnisearch_upstream_requests_total', 'Upstream request attempts by outcome', ('source', 'outcome'))
+upstream_retries = metrics.counter('omnisearch_upstream_retries_total', 'Upstream attempts after the first', ('source',))
+upstream_fallbacks = metrics.counter('omnisearch_upstream_protocol_fallbacks_total', 'Retries switched from https to http', ('source',))
+parse_seconds = metrics.histogram('omnisearch_parse_seconds', 'Result page extraction time', ('engine',))
+search_results = metrics.histogram('omnisearch_search_results', 'Results per engine scrape', ('engine',),
+                                   buckets=(0, 1, 5, 10, 15, 20, 30, 50, 100))
+search_deadline_exceeded = metrics.counter('omnisearch_search_deadline_exceeded_total',
+                                           'Searches answered without results or instant answer in time', ('phase',))
+proxy_bytes_in = metrics.counter('omnisearch_proxy_bytes_in_total', 'Body bytes read from upstream or cache', ('kind',))
+proxy_bytes_out = metrics.counter('omnisearch_proxy_bytes_out_total', 'Body bytes sent to clients', ('kind',))
+search_fallbacks = metrics.counter('omnisearch_search_fallbacks_total', 'Searches served by a fallback engine',
+                                   ('requested', 'served_by'))
+federated_engines = metrics.counter('omnisearch_search_federated_engines_total',
+                                    'Engines queried by federated searches, by outcome', ('engine', 'outcome'))
+metrics.gauge('omnisearch_upstream_hedges_total', 'Hedged duplicate requests sent, and won by the duplicate',
+              lambda: {(result,): count for result, count in http_client.hedge_stats().items()}, ('result',), kind='counter')
+metrics.gauge('omnisearch_coalesced_requests_total', 'Requests that led an upstream operation or shared one in flight',
+              singleflight.counts, ('group', 'role'), kind='counter')
+# Search engine and instant answer hosts only: proxied sites would each add a series
+metrics.gauge('omnisearch_upstream_circuit_state', 'Circuit per host: 0 closed, 1 half-open, 2 open',
+              lambda: circuit.breakers.states(ENGINE_HOSTS), ('host',))
+metrics.cache_metrics('omnisearch', {
+    'search': search_cache.stats,
+    'instant_answer': answer_cache.stats,
+    'proxy_asset': asset_cache.stats,
+    'proxy_page': page_cache.stats,
+    'compressed': compression.variants.stats,
+})
+compressed_bytes = metrics.counter('omnisearch_compression_bytes_total',
+                                   'Response body bytes before (in) and after (out) compression', ('encoding', 'stage'))
+
+@app.before_request
+def start_request_timer():
+    timing.start(f'{request.method} {request.full_path.rstrip("?")}')
+
+@app.after_request
+def add_server_timing(response):
+    """Server-Timing for the phases done so far; slow-request log once sent"""
+    timer = timing.current()
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.header()
+        response.call_on_close(timer.finish)
+    return response
+
+def count_compressed(encoding, raw, compressed):
+    compressed_bytes.inc(encoding, 'in', amount=raw)
+    compressed_bytes.inc(encoding, 'out', amount=compressed)
+
+@app.after_request
+def compress_response(response):
+    """
+    gzip/br for the JSON, event streams and HTML built here, as the client
+    accepts. Bodies built from cache hits reuse their compressed copy.
+    """
+    if response.direct_passthrough or response.mimetype not in compression.COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compression.compress_stream(response.response, encoding,
+                                                        functools.partial(count_compressed, encoding))
+    else:
+        body = response.get_data()
+        if len(body) < compression.COMPRESS_MIN_BYTES:
+            return response
+        timer = timing.current()
+        with timing.phase('compress'):
+            if timer is not None and timer.notes.get('cache') == 'hit':
+                compressed = compression.cached_variant(request.full_path, body, encoding)
+            else:
+                compressed = compression.compress(body, encoding)
+        count_compressed(encoding, len(body), len(compressed))
+        response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def upstream_headers(extra_headers=None):
+    """Browser-like request headers for upstream fetches"""
     headers = {
         'User-Agent': random.choice(USER_AGENTS),
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
@@ -38,277 +231,484 @@ def fetch_with_retry(url, timeout=15, retries=2):
         'Connection': 'keep-alive',
         'Upgrade-Insecure-Requests': '1'
     }
+    if extra_headers:
+        headers.update(extra_headers)
+    return headers
+
+def acceptable_status(status_code, headers):
+    """Upstream statuses fetch_with_retry hands back to the caller"""
+    if status_code == 200 or (status_code == 206 and 'Range' in headers):
+        return True
+    return status_code == 304 and ('If-None-Match' in headers or 'If-Modified-Since' in headers)
+
+def fetch_with_retry(url, timeout=15, retries=2, extra_headers=None, stream=False, source='other'):
+    """
+    Fetch with protocol switching and retries (`source` labels the metrics).
+    Returns None straight away while the host's circuit breaker is open.
+    `timeout` is an upper bound: hosts with enough history get one derived
+    from their recent latency, and non-streamed fetches may be hedged.
+    """
+    headers = upstream_headers(extra_headers)
+    breaker = circuit.breakers.get(url)
+    tracker = latency.trackers.get(url)
     
     for attempt in range(retries):
+        if not breaker.allow():
+            upstream_requests.inc(source, 'circuit_open')
+            return None
+        if attempt:
+            upstream_retries.inc(source)
+        start = time.perf_counter()
         try:
-            response = requests.get(url, headers=headers, timeout=timeout, verify=False, allow_redirects=True)
-            if response.status_code == 200:
+            # A streamed body (e.g. media) can take a while to read: only the
+            # connect gets the adaptive timeout, reads keep the caller's
+            request_timeout = tracker.timeout(timeout)
+            kwargs = dict(headers=headers, timeout=(request_timeout, timeout) if stream else request_timeout,
+                          verify=False, allow_redirects=True, stream=stream)
+            hedge_after = None if stream else tracker.hedge_delay()
+            if hedge_after is not None:
+                # Each of the hedged requests records its own latency
+                response = http_client.hedged_get(url, hedge_after, observe=tracker.observe, **kwargs)
+            else:
+                response = http_client.get(url, **kwargs)
+            elapsed = time.perf_counter() - start
+            upstream_latency.observe(elapsed, source)
+            if hedge_after is None:
+                tracker.observe(elapsed)
+            breaker.record(not circuit.is_failure_status(response.status_code))
+            if acceptable_status(response.status_code, headers):
+                upstream_requests.inc(source, 'ok')
                 return response
-        except:
+            upstream_requests.inc(source, f'http_{response.status_code // 100}xx')
+            # Hand the pooled connection back before retrying
+            response.close()
+        except Exception as error:
+            elapsed = time.perf_counter() - start
+            upstream_latency.observe(elapsed, source)
+            timed_out = isinstance(error, requests.Timeout)
+            upstream_requests.inc(source, 'timeout' if timed_out else 'error')
+            if timed_out:
+                # It took at least this long; leaving it out would pin the timeout
+                tracker.observe(elapsed)
+            breaker.record(False)
             if attempt == 0 and url.startswith('https://'):
+                upstream_fallbacks.inc(source)
                 url = url.replace('https://', 'http://')
                 continue
-        time.sleep(0.5)
+        if attempt + 1 < retries:
+            time.sleep(circuit.backoff(attempt + 1))
     
     return None
 
-def get_duckduckgo_instant_answer(query):
-    """Get DuckDuckGo AI instant answer"""
+def instant_answer_url(query):
+    return f'https://api.duckduckgo.com/?q={quote(query)}&format=json&no_html=1&skip_disambig=1'
+
+def lookup_instant_answer(query):
+    """Query the DuckDuckGo instant answer API (None if the fetch failed)"""
     try:
-        api_url = f'https://api.duckduckgo.com/?q={quote(query)}&format=json&no_html=1&skip_disambig=1'
-        response = fetch_with_retry(api_url, timeout=8)
+        with timing.phase('instant_answer'):
+            response = fetch_with_retry(instant_answer_url(query), timeout=8, source='instant_answer')
         
         if response:
-            data = response.json()
-            
-            # Check for instant answer
-            if data.get('AbstractText'):
-                return {
-                    'has_answer': True,
-                    'answer': data['AbstractText'],
-                    'title': data.get('Heading', 'Quick Answer'),
-                    'source': data.get('AbstractSource', 'DuckDuckGo'),
-                    'url': data.get('AbstractURL', ''),
-                    'type': 'abstract'
-                }
-            
-            # Check for definition
-            if data.get('Definition'):
-                return {
-                    'has_answer': True,
-                    'answer': data['Definition'],
-                    'title': data.get('DefinitionSource', 'Definition'),
-                    'source': data.get('DefinitionSource', 'Dictionary'),
-                    'url': data.get('DefinitionURL', ''),
-                    'type': 'definition'
-                }
-            
-            # Check for answer type
-            if data.get('Answer'):
-                return {
-                    'has_answer': True,
-                    'answer': data['Answer'],
-                    'title': 'Answer',
-                    'source': 'DuckDuckGo',
-                    'url': '',
-                    'type': 'answer'
-                }
+            return instant_answer_from(response.json())
     except:
         pass
     
-    return {'has_answer': False}
+    return None
 
-def scrape_duckduckgo(query):
-    """Enhanced DuckDuckGo scraper"""
-    results = []
+def instant_answer_from(data):
+    """Pick the instant answer out of a DuckDuckGo API response"""
+    # Check for instant answer
+    if data.get('AbstractText'):
+        return {
+            'has_answer': True,
+            'answer': data['AbstractText'],
+            'title': data.get('Heading', 'Quick Answer'),
+            'source': data.get('AbstractSource', 'DuckDuckGo'),
+            'url': data.get('AbstractURL', ''),
+            'type': 'abstract'
+        }
     
-    try:
-        url = f'https://html.duckduckgo.com/html/?q={quote(query)}'
-        response = fetch_with_retry(url)
-        
-        if response:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            for result in soup.select('.result__body'):
-                try:
-                    link_elem = result.select_one('.result__a')
-                    if not link_elem:
-                        continue
-                    
-                    title = link_elem.get_text(strip=True)
-                    href = link_elem.get('href', '')
-                    
-                    # Clean DDG redirect
-                    if 'uddg=' in href:
-                        match = re.search(r'uddg=([^&]+)', href)
-                        if match:
-                            href = unquote(match.group(1))
-                    
-                    if href.startswith('//'):
-                        href = 'https:' + href
-                    
-                    url_elem = result.select_one('.result__url')
-                    snippet_elem = result.select_one('.result__snippet')
-                    
-                    if title and href and href.startswith('http'):
-                        results.append({
-                            'title': title,
-                            'url': href,
-                            'display_url': url_elem.get_text(strip=True) if url_elem else urlparse(href).netloc,
-                            'snippet': snippet_elem.get_text(strip=True) if snippet_elem else '',
-                            'engine': 'duckduckgo'
-                        })
-                except:
-                    continue
-    except:
-        pass
+    # Check for definition
+    if data.get('Definition'):
+        return {
+            'has_answer': True,
+            'answer': data['Definition'],
+            'title': data.get('DefinitionSource', 'Definition'),
+            'source': data.get('DefinitionSource', 'Dictionary'),
+            'url': data.get('DefinitionURL', ''),
+            'type': 'definition'
+        }
     
-    return results[:20]
+    # Check for answer type
+    if data.get('Answer'):
+        return {
+            'has_answer': True,
+            'answer': data['Answer'],
+            'title': 'Answer',
+            'source': 'DuckDuckGo',
+            'url': '',
+            'type': 'answer'
+        }
+    
+    return {'has_answer': False}
 
-def scrape_google(query):
-    """Enhanced Google scraper with better parsing"""
-    results = []
+def get_duckduckgo_instant_answer(query):
+    """Get DuckDuckGo AI instant answer and cache it, including misses"""
+    answer, _ = answer_flights.do(normalize_query(query),
+                                  lambda: remember_instant_answer(query, lookup_instant_answer(query)))
+    return answer
+
+def remember_instant_answer(query, answer):
+    """Cache a looked-up answer (negative ones for less time)"""
+    if answer is None:
+        # Upstream failure - don't remember it, try again next time
+        return {'has_answer': False}
     
-    try:
+    ttl = ANSWER_CACHE_TTL if answer['has_answer'] else ANSWER_CACHE_NEGATIVE_TTL
+    answer_cache.set(normalize_query(query), answer, ttl=ttl)
+    return answer
+
+def engine_urls(engine, query):
+    """Result page URLs for an engine, tried in order until one has results"""
+    if engine == 'google':
         # Use multiple Google endpoints
-        urls = [
+        return [
             f'https://www.google.com/search?q={quote(query)}&num=25&hl=en',
             f'https://www.google.com/search?q={quote(query)}&num=25&gl=us&hl=en'
         ]
-        
-        for search_url in urls:
-            response = fetch_with_retry(search_url)
+    elif engine == 'brave':
+        return [f'https://search.brave.com/search?q={quote(query)}&source=web']
+    elif engine == 'startpage':
+        return [f'https://www.startpage.com/sp/search?query={quote(query)}']
+    return [f'https://html.duckduckgo.com/html/?q={quote(query)}']
+
+def extract_duckduckgo(html):
+    """Enhanced DuckDuckGo result extraction"""
+    results = []
+    soup = parse_html(html)
+    
+    for result in soup.select('.result__body'):
+        try:
+            link_elem = result.select_one('.result__a')
+            if not link_elem:
+                continue
             
-            if response:
-                soup = BeautifulSoup(response.text, 'html.parser')
+            title = link_elem.get_text(strip=True)
+            href = link_elem.get('href', '')
+            
+            # Clean DDG redirect
+            if 'uddg=' in href:
+                match = re.search(r'uddg=([^&]+)', href)
+                if match:
+                    href = unquote(match.group(1))
+            
+            if href.startswith('//'):
+                href = 'https:' + href
+            
+            url_elem = result.select_one('.result__url')
+            snippet_elem = result.select_one('.result__snippet')
+            
+            if title and href and href.startswith('http'):
+                results.append(Result(
+                    title=title,
+                    url=href,
+                    display_url=url_elem.get_text(strip=True) if url_elem else urlparse(href).netloc,
+                    snippet=snippet_elem.get_text(strip=True) if snippet_elem else '',
+                    engine='duckduckgo'
+                ))
+        except:
+            continue
+    
+    return results[:20]
+
+def extract_google(html):
+    """Enhanced Google result extraction with better parsing"""
+    results = []
+    soup = parse_html(html)
+    
+    # Multiple selectors for Google's changing structure
+    selectors = ['.g', 'div[data-sokoban-container]', '.tF2Cxc', '.Gx5Zad']
+    
+    for selector in selectors:
+        for result in soup.select(selector):
+            try:
+                link = result.select_one('a')
+                heading = result.select_one('h3')
                 
-                # Multiple selectors for Google's changing structure
-                selectors = ['.g', 'div[data-sokoban-container]', '.tF2Cxc', '.Gx5Zad']
+                if not link or not heading:
+                    continue
                 
-                for selector in selectors:
-                    for result in soup.select(selector):
-                        try:
-                            link = result.select_one('a')
-                            heading = result.select_one('h3')
-                            
-                            if not link or not heading:
-                                continue
-                            
-                            href = link.get('href', '')
-                            
-                            # Clean Google redirect
-                            if '/url?q=' in href:
-                                match = re.search(r'[?&]q=([^&]+)', href)
-                                if match:
-                                    href = unquote(match.group(1))
-                            
-                            # Skip Google internal
-                            if 'google.com/search' in href or not href.startswith('http'):
-                                continue
-                            
-                            title = heading.get_text(strip=True)
-                            snippet_elem = result.select_one('.VwiC3b, .IsZvec, .lEBKkf')
-                            
-                            if title and href:
-                                results.append({
-                                    'title': title,
-                                    'url': href,
-                                    'display_url': urlparse(href).netloc.replace('www.', ''),
-                                    'snippet': snippet_elem.get_text(strip=True) if snippet_elem else '',
-                                    'engine': 'google'
-                                })
-                                
-                                if len(results) >= 20:
-                                    return results
-                        except:
-                            continue
+                href = link.get('href', '')
                 
-                if results:
-                    break
-    except:
-        pass
+                # Clean Google redirect
+                if '/url?q=' in href:
+                    match = re.search(r'[?&]q=([^&]+)', href)
+                    if match:
+                        href = unquote(match.group(1))
+                
+                # Skip Google internal
+                if 'google.com/search' in href or not href.startswith('http'):
+                    continue
+                
+                title = heading.get_text(strip=True)
+                snippet_elem = result.select_one('.VwiC3b, .IsZvec, .lEBKkf')
+                
+                if title and href:
+                    results.append(Result(
+                        title=title,
+                        url=href,
+                        display_url=urlparse(href).netloc.replace('www.', ''),
+                        snippet=snippet_elem.get_text(strip=True) if snippet_elem else '',
+                        engine='google'
+                    ))
+                    
+                    if len(results) >= 20:
+                        return results
+            except:
+                continue
     
     return results[:20]
 
-def scrape_brave(query):
-    """Fixed Brave Search scraper"""
+def extract_brave(html):
+    """Fixed Brave Search result extraction"""
     results = []
+    soup = parse_html(html)
     
-    try:
-        url = f'https://search.brave.com/search?q={quote(query)}&source=web'
-        response = fetch_with_retry(url)
+    # Brave uses multiple result types
+    selectors = [
+        '.snippet',
+        'div[data-type="web"]',
+        '.result',
+        'div.fdb'
+    ]
+    
+    for selector in selectors:
+        for result in soup.select(selector):
+            try:
+                # Try multiple link selectors
+                link = (result.select_one('a.result-header') or 
+                       result.select_one('.title a') or
+                       result.select_one('a[href^="http"]'))
+                
+                if not link:
+                    continue
+                
+                href = link.get('href', '')
+                if not href.startswith('http'):
+                    continue
+                
+                title = link.get_text(strip=True)
+                
+                # Try multiple snippet selectors
+                snippet_elem = (result.select_one('.snippet-description') or
+                              result.select_one('.description') or
+                              result.select_one('p'))
+                
+                if title and href:
+                    results.append(Result(
+                        title=title,
+                        url=href,
+                        display_url=urlparse(href).netloc.replace('www.', ''),
+                        snippet=snippet_elem.get_text(strip=True) if snippet_elem else '',
+                        engine='brave'
+                    ))
+                    
+                    if len(results) >= 20:
+                        return results
+            except:
+                continue
         
-        if response:
-            soup = BeautifulSoup(response.text, 'html.parser')
+        if results:
+            break
+    
+    return results[:20]
+
+def extract_startpage(html):
+    """Startpage (encrypted Google results) extraction"""
+    results = []
+    soup = parse_html(html)
+    
+    for result in soup.select('.w-gl__result, .result'):
+        try:
+            link = result.select_one('.w-gl__result-url, a[href^="http"]')
+            title_elem = result.select_one('h3, .w-gl__result-title')
+            
+            if not link or not title_elem:
+                continue
             
-            # Brave uses multiple result types
-            selectors = [
-                '.snippet',
-                'div[data-type="web"]',
-                '.result',
-                'div.fdb'
-            ]
+            href = link.get('href', '')
+            title = title_elem.get_text(strip=True)
+            snippet_elem = result.select_one('.w-gl__description, .description')
             
-            for selector in selectors:
-                for result in soup.select(selector):
-                    try:
-                        # Try multiple link selectors
-                        link = (result.select_one('a.result-header') or 
-                               result.select_one('.title a') or
-                               result.select_one('a[href^="http"]'))
-                        
-                        if not link:
-                            continue
-                        
-                        href = link.get('href', '')
-                        if not href.startswith('http'):
-                            continue
-                        
-                        title = link.get_text(strip=True)
-                        
-                        # Try multiple snippet selectors
-                        snippet_elem = (result.select_one('.snippet-description') or
-                                      result.select_one('.description') or
-                                      result.select_one('p'))
-                        
-                        if title and href:
-                            results.append({
-                                'title': title,
-                                'url': href,
-                                'display_url': urlparse(href).netloc.replace('www.', ''),
-                                'snippet': snippet_elem.get_text(strip=True) if snippet_elem else '',
-                                'engine': 'brave'
-                            })
-                            
-                            if len(results) >= 20:
-                                return results
-                    except:
-                        continue
-                
+            if title and href and href.startswith('http'):
+                results.append(Result(
+                    title=title,
+                    url=href,
+                    display_url=urlparse(href).netloc.replace('www.', ''),
+                    snippet=snippet_elem.get_text(strip=True) if snippet_elem else '',
+                    engine='startpage'
+                ))
+        except:
+            continue
+    
+    return results[:20]
+
+EXTRACTORS = {
+    'duckduckgo': extract_duckduckgo,
+    'google': extract_google,
+    'brave': extract_brave,
+    'startpage': extract_startpage,
+}
+
+# Rolling success/latency per engine, for falling back when one comes back empty
+engine_health = EngineHealth(EXTRACTORS)
+
+# Hosts the search path fetches from (the circuit state metric is limited to these)
+ENGINE_HOSTS = frozenset(circuit.host_of(url) for engine in EXTRACTORS
+                         for url in engine_urls(engine, '') + [instant_answer_url('')])
+metrics.gauge('omnisearch_engine_health_score', 'Recent success rate discounted by latency (0-1)',
+              engine_health.scores, ('engine',))
+
+def scrape_pages(engine, query):
+    """Fetch an engine's result pages in order until one has results"""
+    started = time.monotonic()
+    results = []
+    try:
+        for search_url in engine_urls(engine, query):
+            with timing.phase('fetch'):
+                response = fetch_with_retry(search_url, source=engine)
+            
+            if response:
+                with parse_seconds.time(engine), timing.phase('parse'):
+                    results = EXTRACTORS[engine](response.text)
                 if results:
                     break
     except:
-        pass
+        results = []
     
-    return results[:20]
+    search_results.observe(len(results), engine)
+    engine_health.record(engine, bool(results), time.monotonic() - started)
+    return results
+
+def scrape_duckduckgo(query):
+    """Enhanced DuckDuckGo scraper"""
+    return scrape_pages('duckduckgo', query)
+
+def scrape_google(query):
+    """Enhanced Google scraper with better parsing"""
+    return scrape_pages('google', query)
+
+def scrape_brave(query):
+    """Fixed Brave Search scraper"""
+    return scrape_pages('brave', query)
 
 def scrape_startpage(query):
     """Startpage (encrypted Google results)"""
-    results = []
+    return scrape_pages('startpage', query)
+
+def scrape_engine(engine, query):
+    """Dispatch a query to the selected engine's scraper"""
+    if engine == 'duckduckgo':
+        return scrape_duckduckgo(query)
+    elif engine == 'google':
+        return scrape_google(query)
+    elif engine == 'brave':
+        return scrape_brave(query)
+    elif engine == 'startpage':
+        return scrape_startpage(query)
+    return scrape_duckduckgo(query)
+
+def cached_scrape(engine, query):
+    """Engine results via the search cache; empty results are not cached"""
+    key = (normalize_query(query), engine, 1)
+    
+    def load():
+        timing.note('cache', 'miss')
+        return scrape_engine(engine, query)
+    
+    def coalesced_load():
+        results, leader = search_flights.do(key, load)
+        if not leader:
+            timing.note('cache', 'coalesced')
+        return results
     
+    timing.note('cache', 'hit')
+    return list(search_cache.get_or_load(key, coalesced_load))
+
+def primary_engine(engine):
+    """Engine a (non-federated) search actually asks first"""
+    return engine if engine in EXTRACTORS else 'duckduckgo'
+
+def search_with_fallback(engine, query, deadline):
+    """
+    (results, engine that served them): the requested engine first, then
+    the healthiest others while results are empty and time remains
+    """
+    primary = primary_engine(engine)
+    results = cached_scrape(primary, query)
+    if results:
+        return results, primary
+    for fallback in engine_health.fallbacks(primary):
+        if time.monotonic() >= deadline:
+            break
+        results = cached_scrape(fallback, query)
+        if results:
+            search_fallbacks.inc(primary, fallback)
+            return results, fallback
+    return [], None
+
+def requested_engines(engine):
+    """Engines for a federated search ('all' or a comma list), else None"""
+    if engine == 'all':
+        return list(EXTRACTORS)
+    if ',' not in engine:
+        return None
+    engines = [e for e in dict.fromkeys(e.strip() for e in engine.split(',')) if e in EXTRACTORS]
+    return engines or None
+
+def timed_scrape(engine, query):
+    """(outcome, results, seconds) for one engine of a federated search"""
+    started = time.monotonic()
     try:
-        url = f'https://www.startpage.com/sp/search?query={quote(query)}'
-        response = fetch_with_retry(url)
-        
-        if response:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            for result in soup.select('.w-gl__result, .result'):
-                try:
-                    link = result.select_one('.w-gl__result-url, a[href^="http"]')
-                    title_elem = result.select_one('h3, .w-gl__result-title')
-                    
-                    if not link or not title_elem:
-                        continue
-                    
-                    href = link.get('href', '')
-                    title = title_elem.get_text(strip=True)
-                    snippet_elem = result.select_one('.w-gl__description, .description')
-                    
-                    if title and href and href.startswith('http'):
-                        results.append({
-                            'title': title,
-                            'url': href,
-                            'display_url': urlparse(href).netloc.replace('www.', ''),
-                            'snippet': snippet_elem.get_text(strip=True) if snippet_elem else '',
-                            'engine': 'startpage'
-                        })
-                except:
-                    continue
+        results = cached_scrape(engine, query)
     except:
-        pass
-    
-    return results[:20]
+        return 'error', [], time.monotonic() - started
+    return ('ok' if results else 'empty'), results, time.monotonic() - started
+
+def federate(engines, outcomes):
+    """
+    Fused results and per-engine report from {engine: (outcome, results,
+    seconds)}; engines that missed the deadline are absent from outcomes
+    """
+    fused = fuse_rankings({e: outcomes[e][1] for e in engines if e in outcomes}, k=FUSION_RRF_K)
+    contributed = Counter(e for result in fused for e in result['engines'])
+    unique = Counter(result['engines'][0] for result in fused if len(result['engines']) == 1)
+    report = {}
+    for engine in engines:
+        outcome, results, seconds = outcomes.get(engine, ('timeout', [], None))
+        federated_engines.inc(engine, outcome)
+        report[engine] = {
+            'outcome': outcome,
+            'results': len(results),
+            'contributed': contributed[engine],
+            'unique': unique[engine],
+            'ms': round(seconds * 1000, 1) if seconds is not None else None,
+        }
+    return fused, report
+
+def search_federated(engines, query, deadline):
+    """
+    (fused results, per-engine report): every engine is queried at once and
+    whatever has finished by the deadline is merged. Late scrapes keep
+    running and still fill the search cache.
+    """
+    futures = {search_pool.submit(contextvars.copy_context().run, timed_scrape, e, query): e for e in engines}
+    done, _ = wait(futures, timeout=max(0, deadline - time.monotonic()))
+    outcomes = {futures[future]: future.result() for future in done}
+    if not outcomes:
+        search_deadline_exceeded.inc('results')
+    return federate(engines, outcomes)
 
 @app.route('/')
 def index():
@@ -328,70 +728,244 @@ def search():
     if not query:
         return jsonify({'success': False, 'error': 'No query', 'results': []})
     
-    # Get instant answer (DuckDuckGo AI)
-    instant_answer = get_duckduckgo_instant_answer(query)
+    deadline = time.monotonic() + SEARCH_DEADLINE
     
-    # Get search results
-    if engine == 'duckduckgo':
-        results = scrape_duckduckgo(query)
-    elif engine == 'google':
-        results = scrape_google(query)
-    elif engine == 'brave':
-        results = scrape_brave(query)
-    elif engine == 'startpage':
-        results = scrape_startpage(query)
+    # Instant answer (DuckDuckGo AI) and engine results run concurrently;
+    # a cached instant answer (positive or negative) skips the API call
+    instant_answer = answer_cache.get(normalize_query(query))
+    answer_future = None
+    if instant_answer is None:
+        answer_future = search_pool.submit(contextvars.copy_context().run, get_duckduckgo_instant_answer, query)
+    
+    engines = requested_engines(engine)
+    engine_report = None
+    if engines:
+        # Fans out from this thread: waiting on search_pool from inside it could deadlock
+        results, engine_report = search_federated(engines, query, deadline)
+        served_by = ','.join(e for e in engines if engine_report[e]['contributed']) or None
     else:
-        results = scrape_duckduckgo(query)
+        results_future = search_pool.submit(contextvars.copy_context().run, search_with_fallback, engine, query, deadline)
+        try:
+            results, served_by = results_future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeout:
+            # Drops it only if still queued; a scrape already running
+            # finishes and fills the search cache
+            results_future.cancel()
+            search_deadline_exceeded.inc('results')
+            results, served_by = [], None
     
+    # The instant answer may take whatever is left of the deadline
+    if answer_future is not None:
+        now = time.monotonic()
+        answer_timeout = instant_answer_wait(deadline, now, now)
+        try:
+            instant_answer = answer_future.result(timeout=answer_timeout)
+        except FutureTimeout:
+            answer_future.cancel()
+            search_deadline_exceeded.inc('instant_answer')
+            instant_answer = {'has_answer': False}
+    
+    with timing.phase('serialize'):
+        return json_response(search_payload(query, engine, results, instant_answer, served_by, engine_report))
+
+def search_payload(query, engine, results, instant_answer, served_by=None, engine_report=None):
+    """
+    /api/search response body (`served_by`: engine(s) the results came from;
+    `engine_report`: per-engine outcome of a federated search)
+    """
     # Add instant answer to top if available
     if instant_answer['has_answer']:
-        instant_result = {
-            'title': '🤖 ' + instant_answer['title'],
-            'url': instant_answer.get('url', '#'),
-            'display_url': instant_answer['source'],
-            'snippet': instant_answer['answer'],
-            'engine': 'duckduckgo_ai',
-            'is_instant': True
-        }
+        instant_result = Result(
+            title='🤖 ' + instant_answer['title'],
+            url=instant_answer.get('url', '#'),
+            display_url=instant_answer['source'],
+            snippet=instant_answer['answer'],
+            engine='duckduckgo_ai',
+            is_instant=True
+        )
         results.insert(0, instant_result)
     
-    return jsonify({
+    payload = {
         'success': len(results) > 0,
         'query': query,
         'engine': engine,
+        'served_by': served_by,
+        'fallback': engine_report is None and served_by is not None and served_by != primary_engine(engine),
         'has_instant_answer': instant_answer['has_answer'],
         'instant_answer': instant_answer if instant_answer['has_answer'] else None,
         'results': results,
         'count': len(results)
-    })
+    }
+    if engine_report is not None:
+        payload['engines'] = engine_report
+    return payload
 
-@app.route('/api/proxy', methods=['GET'])
-def proxy():
-    """Advanced proxy with ChatGPT support"""
-    url_param = request.args.get('url', '')
+def stream_summary(payload):
+    """Final stream event: the /api/search body with results reduced to their ranked URLs"""
+    summary = dict(payload)
+    summary['order'] = [r['url'] for r in summary.pop('results') if not r.get('is_instant')]
+    return summary
+
+@app.route('/api/search/stream', methods=['GET'])
+def search_stream():
+    """
+    /api/search as SSE or NDJSON: the instant answer and each engine's
+    results as they arrive, then a summary with the ranked order
+    """
+    query = request.args.get('q', '').strip()
+    engine = request.args.get('engine', 'duckduckgo').lower()
+    fmt = event_stream.negotiate(request.headers.get('Accept'), request.args.get('format'))
     
-    if not url_param:
-        return 'No URL', 400
+    def respond(events):
+        return Response(events, mimetype=event_stream.MIMETYPES[fmt], headers=event_stream.STREAM_HEADERS)
     
-    try:
-        target_url = base64.b64decode(url_param).decode('utf-8')
-    except:
-        return 'Invalid URL', 400
+    if not query:
+        return respond([event_stream.encode(fmt, 'summary', {'success': False, 'error': 'No query', 'order': []})])
     
-    # Special handling for ChatGPT/AI sites
-    if any(site in target_url.lower() for site in ['chatgpt.com', 'chat.openai.com']):
-        return f'''
+    deadline = time.monotonic() + SEARCH_DEADLINE
+    
+    # Everything is submitted before the response starts; the generator only waits
+    pending = {}
+    instant_answer = answer_cache.get(normalize_query(query))
+    if instant_answer is None:
+        pending[search_pool.submit(contextvars.copy_context().run, get_duckduckgo_instant_answer, query)] = None
+    engines = requested_engines(engine)
+    if engines:
+        for e in engines:
+            pending[search_pool.submit(contextvars.copy_context().run, timed_scrape, e, query)] = e
+    else:
+        pending[search_pool.submit(contextvars.copy_context().run, search_with_fallback, engine, query, deadline)] = engine
+    
+    def generate():
+        nonlocal instant_answer
+        outcomes = {}
+        results, served_by = [], None
+        results_done_at = None
+        if instant_answer is not None and instant_answer['has_answer']:
+            yield event_stream.encode(fmt, 'instant_answer', instant_answer)
+        
+        try:
+            while pending:
+                timeout = deadline - time.monotonic()
+                if results_done_at is not None:
+                    # Only the instant answer is left: same limit as /api/search
+                    timeout = instant_answer_wait(deadline, results_done_at, time.monotonic())
+                done, _ = wait(pending, timeout=max(0, timeout), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    source = pending.pop(future)
+                    if source is None:
+                        instant_answer = future.result()
+                        if instant_answer['has_answer']:
+                            yield event_stream.encode(fmt, 'instant_answer', instant_answer)
+                    elif engines:
+                        outcomes[source] = future.result()
+                        outcome, batch, seconds = outcomes[source]
+                        yield event_stream.encode(fmt, 'results', {
+                            'engine': source, 'outcome': outcome, 'ms': round(seconds * 1000, 1), 'results': batch,
+                        })
+                    else:
+                        results, served_by = future.result()
+                        yield event_stream.encode(fmt, 'results', {'engine': served_by, 'results': results})
+                if results_done_at is None and all(source is None for source in pending.values()):
+                    results_done_at = time.monotonic()
+        finally:
+            # Late work still queued is dropped, except federated scrapes,
+            # which are left to fill the search cache as in search_federated
+            for future, source in pending.items():
+                if source is None or not engines:
+                    future.cancel()
+        
+        for future, source in pending.items():
+            if source is None:
+                search_deadline_exceeded.inc('instant_answer')
+        if instant_answer is None:
+            instant_answer = {'has_answer': False}
+        
+        engine_report = None
+        if engines:
+            if not outcomes:
+                search_deadline_exceeded.inc('results')
+            results, engine_report = federate(engines, outcomes)
+            served_by = ','.join(e for e in engines if engine_report[e]['contributed']) or None
+        elif results_done_at is None:
+            search_deadline_exceeded.inc('results')
+        payload = search_payload(query, engine, results, instant_answer, served_by, engine_report)
+        yield event_stream.encode(fmt, 'summary', stream_summary(payload))
+    
+    return respond(generate())
+
+def passthrough_request_headers(client_headers):
+    """Client headers forwarded upstream for proxied fetches"""
+    headers = {'Accept-Encoding': negotiate_upstream_encoding(client_headers.get('Accept-Encoding', ''))}
+    for name in ('Range', 'If-Range'):
+        if name in client_headers:
+            headers[name] = client_headers[name]
+    return headers
+
+def negotiate_upstream_encoding(client_accept):
+    """
+    Encodings to ask upstream for: ones the client accepts (so raw bodies can
+    be passed through untouched) that we can also decode for HTML rewriting
+    """
+    accepted = {part.split(';')[0].strip().lower() for part in client_accept.split(',')}
+    encodings = [enc for enc in UPSTREAM_ENCODINGS if enc in accepted]
+    return ', '.join(encodings) or 'identity'
+
+def stream_passthrough(response, writer=None, done=None):
+    """
+    Relay a non-HTML upstream body in chunks without buffering it;
+    done(stored) is called once the body has or hasn't reached the asset cache
+    """
+    headers = {}
+    for name in PASSTHROUGH_RESPONSE_HEADERS:
+        if name in response.headers:
+            headers[name] = response.headers[name]
+    
+    def generate():
+        try:
+            # Raw bytes: Content-Length/Content-Encoding stay valid as forwarded
+            for chunk in response.raw.stream(PROXY_CHUNK_SIZE, decode_content=False):
+                proxy_bytes_in.inc('passthrough', amount=len(chunk))
+                proxy_bytes_out.inc('passthrough', amount=len(chunk))
+                if writer:
+                    writer.write(chunk)
+                yield chunk
+        except BaseException:
+            if writer:
+                writer.abort()
+            raise
+        else:
+            if writer:
+                writer.commit()
+                if done:
+                    done(True)
+        finally:
+            response.close()
+            if done:
+                done(False)
+    
+    body = generate()
+    if writer:
+        body = singleflight.read_ahead(body, PROXY_READ_AHEAD_BYTES)
+    return Response(body, status=response.status_code, headers=headers,
+                    content_type=response.headers.get('Content-Type'), direct_passthrough=True)
+
+AI_SITES = ['chatgpt.com', 'chat.openai.com']
+
+CHATGPT_PAGE = '''
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <title>ChatGPT Access</title>
             <style>
-                body{{margin:0;padding:0;font-family:system-ui;background:#1a0033;color:white;}}
-                .container{{max-width:800px;margin:80px auto;padding:40px;text-align:center;}}
-                .chat-embed{{width:100%;height:600px;border:none;border-radius:20px;background:white;box-shadow:0 20px 60px rgba(0,0,0,0.5);}}
-                .tip{{margin-top:30px;padding:20px;background:rgba(138,43,226,0.2);border-radius:15px;}}
-                .btn{{display:inline-block;margin:10px;padding:15px 30px;background:linear-gradient(135deg,#8a2be2,#9300ea);color:white;text-decoration:none;border-radius:25px;font-weight:600;}}
+                body{margin:0;padding:0;font-family:system-ui;background:#1a0033;color:white;}
+                .container{max-width:800px;margin:80px auto;padding:40px;text-align:center;}
+                .chat-embed{width:100%;height:600px;border:none;border-radius:20px;background:white;box-shadow:0 20px 60px rgba(0,0,0,0.5);}
+                .tip{margin-top:30px;padding:20px;background:rgba(138,43,226,0.2);border-radius:15px;}
+                .btn{display:inline-block;margin:10px;padding:15px 30px;background:linear-gradient(135deg,#8a2be2,#9300ea);color:white;text-decoration:none;border-radius:25px;font-weight:600;}
             </style>
         </head>
         <body>
@@ -421,41 +995,22 @@ def proxy():
         </body>
         </html>
         '''
-    
-    # Fetch page
-    response = fetch_with_retry(target_url)
-    
-    if not response:
-        return f'''<html><body style="text-align:center;padding:50px;background:#1a0033;color:white;">
+
+def is_ai_site(target_url):
+    """ChatGPT/AI sites that can't work through the proxy"""
+    return any(site in target_url.lower() for site in AI_SITES)
+
+def cannot_load_page(target_url):
+    """Error page for an upstream that couldn't be fetched"""
+    return f'''<html><body style="text-align:center;padding:50px;background:#1a0033;color:white;">
         <h1>🥔 Cannot Load</h1>
         <p>{target_url}</p>
         <a href="{target_url}" target="_blank" style="color:#8a2be2;">Visit Real Site</a>
-        </body></html>''', 502
-    
-    content_type = response.headers.get('Content-Type', '')
-    
-    if 'text/html' not in content_type:
-        return Response(response.content, content_type=content_type)
-    
-    # Process HTML
-    html = response.text
-    soup = BeautifulSoup(html, 'html.parser')
-    
-    parsed = urlparse(target_url)
-    base_url = f"{parsed.scheme}://{parsed.netloc}"
-    
-    # Rewrite URLs
-    for tag in soup.find_all(['a', 'link', 'script', 'img', 'iframe']):
-        for attr in ['href', 'src', 'action']:
-            if tag.has_attr(attr):
-                url = tag[attr]
-                if url and not url.startswith(('data:', 'javascript:', 'mailto:', '#')):
-                    abs_url = urljoin(target_url, url)
-                    encoded = base64.b64encode(abs_url.encode()).decode()
-                    tag[attr] = f'/api/proxy?url={encoded}'
-    
-    # Proxy bar
-    bar = f'''
+        </body></html>'''
+
+def proxy_bar(target_url):
+    """Navigation bar injected at the top of every proxied page"""
+    return f'''
     <style>
     #pxbar{{position:fixed;top:0;left:0;right:0;height:50px;background:rgba(0,0,0,0.95);z-index:999999;display:flex;align-items:center;padding:0 10px;border-bottom:2px solid #8a2be2;}}
     #pxbar button{{width:38px;height:38px;background:rgba(255,255,255,0.15);border:none;border-radius:8px;color:#fff;cursor:pointer;margin:0 4px;}}
@@ -471,15 +1026,194 @@ def proxy():
     <div style="margin-left:auto;font:10px monospace;color:rgba(255,255,255,0.7);">{target_url[:60]}...</div>
     </div>
     '''
+
+def serve_asset(entry):
+    """Serve a static asset from the disk cache"""
+    timing.note('cache', 'asset')
+    proxy_bytes_in.inc('asset_cache', amount=entry.meta['size'])
+    proxy_bytes_out.inc('asset_cache', amount=entry.meta['size'])
+    return asset_cache.serve(entry)
+
+def metered(chunks, counter, kind, timer=None):
+    """Pass chunks through, counting their bytes (text is encoded to UTF-8 as `serialize`)"""
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            start = time.perf_counter()
+            chunk = chunk.encode('utf-8')
+            if timer is not None:
+                timer.add('serialize', time.perf_counter() - start)
+        counter.inc(kind, amount=len(chunk))
+        yield chunk
+
+def cached_page_response(target_url, page):
+    """Serve a stored rewrite of an unchanged page, compressed as the client accepts"""
+    timing.note('cache', 'page')
+    html = page_cache.body(target_url, page)
+    proxy_bytes_in.inc('page_cache', amount=len(html))
+    proxy_bytes_out.inc('page_cache', amount=len(html))
+    encoding = None
+    if len(html) >= compression.COMPRESS_MIN_BYTES:
+        encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        with timing.phase('compress'):
+            body = page_cache.body(target_url, page, encoding)
+        count_compressed(encoding, len(html), len(body))
+    else:
+        body = html
+    response = Response(body, content_type='text/html; charset=utf-8')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+def coalesced_response(target_url, accept_encoding):
+    """What an identical request that just finished left in the caches, or None"""
+    cached = asset_cache.lookup(target_url)
+    if cached and cached.is_fresh() and cached.acceptable(accept_encoding):
+        return serve_asset(cached)
+    page = page_cache.lookup(target_url)
+    if page:
+        response = cached_page_response(target_url, page)
+        timing.note('cache', 'coalesced')
+        return response
+    return None
+
+@app.route('/api/proxy', methods=['GET'])
+def proxy():
+    """Advanced proxy with ChatGPT support"""
+    url_param = request.args.get('url', '')
+    
+    if not url_param:
+        return 'No URL', 400
+    
+    try:
+        target_url = base64.b64decode(url_param).decode('utf-8')
+    except:
+        return 'Invalid URL', 400
+    
+    # Special handling for ChatGPT/AI sites
+    if is_ai_site(target_url):
+        return CHATGPT_PAGE
+    
+    # Static assets we already have on disk
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    cached = asset_cache.lookup(target_url)
+    if cached and not cached.acceptable(accept_encoding):
+        cached = None
+    if cached and cached.is_fresh():
+        return serve_asset(cached)
+    
+    # Someone is already fetching this URL: wait for it to fill the cache
+    flight, leader = proxy_flights.begin(target_url)
+    if not leader:
+        with timing.phase('coalesce'):
+            finished = proxy_flights.wait(target_url, flight, PROXY_COALESCE_WAIT)
+        if finished and flight.value:
+            response = coalesced_response(target_url, accept_encoding)
+            if response is not None:
+                return response
+        return fetch_proxied(target_url, cached)
+    
+    # Followers are released once this fetch has (True) or won't have (False)
+    # left something cached for them
+    release = functools.partial(proxy_flights.end, target_url, flight)
+    try:
+        response = app.make_response(fetch_proxied(target_url, cached, release))
+    except:
+        release(False)
+        raise
+    response.call_on_close(functools.partial(release, False))
+    return response
+
+def fetch_proxied(target_url, cached=None, release=None):
+    """Fetch, revalidate or rewrite target_url; release(shared) as in proxy()"""
+    if release is None:
+        release = lambda shared: None
+    
+    # Rewritten HTML from a previous view of this page
+    page = page_cache.lookup(target_url)
+    
+    # Fetch page - headers only, so non-HTML bodies can stream straight through
+    extra_headers = passthrough_request_headers(request.headers)
+    if cached:
+        extra_headers.update(cached.validators())
+    elif page:
+        extra_headers.update(page_cache.validators(page))
+    timer = timing.current()
+    with timing.phase('fetch'):
+        response = fetch_with_retry(target_url, extra_headers=extra_headers, stream=True, source='proxy')
+    
+    if response is not None and response.status_code == 304:
+        response.close()
+        if cached:
+            asset_cache.refresh(cached, response.headers)
+            release(True)
+            return serve_asset(cached)
+        release(True)
+        page_cache.count(True)
+        return cached_page_response(target_url, page)
+    
+    if not response:
+        release(False)
+        return cannot_load_page(target_url), 502
     
-    if soup.body:
-        soup.body.insert(0, BeautifulSoup(bar, 'html.parser'))
+    content_type = response.headers.get('Content-Type', '')
+    
+    # Non-HTML bodies, and ranges of HTML pages (a fragment can't be
+    # rewritten), go out unmodified with their status and Content-Range
+    if 'text/html' not in content_type or response.status_code == 206:
+        writer = asset_cache.writer(target_url, response)
+        if writer is None:
+            release(False)
+        return stream_passthrough(response, writer, release)
+    
+    body = None
+    if page:
+        if page_cache.unchanged(page, response.headers):
+            response.close()
+            release(True)
+            return cached_page_response(target_url, page)
+        if not page_cache.has_validators(response.headers):
+            # No validators to go on - compare the body itself
+            with timing.phase('fetch'):
+                body = response.content
+            if page_cache.same_body(page, body):
+                release(True)
+                return cached_page_response(target_url, page)
+            body = [body]
+    
+    ranged = page_cache.is_ranged(request.headers)
+    if not page_cache.storable(response.status_code, response.headers, ranged):
+        release(False)
     
-    return str(soup)
+    # Rewrite URLs and inject the proxy bar as the page streams through
+    bar = proxy_bar(target_url)
+    
+    def rewrite(chunks):
+        return rewrite_stream(response, target_url, bar, body=chunks, timer=timer)
+    
+    if body is None:
+        # Reading the rest of the body is upstream time too
+        body = timing.timed_iter(response.iter_content(PROXY_CHUNK_SIZE), timer, 'fetch')
+    body = metered(body, proxy_bytes_in, 'html')
+    html = page_cache.record(target_url, response.status_code, response.headers, body, rewrite, ranged, release)
+    if page_cache.storable(response.status_code, response.headers, ranged):
+        # Fetch, rewrite and store the page at upstream speed, not this
+        # client's, so requests waiting for it aren't held up by a slow reader
+        html = singleflight.read_ahead(html, PROXY_READ_AHEAD_BYTES)
+    return Response(metered(html, proxy_bytes_out, 'html', timer), content_type='text/html; charset=utf-8')
+
+def health_status():
+    return {'status': 'healthy', 'version': '4.0-ultimate', 'http_pool': http_client.stats(), 'cache': search_cache.stats(), 'answer_cache': answer_cache.stats(), 'asset_cache': asset_cache.stats(), 'page_cache': page_cache.stats(), 'circuits': circuit.breakers.stats(), 'latency': latency.trackers.stats(), 'engines': engine_health.stats(), 'coalescing': singleflight.stats()}
 
 @app.route('/health')
 def health():
-    return jsonify({'status': 'healthy', 'version': '4.0-ultimate'})
+    return jsonify(health_status())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=Fa
+    app.run(host='0.0.0.0', port=5000, debug=False)
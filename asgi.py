@@ -0,0 +1,770 @@
+#!/usr/bin/env python3
+"""
+OmniSearch Async Backend 🥔
+Same routes and JSON responses as app.py, served over ASGI. Upstream
+fetches are awaited on the event loop (httpx) instead of pinning a worker
+thread each, so one process can keep thousands of slow upstreams in flight.
+
+Run: uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import (
+    FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse,
+)
+from starlette.routing import Route
+
+import app as flask_app
+import circuit
+import compression
+import latency
+import http_client
+import timing
+from app import (
+    EXTRACTORS, PASSTHROUGH_RESPONSE_HEADERS, PROXY_CHUNK_SIZE, SEARCH_DEADLINE, instant_answer_wait,
+    CHATGPT_PAGE, acceptable_status, answer_cache, asset_cache, cannot_load_page, engine_urls,
+    instant_answer_from, instant_answer_url, is_ai_site, page_cache, passthrough_request_headers,
+    primary_engine, proxy_bar, remember_instant_answer, search_cache, search_payload, upstream_headers, engine_health,
+    METRICS_CONTENT_TYPE, metrics, parse_seconds, proxy_bytes_in, proxy_bytes_out, search_deadline_exceeded,
+    search_fallbacks, search_results, upstream_fallbacks, upstream_latency, upstream_requests, upstream_retries,
+    federate, requested_engines, stream_summary, count_compressed, PROXY_COALESCE_WAIT, PROXY_READ_AHEAD_BYTES,
+)
+from cache import normalize_query
+from rewriter import StreamRewriter
+from result_model import json_default
+from singleflight import AsyncSingleFlight, async_read_ahead
+import event_stream
+
+# Same coalescing as app.py's search/answer/proxy flights, for coroutines
+search_flights = AsyncSingleFlight('search', timeout=SEARCH_DEADLINE)
+answer_flights = AsyncSingleFlight('instant_answer', timeout=SEARCH_DEADLINE)
+proxy_flights = AsyncSingleFlight('proxy')
+
+class TimingMiddleware:
+    """Server-Timing header and slow-request log, like app.py's request hooks"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        query = scope.get('query_string', b'').decode('latin-1')
+        timer = timing.start(f"{scope['method']} {scope['path']}" + (f'?{query}' if query else ''))
+
+        async def send_timed(message):
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(raw=list(message['headers']))
+                headers['Server-Timing'] = timer.header()
+                message = dict(message, headers=headers.raw)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            timer.finish()
+
+
+# Set in the scope by PassthroughResponse responses
+PASSTHROUGH = 'omnisearch.passthrough'
+
+
+class PassthroughResponse:
+    """
+    Mixin for responses relayed as they are (proxied bodies, cached assets):
+    CompressionMiddleware leaves them alone, like Flask's direct_passthrough,
+    so upstream ETag and Accept-Ranges still describe the body sent
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope[PASSTHROUGH] = True
+        await super().__call__(scope, receive, send)
+
+
+class PassthroughStreamingResponse(PassthroughResponse, StreamingResponse):
+    pass
+
+
+class PassthroughFileResponse(PassthroughResponse, FileResponse):
+    pass
+
+
+class CompressionMiddleware:
+    """gzip/br for compressible responses, like app.compress_response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = compression.negotiate(Headers(scope=scope).get('accept-encoding'))
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(raw=list(message['headers']))
+                content_type = headers.get('content-type', '').split(';')[0].strip()
+                if scope.get(PASSTHROUGH) or content_type not in compression.COMPRESSIBLE_TYPES:
+                    await send(message)
+                    return
+                headers.add_vary_header('Accept-Encoding')
+                message = dict(message, headers=headers.raw)
+                if encoding is None or message['status'] != 200 or 'content-encoding' in headers:
+                    await send(message)
+                    return
+                start = message  # held until the first body chunk shows the size
+                return
+            if start is None:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start['headers'])
+                if not more_body:
+                    # Whole body in one message: compress it in one go, if it's worth it
+                    if len(body) >= compression.COMPRESS_MIN_BYTES:
+                        with timing.phase('compress'):
+                            compressed = await asyncio.to_thread(compression.compress, body, encoding)
+                        count_compressed(encoding, len(body), len(compressed))
+                        body = compressed
+                        headers['Content-Encoding'] = encoding
+                        headers['Content-Length'] = str(len(body))
+                    await send(start)
+                    await send(dict(message, body=body))
+                    start = None
+                    return
+                headers['Content-Encoding'] = encoding
+                if 'content-length' in headers:
+                    del headers['content-length']
+                compressor = compression.StreamCompressor(encoding)
+                await send(start)
+            if len(body) >= compression.COMPRESS_MIN_BYTES:
+                # Big chunks (rewritten HTML) off the loop; small events cost less than the hop
+                out = await asyncio.to_thread(compressor.compress, body)
+            else:
+                out = compressor.compress(body) if body else b''
+            if not more_body:
+                out += compressor.finish()
+            count_compressed(encoding, len(body), len(out))
+            await send({'type': 'http.response.body', 'body': out, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class ResultJSONResponse(JSONResponse):
+    """JSONResponse that also encodes result_model.Result"""
+
+    def render(self, content):
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':'),
+                          default=json_default).encode('utf-8')
+
+
+# Upstream connection limits for the shared async client
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', '1000'))
+ASYNC_MAX_KEEPALIVE = int(os.environ.get('ASYNC_MAX_KEEPALIVE', '200'))
+
+client = None
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global client
+    client = httpx.AsyncClient(
+        verify=False,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_KEEPALIVE),
+    )
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+async def fetch_with_retry(url, timeout=15, retries=2, extra_headers=None, stream=False, source='other'):
+    """Async fetch with protocol switching, retries and circuit breaking, as in app.py"""
+    headers = upstream_headers(extra_headers)
+    breaker = circuit.breakers.get(url)
+    tracker = latency.trackers.get(url)
+
+    for attempt in range(retries):
+        if not breaker.allow():
+            upstream_requests.inc(source, 'circuit_open')
+            return None
+        if attempt:
+            upstream_retries.inc(source)
+        start = time.perf_counter()
+        try:
+            # As in app.py, a streamed body's reads keep the caller's timeout
+            request_timeout = tracker.timeout(timeout)
+            request = client.build_request('GET', http_client.upstream_url(url), headers=headers,
+                                           timeout=httpx.Timeout(timeout, connect=request_timeout)
+                                           if stream else request_timeout)
+            response = await client.send(request, stream=True)
+            elapsed = time.perf_counter() - start
+            upstream_latency.observe(elapsed, source)
+            tracker.observe(elapsed)
+            breaker.record(not circuit.is_failure_status(response.status_code))
+            if acceptable_status(response.status_code, headers):
+                upstream_requests.inc(source, 'ok')
+                if not stream:
+                    await response.aread()
+                return response
+            upstream_requests.inc(source, f'http_{response.status_code // 100}xx')
+            await response.aclose()
+        except Exception as error:
+            elapsed = time.perf_counter() - start
+            upstream_latency.observe(elapsed, source)
+            timed_out = isinstance(error, httpx.TimeoutException)
+            upstream_requests.inc(source, 'timeout' if timed_out else 'error')
+            if timed_out:
+                tracker.observe(elapsed)
+            breaker.record(False)
+            if attempt == 0 and url.startswith('https://'):
+                upstream_fallbacks.inc(source)
+                url = url.replace('https://', 'http://')
+                continue
+        if attempt + 1 < retries:
+            await asyncio.sleep(circuit.backoff(attempt + 1))
+
+    return None
+
+
+async def get_duckduckgo_instant_answer(query):
+    """Async instant answer lookup, cached and coalesced like app.py's"""
+    answer, _ = await answer_flights.do(normalize_query(query), lambda: lookup_instant_answer(query))
+    return answer
+
+
+async def lookup_instant_answer(query):
+    """Fetch and remember the instant answer for query"""
+    answer = None
+    try:
+        with timing.phase('instant_answer'):
+            response = await fetch_with_retry(instant_answer_url(query), timeout=8, source='instant_answer')
+        if response:
+            answer = instant_answer_from(response.json())
+    except Exception:
+        pass
+    return remember_instant_answer(query, answer)
+
+
+async def scrape_engine(engine, query):
+    """Fetch an engine's result pages in order until one has results"""
+    if engine not in EXTRACTORS:
+        engine = 'duckduckgo'
+    started = time.monotonic()
+    results = []
+    try:
+        for search_url in engine_urls(engine, query):
+            with timing.phase('fetch'):
+                response = await fetch_with_retry(search_url, source=engine)
+            if response:
+                # Parsing is CPU work - keep it off the event loop
+                with parse_seconds.time(engine), timing.phase('parse'):
+                    results = await asyncio.to_thread(EXTRACTORS[engine], response.text)
+                if results:
+                    break
+    except Exception:
+        results = []
+    search_results.observe(len(results), engine)
+    engine_health.record(engine, bool(results), time.monotonic() - started)
+    return results
+
+
+async def cached_scrape(engine, query):
+    """Engine results via the search cache (stale entries refresh in the background)"""
+    key = (normalize_query(query), engine, 1)
+
+    async def load():
+        timing.note('cache', 'miss')
+        return await scrape_engine(engine, query)
+
+    async def coalesced_load():
+        results, leader = await search_flights.do(key, load)
+        if not leader:
+            timing.note('cache', 'coalesced')
+        return results
+
+    timing.note('cache', 'hit')
+    return list(await search_cache.aget_or_load(key, coalesced_load))
+
+
+async def search_with_fallback(engine, query, deadline):
+    """(results, serving engine), falling back like app.search_with_fallback"""
+    loop = asyncio.get_running_loop()
+    primary = primary_engine(engine)
+    results = await cached_scrape(primary, query)
+    if results:
+        return results, primary
+    for fallback in engine_health.fallbacks(primary):
+        if loop.time() >= deadline:
+            break
+        results = await cached_scrape(fallback, query)
+        if results:
+            search_fallbacks.inc(primary, fallback)
+            return results, fallback
+    return [], None
+
+
+async def timed_scrape(engine, query):
+    started = time.monotonic()
+    try:
+        results = await cached_scrape(engine, query)
+    except Exception:
+        return 'error', [], time.monotonic() - started
+    return ('ok' if results else 'empty'), results, time.monotonic() - started
+
+
+# Scrapes and instant answers that missed their deadline, still filling caches
+late_tasks = set()
+
+
+def run_late(tasks):
+    for task in tasks:
+        late_tasks.add(task)
+        task.add_done_callback(late_tasks.discard)
+
+
+async def search_federated(engines, query, deadline):
+    """(fused results, per-engine report) like app.search_federated"""
+    loop = asyncio.get_running_loop()
+    tasks = {asyncio.ensure_future(timed_scrape(e, query)): e for e in engines}
+    done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - loop.time()))
+    run_late(pending)
+    outcomes = {tasks[task]: task.result() for task in done}
+    if not outcomes:
+        search_deadline_exceeded.inc('results')
+    return federate(engines, outcomes)
+
+
+async def index(request):
+    try:
+        with open('index.html', 'r', encoding='utf-8') as f:
+            return HTMLResponse(f.read())
+    except OSError:
+        return PlainTextResponse("OmniSearch Backend Running. Please add index.html")
+
+
+async def search(request):
+    """Enhanced search with instant answers"""
+    query = request.query_params.get('q', '').strip()
+    engine = request.query_params.get('engine', 'duckduckgo').lower()
+
+    if not query:
+        return JSONResponse({'success': False, 'error': 'No query', 'results': []})
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SEARCH_DEADLINE
+
+    # Instant answer (DuckDuckGo AI) and engine results run concurrently
+    instant_answer = answer_cache.get(normalize_query(query))
+    answer_task = None
+    if instant_answer is None:
+        answer_task = asyncio.ensure_future(get_duckduckgo_instant_answer(query))
+
+    engines = requested_engines(engine)
+    engine_report = None
+    if engines:
+        results, engine_report = await search_federated(engines, query, deadline)
+        served_by = ','.join(e for e in engines if engine_report[e]['contributed']) or None
+    else:
+        # Shielded: a scrape that misses the deadline still fills the cache
+        results_task = asyncio.ensure_future(search_with_fallback(engine, query, deadline))
+        try:
+            results, served_by = await asyncio.wait_for(asyncio.shield(results_task),
+                                                        timeout=max(0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            run_late([results_task])
+            search_deadline_exceeded.inc('results')
+            results, served_by = [], None
+
+    # The instant answer may take whatever is left of the deadline; shielded
+    # so it can still land in the answer cache for the next request
+    if answer_task is not None:
+        now = loop.time()
+        answer_timeout = instant_answer_wait(deadline, now, now)
+        try:
+            instant_answer = await asyncio.wait_for(asyncio.shield(answer_task), timeout=answer_timeout)
+        except asyncio.TimeoutError:
+            run_late([answer_task])
+            search_deadline_exceeded.inc('instant_answer')
+            instant_answer = {'has_answer': False}
+
+    with timing.phase('serialize'):
+        return ResultJSONResponse(search_payload(query, engine, results, instant_answer, served_by, engine_report))
+
+
+async def search_stream(request):
+    """Streamed /api/search, like app.search_stream"""
+    query = request.query_params.get('q', '').strip()
+    engine = request.query_params.get('engine', 'duckduckgo').lower()
+    fmt = event_stream.negotiate(request.headers.get('accept'), request.query_params.get('format'))
+    media_type = event_stream.MIMETYPES[fmt]
+
+    if not query:
+        return Response(event_stream.encode(fmt, 'summary', {'success': False, 'error': 'No query', 'order': []}),
+                        media_type=media_type, headers=event_stream.STREAM_HEADERS)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SEARCH_DEADLINE
+    pending = {}
+    instant_answer = answer_cache.get(normalize_query(query))
+    if instant_answer is None:
+        pending[asyncio.ensure_future(get_duckduckgo_instant_answer(query))] = None
+    engines = requested_engines(engine)
+    if engines:
+        for e in engines:
+            pending[asyncio.ensure_future(timed_scrape(e, query))] = e
+    else:
+        pending[asyncio.ensure_future(search_with_fallback(engine, query, deadline))] = engine
+
+    async def generate():
+        nonlocal instant_answer
+        outcomes = {}
+        results, served_by = [], None
+        results_done_at = None
+        try:
+            if instant_answer is not None and instant_answer['has_answer']:
+                yield event_stream.encode(fmt, 'instant_answer', instant_answer)
+            while pending:
+                timeout = deadline - loop.time()
+                if results_done_at is not None:
+                    timeout = instant_answer_wait(deadline, results_done_at, loop.time())
+                done, _ = await asyncio.wait(pending, timeout=max(0, timeout), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    source = pending.pop(task)
+                    if source is None:
+                        instant_answer = task.result()
+                        if instant_answer['has_answer']:
+                            yield event_stream.encode(fmt, 'instant_answer', instant_answer)
+                    elif engines:
+                        outcomes[source] = task.result()
+                        outcome, batch, seconds = outcomes[source]
+                        yield event_stream.encode(fmt, 'results', {
+                            'engine': source, 'outcome': outcome, 'ms': round(seconds * 1000, 1), 'results': batch,
+                        })
+                    else:
+                        results, served_by = task.result()
+                        yield event_stream.encode(fmt, 'results', {'engine': served_by, 'results': results})
+                if results_done_at is None and all(source is None for source in pending.values()):
+                    results_done_at = loop.time()
+        finally:
+            run_late(pending)
+
+        if None in pending.values():
+            search_deadline_exceeded.inc('instant_answer')
+        if instant_answer is None:
+            instant_answer = {'has_answer': False}
+        engine_report = None
+        if engines:
+            if not outcomes:
+                search_deadline_exceeded.inc('results')
+            results, engine_report = federate(engines, outcomes)
+            served_by = ','.join(e for e in engines if engine_report[e]['contributed']) or None
+        elif results_done_at is None:
+            search_deadline_exceeded.inc('results')
+        payload = search_payload(query, engine, results, instant_answer, served_by, engine_report)
+        yield event_stream.encode(fmt, 'summary', stream_summary(payload))
+
+    return StreamingResponse(generate(), media_type=media_type, headers=event_stream.STREAM_HEADERS)
+
+
+async def body_chunks(response, body=None):
+    if body is not None:
+        proxy_bytes_in.inc('html', amount=len(body))
+        yield body
+        return
+    timer = timing.current()
+    chunks = response.aiter_bytes(PROXY_CHUNK_SIZE)
+    while True:
+        # Reading the rest of the body is upstream time too
+        start = time.perf_counter()
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            if timer is not None:
+                timer.add('fetch', time.perf_counter() - start)
+        proxy_bytes_in.inc('html', amount=len(chunk))
+        yield chunk
+
+
+async def stream_passthrough_body(response, writer=None, done=None):
+    """Relay raw upstream bytes, teeing them into the asset cache; done(stored) at the end"""
+    try:
+        async for chunk in response.aiter_raw(PROXY_CHUNK_SIZE):
+            proxy_bytes_in.inc('passthrough', amount=len(chunk))
+            proxy_bytes_out.inc('passthrough', amount=len(chunk))
+            if writer:
+                await asyncio.to_thread(writer.write, chunk)
+            yield chunk
+    except BaseException:
+        if writer:
+            writer.abort()
+        raise
+    else:
+        if writer:
+            # Renames the file into place and may rescan/evict the cache directory
+            await asyncio.to_thread(writer.commit)
+            if done:
+                done(True)
+    finally:
+        if done:
+            done(False)
+        await response.aclose()
+
+
+def encoded(text, kind='html'):
+    with timing.phase('serialize'):
+        data = text.encode('utf-8')
+    proxy_bytes_out.inc(kind, amount=len(data))
+    return data
+
+
+def rewrite_chunk(rewriter, recorder, chunk):
+    """Rewrite one upstream chunk (None: end of page), recording both sides"""
+    if chunk is None:
+        out = rewriter.close()
+    else:
+        if recorder:
+            recorder.body(chunk)
+        out = rewriter.feed(chunk)
+    if out and recorder:
+        recorder.output(out)
+    if chunk is None and recorder:
+        recorder.finish()
+    return out
+
+
+async def rewrite_stream(response, target_url, recorder=None, body=None, done=None):
+    """Rewrite HTML as it arrives, recording it for the page cache; done(stored) at the end"""
+    rewriter = StreamRewriter(response, target_url, proxy_bar(target_url))
+    try:
+        # Tokenizing and rewriting is CPU work - keep it off the event loop
+        async for chunk in body_chunks(response, body):
+            out = await asyncio.to_thread(rewrite_chunk, rewriter, recorder, chunk)
+            if recorder and recorder.dropped and done:
+                # Too big to store: nobody should keep waiting for it
+                done(False)
+            if out:
+                yield encoded(out)
+        out = await asyncio.to_thread(rewrite_chunk, rewriter, recorder, None)
+        if out:
+            yield encoded(out)
+        if recorder and done:
+            done(True)
+    finally:
+        if done:
+            done(False)
+        await response.aclose()
+        timer = timing.current()
+        if timer is not None:
+            parse, rewrite = rewriter.timings()
+            timer.add('parse', parse)
+            timer.add('rewrite', rewrite)
+
+
+async def serve_asset(entry):
+    timing.note('cache', 'asset')
+    proxy_bytes_in.inc('asset_cache', amount=entry.meta['size'])
+    proxy_bytes_out.inc('asset_cache', amount=entry.meta['size'])
+    await asyncio.to_thread(asset_cache.touch, entry)
+    headers = asset_cache.hit_headers(entry)
+    headers['Cache-Control'] = f"public, max-age={max(0, int(entry.meta['fresh_until'] - time.time()))}"
+    return PassthroughFileResponse(entry.path, media_type=entry.meta['content_type'], headers=headers)
+
+
+async def cached_page_response(request, target_url, page):
+    timing.note('cache', 'page')
+    html = page_cache.body(target_url, page)
+    proxy_bytes_in.inc('page_cache', amount=len(html))
+    proxy_bytes_out.inc('page_cache', amount=len(html))
+    headers = {'X-Cache': 'HIT'}
+    encoding = None
+    if len(html) >= compression.COMPRESS_MIN_BYTES:
+        encoding = compression.negotiate(request.headers.get('accept-encoding'))
+    if encoding is None:
+        return HTMLResponse(html, headers=headers)
+    # Compresses on the first request for this encoding
+    with timing.phase('compress'):
+        body = await asyncio.to_thread(page_cache.body, target_url, page, encoding)
+    count_compressed(encoding, len(html), len(body))
+    headers['Content-Encoding'] = encoding
+    return HTMLResponse(body, headers=headers)
+
+
+async def proxy(request):
+    """Advanced proxy with ChatGPT support"""
+    url_param = request.query_params.get('url', '')
+
+    if not url_param:
+        return PlainTextResponse('No URL', 400)
+
+    try:
+        target_url = base64.b64decode(url_param).decode('utf-8')
+    except Exception:
+        return PlainTextResponse('Invalid URL', 400)
+
+    # Special handling for ChatGPT/AI sites
+    if is_ai_site(target_url):
+        return HTMLResponse(CHATGPT_PAGE)
+
+    # Static assets we already have on disk
+    cached = await asyncio.to_thread(asset_cache.lookup, target_url)
+    if cached and not cached.acceptable(request.headers.get('Accept-Encoding', '')):
+        cached = None
+    if cached and cached.is_fresh():
+        return await serve_asset(cached)
+
+    # Someone is already fetching this URL: wait for it to fill the cache
+    future, leader = proxy_flights.begin(target_url)
+    if not leader:
+        with timing.phase('coalesce'):
+            finished = await proxy_flights.wait(target_url, future, PROXY_COALESCE_WAIT)
+        if finished and future.result():
+            response = await coalesced_response(request, target_url)
+            if response is not None:
+                timing.note('cache', 'coalesced')
+                return response
+        return await fetch_proxied(request, target_url, cached)
+
+    # Followers are released once this fetch has (True) or won't have (False)
+    # left something cached for them; streamed bodies release when they end
+    def release(shared):
+        proxy_flights.end(target_url, future, shared)
+
+    try:
+        return await fetch_proxied(request, target_url, cached, release)
+    except BaseException:
+        release(False)
+        raise
+
+
+async def coalesced_response(request, target_url):
+    """What an identical request that just finished left in the caches, or None"""
+    cached = await asyncio.to_thread(asset_cache.lookup, target_url)
+    if cached and cached.is_fresh() and cached.acceptable(request.headers.get('Accept-Encoding', '')):
+        return await serve_asset(cached)
+    page = page_cache.lookup(target_url)
+    if page:
+        return await cached_page_response(request, target_url, page)
+    return None
+
+
+async def fetch_proxied(request, target_url, cached=None, release=None):
+    """Fetch, revalidate or rewrite target_url, like app.fetch_proxied"""
+    if release is None:
+        release = lambda shared: None
+
+    # Rewritten HTML from a previous view of this page
+    page = page_cache.lookup(target_url)
+
+    extra_headers = passthrough_request_headers(request.headers)
+    if cached:
+        extra_headers.update(cached.validators())
+    elif page:
+        extra_headers.update(page_cache.validators(page))
+    with timing.phase('fetch'):
+        response = await fetch_with_retry(target_url, extra_headers=extra_headers, stream=True, source='proxy')
+
+    if response is not None and response.status_code == 304:
+        await response.aclose()
+        if cached:
+            await asyncio.to_thread(asset_cache.refresh, cached, response.headers)
+            release(True)
+            return await serve_asset(cached)
+        release(True)
+        page_cache.count(True)
+        return await cached_page_response(request, target_url, page)
+
+    if not response:
+        release(False)
+        return HTMLResponse(cannot_load_page(target_url), 502)
+
+    content_type = response.headers.get('Content-Type', '')
+
+    # Non-HTML bodies, and ranges of HTML pages (a fragment can't be
+    # rewritten), go out unmodified with their status and Content-Range
+    if 'text/html' not in content_type or response.status_code == 206:
+        headers = {name: response.headers[name] for name in PASSTHROUGH_RESPONSE_HEADERS if name in response.headers}
+        writer = await asyncio.to_thread(asset_cache.writer, target_url, response)
+        if writer is None:
+            release(False)
+        body = stream_passthrough_body(response, writer, release)
+        if writer:
+            # Fill the asset cache at upstream speed, not this client's
+            body = async_read_ahead(body, PROXY_READ_AHEAD_BYTES)
+        return PassthroughStreamingResponse(body, status_code=response.status_code, headers=headers,
+                                            media_type=content_type or None)
+
+    body = None
+    if page:
+        if page_cache.unchanged(page, response.headers):
+            await response.aclose()
+            release(True)
+            return await cached_page_response(request, target_url, page)
+        if not page_cache.has_validators(response.headers):
+            # No validators to go on - compare the body itself
+            with timing.phase('fetch'):
+                body = await response.aread()
+            if await asyncio.to_thread(page_cache.same_body, page, body):
+                await response.aclose()
+                release(True)
+                return await cached_page_response(request, target_url, page)
+
+    recorder = page_cache.recorder(target_url, response.status_code, response.headers,
+                                   page_cache.is_ranged(request.headers))
+    html = rewrite_stream(response, target_url, recorder, body, release)
+    if recorder is None:
+        release(False)
+    else:
+        # Rewrite and store the page at upstream speed, not this client's
+        html = async_read_ahead(html, PROXY_READ_AHEAD_BYTES)
+    return StreamingResponse(html, media_type='text/html; charset=utf-8')
+
+
+async def health(request):
+    return JSONResponse(flask_app.health_status())
+
+
+async def metrics_endpoint(request):
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/search', search, methods=['GET']),
+        Route('/api/search/stream', search_stream, methods=['GET']),
+        Route('/api/proxy', proxy, methods=['GET']),
+        Route('/health', health),
+        Route('/metrics', metrics_endpoint),
+    ],
+    middleware=[
+        Middleware(TimingMiddleware),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(CompressionMiddleware),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,385 @@
+"""
+On-disk cache for proxied static assets (CSS, JS, fonts, images)
+Keyed by absolute URL, honors Cache-Control/Expires, revalidates stale
+entries with ETag/Last-Modified and evicts least recently used files past
+a byte budget. Every worker process shares the directory, so the budget is
+checked against its real size: each worker rescans it periodically, and
+hits bump the file's access time so other workers' LRU order sees them.
+Hits are served with send_file so the body goes out via
+the server's file wrapper (sendfile) instead of being read into Python.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from flask import send_file
+from requests.structures import CaseInsensitiveDict
+
+STATIC_TYPES = ('text/css', 'javascript', 'image/', 'font/', 'application/font', 'application/x-font',
+                'application/vnd.ms-fontobject', 'application/wasm')
+
+# Freshness given to entries that only carry Last-Modified (fraction of age, cap)
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX = 24 * 3600
+
+# Seconds between rescans of the shared directory for its size and LRU order
+SCAN_INTERVAL = float(os.environ.get('ASSET_CACHE_SCAN_SECONDS', '30'))
+# Partial downloads older than this were abandoned by a worker that died
+STALE_TMP_SECONDS = 3600
+
+
+def parse_cache_control(value):
+    """Cache-Control header -> {directive: value or True}"""
+    directives = {}
+    for part in value.split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else True
+    return directives
+
+
+def http_date(value):
+    """Parse an HTTP date to a unix timestamp (None if invalid)"""
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, now):
+    """
+    Seconds the response may be served without revalidation, 0 if it must
+    always be revalidated, or None if it must not be stored at all
+    """
+    cc = parse_cache_control(headers.get('Cache-Control', ''))
+    if 'no-store' in cc or 'private' in cc or headers.get('Vary', '').strip() == '*':
+        return None
+    has_validator = 'ETag' in headers or 'Last-Modified' in headers
+    if 'no-cache' in cc:
+        return 0 if has_validator else None
+    for directive in ('s-maxage', 'max-age'):
+        if directive in cc:
+            try:
+                return max(0, int(cc[directive]))
+            except (TypeError, ValueError):
+                return 0
+    if 'Expires' in headers:
+        expires = http_date(headers['Expires'])
+        return max(0, int(expires - now)) if expires else 0
+    last_modified = http_date(headers.get('Last-Modified'))
+    if last_modified:
+        return int(min(HEURISTIC_MAX, max(0, now - last_modified) * HEURISTIC_FRACTION))
+    return 0 if has_validator else None
+
+
+class CachedAsset:
+    __slots__ = ('key', 'path', 'meta')
+
+    def __init__(self, key, path, meta):
+        self.key = key
+        self.path = path
+        self.meta = meta
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.meta['fresh_until']
+
+    def validators(self):
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+    def acceptable(self, accept_encoding):
+        """Can this stored body be sent to a client with this Accept-Encoding?"""
+        encoding = self.meta.get('content_encoding')
+        if not encoding:
+            return True
+        accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+        return encoding.lower() in accepted
+
+
+class AssetWriter:
+    """Tees a streamed upstream body into the cache; stores only if complete"""
+
+    def __init__(self, cache, url, headers, lifetime):
+        self.cache = cache
+        self.url = url
+        self.headers = headers
+        self.lifetime = lifetime
+        self.key = cache.key(url)
+        # Unique per writer: concurrent misses for one URL each get their own file
+        fd, self.tmp = tempfile.mkstemp(prefix=f'{self.key}.', suffix='.tmp', dir=cache.directory)
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.failed = False
+
+    def write(self, chunk):
+        if self.failed:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_object_bytes:
+            self.abort()
+            return
+        try:
+            self.file.write(chunk)
+        except OSError:
+            self.abort()
+
+    def abort(self):
+        self.failed = True
+        self.file.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+    def commit(self):
+        if self.failed:
+            return
+        try:
+            self.file.flush()
+            on_disk = os.fstat(self.file.fileno()).st_size
+        except OSError:
+            on_disk = None
+        self.file.close()
+        expected = self.headers.get('Content-Length')
+        if on_disk != self.size or (expected is not None and expected.isdigit() and int(expected) != self.size):
+            self.abort()
+            return
+        self.cache.store(self.key, self.tmp, self.size, self.url, self.headers, self.lifetime)
+
+
+class AssetCache:
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_object_bytes=32 * 1024 * 1024,
+                 scan_interval=SCAN_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.scan_interval = scan_interval
+        self.enabled = max_bytes > 0
+        self._lock = threading.Lock()
+        self._index = {}  # key -> [size, last_access], as of the last scan plus our own stores
+        self._scanned_at = 0.0
+        self.bytes = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    def _scan(self):
+        """Rebuild the index from the directory, which other workers write to too"""
+        index = {}
+        total = 0
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for item in entries:
+            try:
+                st = item.stat()
+            except OSError:
+                continue
+            if item.name.endswith('.tmp'):
+                if now - st.st_mtime > STALE_TMP_SECONDS:
+                    try:
+                        os.remove(item.path)
+                    except OSError:
+                        pass
+            elif item.name.endswith('.body'):
+                index[item.name[:-5]] = [st.st_size, st.st_atime]
+                total += st.st_size
+        with self._lock:
+            self._index = index
+            self.bytes = total
+            self._scanned_at = time.monotonic()
+
+    def key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.body', base + '.json'
+
+    @staticmethod
+    def is_static(content_type):
+        content_type = content_type.lower()
+        return any(t in content_type for t in STATIC_TYPES)
+
+    def lookup(self, url):
+        """Cached entry for url (fresh or stale), or None"""
+        if not self.enabled:
+            return None
+        key = self.key(url)
+        body, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        if meta.get('url') != url or not os.path.exists(body):
+            with self._lock:
+                self.misses += 1
+            return None
+        return CachedAsset(key, body, meta)
+
+    def writer(self, url, response):
+        """AssetWriter for a 200 static response worth storing, else None"""
+        if not self.enabled or response.status_code != 200:
+            return None
+        if not self.is_static(response.headers.get('Content-Type', '')):
+            return None
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > self.max_object_bytes:
+            return None
+        lifetime = freshness_lifetime(response.headers, time.time())
+        if lifetime is None:
+            return None
+        try:
+            return AssetWriter(self, url, CaseInsensitiveDict(response.headers), lifetime)
+        except OSError:
+            return None
+
+    def store(self, key, tmp_path, size, url, headers, lifetime):
+        body, meta_path = self._paths(key)
+        meta = {
+            'url': url,
+            'content_type': headers.get('Content-Type', 'application/octet-stream'),
+            'content_encoding': headers.get('Content-Encoding'),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'cache_control': headers.get('Cache-Control'),
+            'fresh_until': time.time() + lifetime,
+            'size': size,
+        }
+        try:
+            os.replace(tmp_path, body)
+            self._write_meta(meta_path, meta)
+        except OSError:
+            return
+        with self._lock:
+            old = self._index.get(key)
+            if old:
+                self.bytes -= old[0]
+            self._index[key] = [size, time.time()]
+            self.bytes += size
+            self.stores += 1
+        self._evict()
+
+    def _write_meta(self, meta_path, meta):
+        tmp = f'{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def refresh(self, entry, headers):
+        """Entry was revalidated (304): extend its freshness from the new headers"""
+        now = time.time()
+        merged = {
+            'Cache-Control': headers.get('Cache-Control', entry.meta.get('cache_control') or ''),
+            'ETag': headers.get('ETag', entry.meta.get('etag')),
+            'Last-Modified': headers.get('Last-Modified', entry.meta.get('last_modified')),
+        }
+        if 'Expires' in headers:
+            merged['Expires'] = headers['Expires']
+        merged = {k: v for k, v in merged.items() if v is not None}
+        lifetime = freshness_lifetime(merged, now)
+        entry.meta['fresh_until'] = now + (lifetime or 0)
+        entry.meta['etag'] = merged.get('ETag')
+        entry.meta['last_modified'] = merged.get('Last-Modified')
+        entry.meta['cache_control'] = merged.get('Cache-Control')
+        try:
+            self._write_meta(self._paths(entry.key)[1], entry.meta)
+        except OSError:
+            pass
+        with self._lock:
+            self.revalidated += 1
+
+    def _evict(self):
+        if time.monotonic() - self._scanned_at >= self.scan_interval:
+            self._scan()
+        with self._lock:
+            if self.bytes <= self.max_bytes:
+                return
+            victims = []
+            for key, (size, last_access) in sorted(self._index.items(), key=lambda kv: kv[1][1]):
+                if self.bytes <= self.max_bytes:
+                    break
+                victims.append(key)
+                self.bytes -= size
+                del self._index[key]
+                self.evictions += 1
+        for key in victims:
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def touch(self, entry):
+        """Count a hit and mark the entry recently used, for every worker"""
+        now = time.time()
+        with self._lock:
+            self.hits += 1
+            if entry.key in self._index:
+                self._index[entry.key][1] = now
+        try:
+            # Access time only: the modification time may be sent as Last-Modified
+            os.utime(entry.path, ns=(int(now * 1e9), os.stat(entry.path).st_mtime_ns))
+        except OSError:
+            pass
+
+    @staticmethod
+    def hit_headers(entry):
+        """Stored upstream headers to send with a cache hit"""
+        headers = {'X-Cache': 'HIT'}
+        if entry.meta.get('etag'):
+            headers['ETag'] = entry.meta['etag']
+        if entry.meta.get('last_modified'):
+            headers['Last-Modified'] = entry.meta['last_modified']
+        if entry.meta.get('content_encoding'):
+            headers['Content-Encoding'] = entry.meta['content_encoding']
+        return headers
+
+    def serve(self, entry):
+        """Response for a cache hit, sent from disk"""
+        self.touch(entry)
+        response = send_file(
+            entry.path,
+            mimetype=entry.meta['content_type'],
+            conditional=True,
+            etag=False,
+            last_modified=http_date(entry.meta.get('last_modified')),
+            max_age=max(0, int(entry.meta['fresh_until'] - time.time())),
+        )
+        response.headers.update(self.hit_headers(entry))
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._index),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else 0.0,
+            }
@@ -0,0 +1,102 @@
+"""
+Parser backend benchmark - per-engine parse time for each HTML backend
+Runs every app.py scrape_* extraction and parser.py parse_* function on the
+offline fixtures with each backend, checks the extracted results are
+identical, and prints a before (html.parser) / after (lxml) table.
+
+Usage: python benchmarks/bench_parsers.py [--iterations N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+import html_backend  # noqa: E402
+import parser as py_parser  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+
+
+class FixtureResponse:
+    """Stands in for a requests.Response carrying a saved page"""
+
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+        self.headers = {'Content-Type': 'text/html; charset=utf-8'}
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, f'{name}.html'), encoding='utf-8') as f:
+        return f.read()
+
+
+def scraper(func, html):
+    """Run an app.py scraper against a fixture instead of the network"""
+    def run():
+        original = app.fetch_with_retry
+        app.fetch_with_retry = lambda *args, **kwargs: FixtureResponse(html)
+        try:
+            return func('potato homework help')
+        finally:
+            app.fetch_with_retry = original
+    return run
+
+
+def cases():
+    pages = {name: load(name) for name in ('duckduckgo', 'google', 'brave', 'startpage')}
+    return [
+        ('app.scrape_duckduckgo', scraper(app.scrape_duckduckgo, pages['duckduckgo'])),
+        ('app.scrape_google', scraper(app.scrape_google, pages['google'])),
+        ('app.scrape_brave', scraper(app.scrape_brave, pages['brave'])),
+        ('app.scrape_startpage', scraper(app.scrape_startpage, pages['startpage'])),
+        ('parser.parse_duckduckgo', lambda: py_parser.parse_duckduckgo(pages['duckduckgo'])),
+        ('parser.parse_google', lambda: py_parser.parse_google(pages['google'])),
+        ('parser.parse_brave', lambda: py_parser.parse_brave(pages['brave'])),
+    ]
+
+
+def timed(func, iterations):
+    """Median milliseconds per call"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument('--iterations', type=int, default=30)
+    args = ap.parse_args()
+
+    if not html_backend.HAS_LXML:
+        sys.exit('lxml/cssselect not installed - nothing to compare')
+
+    print(f"{'case':<26}{'results':>8}{'html.parser ms':>16}{'lxml ms':>10}{'speedup':>9}  output")
+    mismatches = 0
+    for name, func in cases():
+        times = {}
+        outputs = {}
+        for backend in ('html.parser', 'lxml'):
+            html_backend.BACKEND = backend
+            outputs[backend] = func()
+            times[backend] = timed(func, args.iterations)
+        same = outputs['html.parser'] == outputs['lxml']
+        mismatches += not same
+        print(
+            f"{name:<26}{len(outputs['lxml']):>8}{times['html.parser']:>16.2f}{times['lxml']:>10.2f}"
+            f"{times['html.parser'] / times['lxml']:>8.1f}x  {'identical' if same else 'MISMATCH'}"
+        )
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Hot-path benchmark suite - offline, against the fixture corpus
+Times every app.py scrape_* extraction, parser.py parse_* function,
+calculate_relevance, the batch relevance scorers, result de-duplication,
+search response serialization and the /api/proxy HTML rewrite, reporting
+throughput, latency percentiles and peak traced memory per case. Results are compared
+with a stored baseline and any case slower or hungrier than the allowed
+margin is flagged as a regression (exit status 1).
+
+Usage:
+    python benchmarks/bench_suite.py                   # run and compare
+    python benchmarks/bench_suite.py --save-baseline   # record a new baseline
+    python benchmarks/bench_suite.py --filter proxy --iterations 50
+"""
+
+import argparse
+import base64
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+import parser as py_parser  # noqa: E402
+import relevance  # noqa: E402
+import dedup  # noqa: E402
+import result_model  # noqa: E402
+from rewriter import rewrite_stream  # noqa: E402
+from bench_parsers import FixtureResponse, load, scraper  # noqa: E402
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+QUERY = 'potato homework help'
+PROXY_TARGET = 'https://en.example.org/wiki/Potato'
+
+
+class FixtureStream(FixtureResponse):
+    """Streaming upstream response for a saved page, as the proxy reads it"""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.content = text.encode('utf-8')
+        self.encoding = 'utf-8'
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def rewriter_case(html):
+    """Streaming rewrite of a page, as /api/proxy runs it"""
+    bar = app.proxy_bar(PROXY_TARGET)
+
+    def run():
+        return ''.join(rewrite_stream(FixtureStream(html), PROXY_TARGET, bar))
+    return run
+
+
+def proxy_case(html):
+    """Full /api/proxy request through Flask, page cache bypassed"""
+    client = app.app.test_client()
+    url = base64.b64encode(PROXY_TARGET.encode()).decode()
+
+    def run():
+        fetch, lookup = app.fetch_with_retry, app.page_cache.lookup
+        app.fetch_with_retry = lambda *args, **kwargs: FixtureStream(html)
+        app.page_cache.lookup = lambda target: None
+        try:
+            return client.get(f'/api/proxy?url={url}').get_data(as_text=True)
+        finally:
+            app.fetch_with_retry, app.page_cache.lookup = fetch, lookup
+    return run
+
+
+def relevance_case(results):
+    keywords = QUERY.split()
+
+    def run():
+        return [py_parser.calculate_relevance(r, keywords) for r in results]
+    return run
+
+
+def batch_relevance_case(results, mode):
+    keywords = QUERY.split()
+
+    def run():
+        return relevance.score_results(results, keywords, mode)
+    return run
+
+
+def jsonify_case(payload):
+    def run():
+        with app.app.app_context():
+            return app.jsonify(payload).get_data()
+    return run
+
+
+def cases():
+    """(name, bytes of input per call, callable)"""
+    pages = {name: load(name) for name in ('duckduckgo', 'google', 'brave', 'startpage')}
+    articles = {name: load(name) for name in ('article_medium', 'article_large')}
+    parsed = []
+    for engine in ('duckduckgo', 'google', 'brave'):
+        parsed += py_parser.parse_page(engine, pages[engine])
+
+    found = []
+    for engine, html in pages.items():
+        found.append((f'app.scrape_{engine}', len(html), scraper(getattr(app, f'scrape_{engine}'), html)))
+    for engine in ('duckduckgo', 'google', 'brave'):
+        html = pages[engine]
+        found.append((f'parser.parse_{engine}', len(html),
+                      lambda func=getattr(py_parser, f'parse_{engine}'), html=html: func(html)))
+    found.append((f'parser.calculate_relevance[{len(parsed)}]', 0, relevance_case(parsed)))
+    for mode in ('classic', 'bm25'):
+        found.append((f'relevance.{mode}[{len(parsed)}]', 0, batch_relevance_case(parsed, mode)))
+    found.append((f'dedup.collapse[{len(parsed)}]', 0, lambda: dedup.collapse(parsed)))
+    payload = {'success': True, 'query': QUERY, 'results': parsed, 'count': len(parsed)}
+    found.append((f'jsonify[{len(parsed)}]', 0, jsonify_case(payload)))
+    found.append((f'result_model.dumps[{len(parsed)}]', 0, lambda: result_model.dumps(payload)))
+    for name, html in articles.items():
+        found.append((f'rewriter.rewrite_stream[{name}]', len(html), rewriter_case(html)))
+        found.append((f'app.proxy[{name}]', len(html), proxy_case(html)))
+    return found
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of sorted samples"""
+    index = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+def measure(func, iterations, min_time):
+    """Latency samples (ms) for at least `iterations` calls and `min_time` seconds"""
+    func()  # warm-up: imports, selector compilation, caches
+    samples = []
+    gc.collect()
+    started = time.perf_counter()
+    while len(samples) < iterations or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples
+
+
+def peak_memory(func):
+    """Peak traced allocation (bytes) during one call"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(func, size, iterations, min_time):
+    samples = measure(func, iterations, min_time)
+    mean = sum(samples) / len(samples)
+    return {
+        'calls': len(samples),
+        'ops_per_sec': round(1000 / mean, 1),
+        'mb_per_sec': round(size / 1e6 / (mean / 1000), 2) if size else None,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p90_ms': round(percentile(samples, 90), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'peak_kb': round(peak_memory(func) / 1024, 1),
+    }
+
+
+def compare(name, result, baseline, tolerance, memory_tolerance):
+    """Regression messages for one case against its baseline entry"""
+    old = baseline.get(name)
+    if not old:
+        return [], 'new'
+    problems = []
+    ratio = result['p50_ms'] / old['p50_ms'] if old['p50_ms'] else 1
+    if ratio > 1 + tolerance:
+        problems.append(f"{name}: p50 {old['p50_ms']:.2f} -> {result['p50_ms']:.2f} ms ({ratio:.2f}x)")
+    mem_ratio = result['peak_kb'] / old['peak_kb'] if old['peak_kb'] else 1
+    if mem_ratio > 1 + memory_tolerance:
+        problems.append(f"{name}: peak {old['peak_kb']:.0f} -> {result['peak_kb']:.0f} KB ({mem_ratio:.2f}x)")
+    return problems, f'{ratio:.2f}x'
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument('--iterations', type=int, default=30, help='minimum calls per case')
+    ap.add_argument('--min-time', type=float, default=0.5, help='minimum seconds per case')
+    ap.add_argument('--filter', default='', help='only run cases whose name contains this')
+    ap.add_argument('--baseline', default=BASELINE)
+    ap.add_argument('--save-baseline', action='store_true', help='write results as the new baseline')
+    ap.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 slowdown (0.25 = 25%%)')
+    ap.add_argument('--memory-tolerance', type=float, default=0.25, help='allowed peak memory growth')
+    ap.add_argument('--json', help='also write results to this file')
+    args = ap.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['cases']
+
+    results = {}
+    regressions = []
+    print(f"{'case':<42}{'ops/s':>9}{'MB/s':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'peak KB':>10}{'vs base':>9}")
+    for name, size, func in cases():
+        if args.filter not in name:
+            continue
+        result = results[name] = run_case(func, size, args.iterations, args.min_time)
+        problems, change = compare(name, result, baseline, args.tolerance, args.memory_tolerance)
+        regressions += problems
+        mb = f"{result['mb_per_sec']:.1f}" if result['mb_per_sec'] is not None else '-'
+        print(f"{name:<42}{result['ops_per_sec']:>9.1f}{mb:>8}{result['p50_ms']:>9.2f}{result['p90_ms']:>9.2f}"
+              f"{result['p99_ms']:>9.2f}{result['peak_kb']:>10.0f}{change if baseline else '-':>9}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'cases': results}, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'cases': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'\nBaseline written to {os.path.relpath(args.baseline)}')
+        return
+
+    if regressions:
+        print('\nRegressions:')
+        for line in regressions:
+            print(f'  {line}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Regenerate the offline engine result page fixtures
+Pages mirror the markup each scraper targets (result containers, redirect
+links, snippet classes) plus the surrounding noise real pages carry:
+inline scripts and styles, comments, entities, ads and navigation.
+Large article pages stand in for real-world sites fetched through the
+proxy: dense relative links, images, scripts and stylesheets to rewrite.
+Output is deterministic so benchmark numbers stay comparable.
+
+Usage: python benchmarks/make_fixtures.py
+"""
+
+import os
+import random
+from urllib.parse import quote
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+WORDS = (
+    'potato python search engine result fast parser lxml homework science '
+    'history math algebra biology chemistry physics essay library museum '
+    'planet ocean energy climate school student teacher lesson project '
+    'review guide tutorial example reference dictionary encyclopedia news'
+).split()
+
+DOMAINS = [
+    'en.wikipedia.org', 'www.britannica.com', 'www.khanacademy.org', 'stackoverflow.com',
+    'www.nationalgeographic.com', 'www.bbc.co.uk', 'developer.mozilla.org', 'docs.python.org',
+    'www.reddit.com', 'medium.com', 'www.quizlet.com', 'archive.org', 'github.com',
+    'www.nasa.gov', 'www.sciencedaily.com', 'www.merriam-webster.com',
+]
+
+
+def words(rng, lo, hi):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(lo, hi)))
+
+
+def bolded(rng, lo, hi):
+    """Text with a few <b> highlighted terms and entities, like engines emit"""
+    parts = []
+    for _ in range(rng.randint(lo, hi)):
+        w = rng.choice(WORDS)
+        r = rng.random()
+        if r < 0.15:
+            parts.append(f'<b>{w}</b>')
+        elif r < 0.18:
+            parts.append(f'{w} &amp;')
+        elif r < 0.20:
+            parts.append(f'{w}&nbsp;&middot;')
+        else:
+            parts.append(w)
+    return ' '.join(parts)
+
+
+def target_url(rng, i):
+    domain = rng.choice(DOMAINS)
+    return f'https://{domain}/{rng.choice(WORDS)}/{rng.choice(WORDS)}-{i}?ref={rng.randint(1, 999)}'
+
+
+def noise_script(rng, kb):
+    body = ';'.join(f'var _{i}="{words(rng, 4, 8)}"' for i in range(kb * 12))
+    return f'<script>{body}</script>'
+
+
+def noise_style(rng, rules):
+    body = ''.join(f'.c{i}{{margin:{rng.randint(0, 20)}px;color:#{rng.randint(0, 0xffffff):06x}}}' for i in range(rules))
+    return f'<style>{body}</style>'
+
+
+def page(title, head, body):
+    return (
+        '<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8">'
+        f'<title>{title}</title>{head}</head>\n<body>\n{body}\n</body></html>\n'
+    )
+
+
+def duckduckgo(rng, query, count=30):
+    blocks = []
+    for i in range(count):
+        url = target_url(rng, i)
+        redirect = f'//duckduckgo.com/l/?uddg={quote(url, safe="")}&amp;rut={rng.getrandbits(64):016x}'
+        blocks.append(
+            '<div class="result results_links results_links_deep web-result">\n'
+            '  <div class="links_main links_deep result__body"> <!-- This is the visible part -->\n'
+            f'    <h2 class="result__title"><a rel="nofollow" class="result__a" href="{redirect}">{bolded(rng, 3, 9)}</a></h2>\n'
+            '    <div class="result__extras"><div class="result__extras__url">'
+            f'<span class="result__icon"><img class="result__icon__img" width="16" height="16" alt="" src="//external-content.duckduckgo.com/ip3/{url.split("/")[2]}.ico" name="i15"></span>'
+            f'<a class="result__url" href="{redirect}">{url.split("/")[2]}/{url.split("/")[3]}</a></div></div>\n'
+            f'    <a class="result__snippet" href="{redirect}">{bolded(rng, 18, 40)}</a>\n'
+            '    <div class="clear"></div>\n  </div>\n</div>'
+        )
+    body = (
+        '<div id="header" class="header"><form action="/html/" method="post">'
+        f'<input type="text" name="q" value="{query}" class="search__input"></form></div>\n'
+        '<div id="links" class="results">\n' + '\n'.join(blocks) + '\n</div>\n'
+        '<div class="nav-link"><form action="/html/" method="post"><input type="submit" class="btn" value="Next"></form></div>'
+    )
+    return page(f'{query} at DuckDuckGo', noise_style(rng, 60), body)
+
+
+def google(rng, query, count=25):
+    blocks = []
+    for i in range(count):
+        url = target_url(rng, i)
+        href = f'/url?q={quote(url, safe=":/")}&amp;sa=U&amp;ved=2ahUKEw{rng.getrandbits(40):x}&amp;usg=AOvVaw{rng.getrandbits(40):x}'
+        blocks.append(
+            '<div class="g"><div class="tF2Cxc" data-sokoban-container="SC_' + str(i) + '">'
+            f'<div class="yuRUbf"><a href="{href}" data-ved="x"><br><h3 class="LC20lb MBeuO DKV0Md">{words(rng, 4, 10).title()}</h3>'
+            f'<div class="TbwUpd"><cite class="iUh30">{url.split("/")[2]} &rsaquo; {rng.choice(WORDS)}</cite></div></a></div>'
+            f'<div class="VwiC3b yXK7lf lVm3ye r025kc hJNv6b"><span>{bolded(rng, 20, 45)}</span></div>'
+            '</div></div>'
+        )
+        if i % 7 == 3:
+            # Internal Google links the scrapers must skip
+            blocks.append(
+                '<div class="g"><div class="Gx5Zad"><a href="/search?q=related+' + rng.choice(WORDS) + '">'
+                f'<h3>People also search for {rng.choice(WORDS)}</h3></a></div></div>'
+            )
+    body = (
+        '<div id="searchform"><form action="/search"><input name="q" value="' + query + '"></form></div>\n'
+        '<div id="main"><div id="rso">\n' + '\n'.join(blocks) + '\n</div></div>\n'
+        + noise_script(rng, 24)
+    )
+    return page(f'{query} - Google Search', noise_style(rng, 200) + noise_script(rng, 16), body)
+
+
+def brave(rng, query, count=20):
+    blocks = []
+    for i in range(count):
+        url = target_url(rng, i)
+        blocks.append(
+            f'<div class="snippet fdb" data-type="web" data-pos="{i}">'
+            f'<a href="{url}" class="result-header svelte-1" target="_self">'
+            f'<div class="url">{url.split("/")[2]} <span>&rsaquo; {rng.choice(WORDS)}</span></div>'
+            f'<div class="title snippet-title">{words(rng, 4, 10).title()}</div></a>'
+            f'<p class="snippet-description">{bolded(rng, 20, 45)}</p></div>'
+        )
+    body = (
+        '<header><nav><a href="/">Brave Search</a></nav></header>\n'
+        '<main><div id="results">\n' + '\n'.join(blocks) + '\n</div></main>\n'
+        + noise_script(rng, 32)
+    )
+    return page(f'{query} - Brave Search', noise_style(rng, 150), body)
+
+
+def startpage(rng, query, count=10):
+    blocks = []
+    for i in range(count):
+        url = target_url(rng, i)
+        blocks.append(
+            '<div class="w-gl__result">'
+            f'<a class="w-gl__result-title result-link" href="{url}"><h3>{words(rng, 4, 10).title()}</h3></a>'
+            f'<a class="w-gl__result-url result-link" href="{url}">{url}</a>'
+            '<span class="w-gl__anonymous-view-url"><a href="/do/proxy">Anonymous View</a></span>'
+            f'<p class="w-gl__description">{bolded(rng, 20, 45)}</p></div>'
+        )
+    body = (
+        '<div class="layout-web"><section class="w-gl">\n' + '\n'.join(blocks) + '\n</section></div>\n'
+        + noise_script(rng, 12)
+    )
+    return page('Startpage Search Results', noise_style(rng, 120), body)
+
+
+def article(rng, sections):
+    """Encyclopedia-style page: heavy navigation, references and media"""
+    head = ''.join(
+        f'<link rel="stylesheet" href="/static/css/{rng.choice(WORDS)}-{i}.css">' for i in range(12)
+    ) + ''.join(f'<script src="/static/js/{rng.choice(WORDS)}.{i}.js" defer></script>' for i in range(10))
+    head += noise_style(rng, 400) + noise_script(rng, 20)
+    nav = '<nav id="sidebar"><ul>' + ''.join(
+        f'<li><a href="/wiki/{rng.choice(WORDS).title()}_{i}" title="{words(rng, 1, 3)}">{words(rng, 1, 3)}</a></li>'
+        for i in range(150)
+    ) + '</ul></nav>'
+    parts = [nav, '<main id="content"><h1>Potato</h1>']
+    ref = 0
+    for s in range(sections):
+        parts.append(f'<h2 id="s{s}"><span class="mw-headline">{words(rng, 2, 5).title()}</span>'
+                     f'<a class="edit" href="?action=edit&amp;section={s}">edit</a></h2>')
+        if s % 3 == 0:
+            parts.append(
+                f'<figure><a href="/wiki/File:{rng.choice(WORDS)}_{s}.jpg">'
+                f'<img src="//upload.example.org/thumb/{s:x}/{rng.choice(WORDS)}.jpg" srcset="//upload.example.org/2x/{s:x}.jpg 2x" '
+                f'width="{rng.randint(120, 400)}" height="{rng.randint(90, 300)}" alt="{words(rng, 2, 5)}" loading="lazy"></a>'
+                f'<figcaption>{bolded(rng, 6, 14)}</figcaption></figure>'
+            )
+        for _ in range(rng.randint(3, 6)):
+            text = []
+            for _ in range(rng.randint(5, 10)):
+                r = rng.random()
+                if r < 0.45:
+                    text.append(f'<a href="/wiki/{rng.choice(WORDS).title()}" title="{rng.choice(WORDS)}">{words(rng, 1, 3)}</a>')
+                elif r < 0.55:
+                    ref += 1
+                    text.append(f'<sup class="reference"><a href="#cite_note-{ref}">[{ref}]</a></sup>')
+                elif r < 0.6:
+                    text.append(f'<a class="external" href="{target_url(rng, ref)}" rel="nofollow">{words(rng, 1, 2)}</a>')
+                else:
+                    text.append(bolded(rng, 5, 15))
+            parts.append('<p>' + ' '.join(text) + '</p>')
+        if s % 5 == 4:
+            rows = ''.join(
+                f'<tr><td><a href="/wiki/{rng.choice(WORDS)}">{rng.choice(WORDS)}</a></td>'
+                f'<td>{rng.randint(1, 9999):,}</td><td>{words(rng, 2, 6)}</td></tr>'
+                for _ in range(12)
+            )
+            parts.append(f'<table class="wikitable"><tbody>{rows}</tbody></table>')
+    parts.append('<ol class="references">' + ''.join(
+        f'<li id="cite_note-{i}"><a href="{target_url(rng, i)}">{words(rng, 3, 8)}</a>. Retrieved {rng.randint(1, 28)} May 2024.</li>'
+        for i in range(1, ref + 1)
+    ) + '</ol></main>')
+    parts.append(noise_script(rng, 40))
+    return page('Potato - Encyclopedia', head, '\n'.join(parts))
+
+
+ENGINE_PAGES = {
+    'duckduckgo': duckduckgo,
+    'google': google,
+    'brave': brave,
+    'startpage': startpage,
+}
+
+
+# Proxy rewrite corpus: name -> number of article sections
+ARTICLE_PAGES = {
+    'article_medium': 40,
+    'article_large': 400,
+}
+
+
+def main():
+    os.makedirs(FIXTURES, exist_ok=True)
+    pages = [(name, lambda rng, build=build: build(rng, 'potato homework help')) for name, build in ENGINE_PAGES.items()]
+    pages += [(name, lambda rng, sections=sections: article(rng, sections)) for name, sections in ARTICLE_PAGES.items()]
+    for name, build in pages:
+        rng = random.Random(name)
+        html = build(rng)
+        path = os.path.join(FIXTURES, f'{name}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        print(f'{os.path.relpath(path)}: {len(html) // 1024} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+In-process result caches
+TTL + LRU with a byte budget, serving stale entries while a background
+refresh runs. Used for search results so repeat queries skip the upstream.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from result_model import json_default
+
+
+def normalize_query(query):
+    """Case/whitespace-insensitive form of a query for cache keys"""
+    return ' '.join(query.lower().split())
+
+
+def estimate_size(value):
+    """Rough byte size of a JSON-able value"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=lambda v: json_default(v, fallback=str)).encode('utf-8'))
+    except Exception:
+        return 1024
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'fresh_until', 'stale_until')
+
+    def __init__(self, value, size, fresh_until, stale_until):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class TTLCache:
+    """
+    Thread-safe TTL + LRU cache.
+    Entries are fresh for `ttl` seconds, then servable as stale for another
+    `stale_ttl` seconds while get_or_load() refreshes them in the background.
+    Evicts least recently used entries past `max_entries` or `max_bytes`.
+    """
+
+    def __init__(self, name, ttl=300, stale_ttl=0, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_tasks = set()
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    def _lookup(self, key):
+        """Return (value, is_stale) or None. Caller holds the lock."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now >= entry.stale_until:
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return entry.value, now >= entry.fresh_until
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self.bytes -= entry.size
+
+    def get(self, key):
+        """Fresh value for key, or None"""
+        with self._lock:
+            found = self._lookup(key)
+            if found is None or found[1]:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return found[0]
+
+    def set(self, key, value, ttl=None, size=None):
+        """Store value; `ttl` overrides the cache default for this entry"""
+        ttl = self.ttl if ttl is None else ttl
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        entry = _Entry(value, size, now + ttl, now + ttl + self.stale_ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = entry
+            self.bytes += size
+            self._evict()
+
+    def grow(self, key, extra):
+        """Count `extra` more bytes against an entry that gained data in place"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return
+            entry.size += extra
+            self.bytes += extra
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until within budget. Caller holds the lock."""
+        while self._data and (len(self._data) > self.max_entries or self.bytes > self.max_bytes):
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def _cached(self, key):
+        """(found, value, start a refresh?) for get_or_load"""
+        with self._lock:
+            found = self._lookup(key)
+            if found is None:
+                self.misses += 1
+                return False, None, False
+            value, is_stale = found
+            if not is_stale:
+                self.hits += 1
+                return True, value, False
+            self.stale_hits += 1
+            if key in self._refreshing:
+                return True, value, False
+            self._refreshing.add(key)
+            return True, value, True
+
+    def get_or_load(self, key, loader, should_cache=bool):
+        """
+        Cached value for key, calling loader() on a miss.
+        Stale entries are returned immediately and refreshed in a background
+        thread. Loaded values are only stored when should_cache(value) is true.
+        """
+        found, value, refresh = self._cached(key)
+        if refresh:
+            threading.Thread(target=self._refresh, args=(key, loader, should_cache), daemon=True).start()
+        if found:
+            return value
+
+        value = loader()
+        if should_cache(value):
+            self.set(key, value)
+        return value
+
+    async def aget_or_load(self, key, loader, should_cache=bool):
+        """get_or_load() for a coroutine loader; stale entries are refreshed by a task"""
+        found, value, refresh = self._cached(key)
+        if refresh:
+            task = asyncio.ensure_future(self._arefresh(key, loader, should_cache))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+        if found:
+            return value
+
+        value = await loader()
+        if should_cache(value):
+            self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader, should_cache):
+        try:
+            value = loader()
+            if should_cache(value):
+                self.set(key, value)
+                self.refreshes += 1
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _arefresh(self, key, loader, should_cache):
+        try:
+            value = await loader()
+            if should_cache(value):
+                self.set(key, value)
+                self.refreshes += 1
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Counters for tuning TTL and size limits"""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'refreshes': self.refreshes,
+                'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            }
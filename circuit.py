@@ -0,0 +1,169 @@
+"""
+Per-host circuit breakers and retry backoff for upstream fetches
+Once a host's recent error rate crosses CIRCUIT_ERROR_RATE its circuit
+opens and fetches to it fail immediately instead of waiting out timeouts.
+After CIRCUIT_OPEN_SECONDS a trial request is let through (half-open):
+success closes the circuit again, failure re-opens it.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+
+# Outcomes remembered per host, fewest requests before the error rate counts,
+# and the error rate that opens the circuit
+CIRCUIT_WINDOW = int(os.environ.get('CIRCUIT_WINDOW', '20'))
+CIRCUIT_MIN_REQUESTS = int(os.environ.get('CIRCUIT_MIN_REQUESTS', '5'))
+CIRCUIT_ERROR_RATE = float(os.environ.get('CIRCUIT_ERROR_RATE', '0.5'))
+# Seconds an open circuit rejects requests before a half-open trial
+CIRCUIT_OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '30'))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get('CIRCUIT_HALF_OPEN_PROBES', '1'))
+# Hosts with a breaker; the least recently used is dropped past this
+# (every site fetched through the proxy gets one)
+CIRCUIT_MAX_HOSTS = int(os.environ.get('CIRCUIT_MAX_HOSTS', '1024'))
+
+# Retry delays: full jitter over an exponentially growing cap (seconds)
+RETRY_BACKOFF_BASE = float(os.environ.get('RETRY_BACKOFF_BASE', '0.25'))
+RETRY_BACKOFF_MAX = float(os.environ.get('RETRY_BACKOFF_MAX', '4'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Upstream statuses that mean the host is down or refusing us
+FAILURE_STATUSES = frozenset((403, 429))
+
+
+class CircuitOpen(Exception):
+    """Raised instead of fetching from a host whose circuit is open"""
+
+
+def is_failure_status(status_code):
+    return status_code >= 500 or status_code in FAILURE_STATUSES
+
+
+def backoff(attempt):
+    """Seconds to wait before retry number `attempt` (1-based)"""
+    cap = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** (attempt - 1)))
+    return random.uniform(0, cap)
+
+
+def host_of(url):
+    return urlsplit(url).hostname or ''
+
+
+class CircuitBreaker:
+    def __init__(self, window=CIRCUIT_WINDOW, min_requests=CIRCUIT_MIN_REQUESTS, error_rate=CIRCUIT_ERROR_RATE,
+                 open_seconds=CIRCUIT_OPEN_SECONDS, half_open_probes=CIRCUIT_HALF_OPEN_PROBES):
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.outcomes = deque(maxlen=window)  # True = failure
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = []  # start times of in-flight half-open trials
+        self.trips = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """May a request go to this host now?"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self.probes = []
+            # Half-open: a few trials at a time; a trial that never reported
+            # back (caller crashed) stops counting after open_seconds
+            self.probes = [t for t in self.probes if now - t < self.open_seconds]
+            if len(self.probes) < self.half_open_probes:
+                self.probes.append(now)
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if ok:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                else:
+                    self._open()
+                return
+            if self.state == OPEN:
+                return
+            self.outcomes.append(not ok)
+            failures = sum(self.outcomes)
+            if len(self.outcomes) >= self.min_requests and failures / len(self.outcomes) >= self.error_rate:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probes = []
+        self.trips += 1
+
+    def stats(self):
+        with self._lock:
+            failures = sum(self.outcomes)
+            return {
+                'state': self.state,
+                'recent_requests': len(self.outcomes),
+                'recent_errors': failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per upstream host, for at most max_hosts hosts (LRU)"""
+
+    def __init__(self, max_hosts=CIRCUIT_MAX_HOSTS, **settings):
+        self.max_hosts = max_hosts
+        self.settings = settings
+        self._breakers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        host = host_of(url)
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(**self.settings)
+                while len(self._breakers) > self.max_hosts:
+                    self._breakers.popitem(last=False)
+            else:
+                self._breakers.move_to_end(host)
+        return breaker
+
+    def allow(self, url):
+        return self.get(url).allow()
+
+    def record(self, url, ok):
+        self.get(url).record(ok)
+
+    def states(self, hosts=None):
+        """{(host,): 0 closed / 1 half-open / 2 open} for metrics, limited to `hosts` if given"""
+        codes = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {(host,): codes[breaker.state] for host, breaker in breakers if hosts is None or host in hosts}
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {host: breaker.stats() for host, breaker in sorted(breakers)}
+
+
+# Shared by every fetch path in the process
+breakers = CircuitBreakers()
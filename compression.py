@@ -0,0 +1,130 @@
+"""
+Accept-Encoding negotiation and gzip/brotli response compression
+Applies to bodies this service generates (search JSON and event streams,
+rewritten proxy HTML); relayed upstream bytes and cached assets keep the
+encoding the origin chose. Streams are compressed chunk by chunk with a
+flush after each, so every event or HTML chunk still reaches the client
+as soon as it is produced.
+"""
+
+import gzip
+import hashlib
+import os
+import zlib
+
+from cache import TTLCache
+
+COMPRESSION = os.environ.get('COMPRESSION', '1') == '1'
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+# Bodies smaller than this aren't worth the CPU or the header overhead
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+
+COMPRESSIBLE_TYPES = frozenset((
+    'text/html', 'text/plain', 'text/event-stream', 'application/json', 'application/x-ndjson',
+))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Server preference when the client rates several encodings equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Compressed copies of responses built from cached data, keyed on
+# (request, encoding) and checked against the uncompressed body's hash
+variants = TTLCache(
+    'compressed',
+    ttl=int(os.environ.get('COMPRESSED_CACHE_TTL', '600')),
+    max_entries=int(os.environ.get('COMPRESSED_CACHE_ENTRIES', '2048')),
+    max_bytes=int(os.environ.get('COMPRESSED_CACHE_BYTES', str(32 * 1024 * 1024))),
+)
+
+
+def negotiate(accept_encoding):
+    """Best encoding we offer for an Accept-Encoding header, or None"""
+    if not COMPRESSION or not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+    wildcard = weights.get('*', 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0 keeps output identical for identical input
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor whose output is flushed after every chunk"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, chunk):
+        if self.encoding == 'br':
+            return self._brotli.process(chunk) + self._brotli.flush()
+        return self._zlib.compress(chunk) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+def compress_stream(chunks, encoding, counter=None):
+    """Compress an iterable of str/bytes chunks; `counter(raw, compressed)` sees the sizes"""
+    compressor = StreamCompressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            out = compressor.compress(chunk)
+            if counter is not None:
+                counter(len(chunk), len(out))
+            yield out
+        out = compressor.finish()
+        if counter is not None:
+            counter(0, len(out))
+        yield out
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def cached_variant(key, body, encoding):
+    """Compressed body, reusing the copy stored under `key` if the body is unchanged"""
+    digest = hashlib.blake2b(body, digest_size=16).digest()
+    stored = variants.get((key, encoding))
+    if stored is not None and stored[0] == digest:
+        return stored[1]
+    compressed = compress(body, encoding)
+    variants.set((key, encoding), (digest, compressed), size=len(compressed))
+    return compressed
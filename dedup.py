@@ -0,0 +1,160 @@
+"""
+Result de-duplication: URL canonicalization and near-duplicate collapsing
+Two results are the same when their URLs canonicalize alike (scheme, `www.`,
+default port, trailing slash, fragment and tracking parameters ignored) or
+when the SimHashes of their title + snippet differ in at most
+NEAR_DUP_DISTANCE bits. Near-duplicates are found through a banded hash
+index, so collapsing stays linear in the number of results.
+"""
+
+import hashlib
+import os
+import re
+import struct
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Max differing SimHash bits for two results to count as the same (a short
+# snippet moves several bits per edited word); 0 turns near-duplicate
+# collapsing off, canonical URL matches still collapse
+NEAR_DUP_DISTANCE = int(os.environ.get('NEAR_DUP_DISTANCE', '6'))
+# Results with fewer title + snippet words than this are never near-duplicates
+NEAR_DUP_MIN_TOKENS = int(os.environ.get('NEAR_DUP_MIN_TOKENS', '8'))
+
+SIMHASH_BITS = 64
+# Per-token hashing is shared across searches; the cache is dropped when full
+TOKEN_CACHE_ENTRIES = 50000
+_token_spreads = {}
+_COUNTERS = struct.Struct(f'<{SIMHASH_BITS}H')
+
+TRACKING_PARAMS = frozenset((
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl',
+    'igshid', 'ref', 'ref_src', 'spm', 'srsltid',
+))
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonical_url(url):
+    """Key under which variants of the same page compare equal"""
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+    host = (parts.hostname or '').rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f'{host}:{port}'
+    path = parts.path.rstrip('/') or '/'
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not is_tracking_param(k)]
+    query = urlencode(sorted(query))
+    return f'{host}{path}?{query}' if query else f'{host}{path}'
+
+
+# Spread of every byte value: bit i of the byte moved to bit 16*i
+_BYTE_SPREADS = [sum(1 << (16 * bit) for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def _spread(token):
+    """Token hash with bit i moved to bit 16*i, so a sum of spreads holds
+    64 independent 16-bit per-bit counters"""
+    digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+    spread = 0
+    for i, value in enumerate(reversed(digest)):
+        spread |= _BYTE_SPREADS[value] << (128 * i)
+    return spread
+
+
+def simhash(tokens, cache=None):
+    """64-bit SimHash of a token list"""
+    if cache is None:
+        cache = _token_spreads
+        if len(cache) > TOKEN_CACHE_ENTRIES:
+            cache.clear()
+    # 16-bit counters: cap the count so none can overflow
+    tokens = tokens[:0xFFFF]
+    total = 0
+    for token in tokens:
+        spread = cache.get(token)
+        if spread is None:
+            spread = cache[token] = _spread(token)
+        total += spread
+    # A bit is set when more than half the tokens have it set
+    n = len(tokens)
+    fingerprint = 0
+    for bit, count in enumerate(_COUNTERS.unpack(total.to_bytes(SIMHASH_BITS * 2, 'little'))):
+        if count * 2 > n:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class NearDuplicateIndex:
+    """
+    SimHashes split into distance + 1 bands: two hashes within `distance`
+    bits must agree exactly on at least one band, so only hashes sharing a
+    band are compared.
+    """
+
+    def __init__(self, distance=NEAR_DUP_DISTANCE):
+        self.distance = distance
+        bands = distance + 1
+        self.bands = [(SIMHASH_BITS * i // bands, SIMHASH_BITS * (i + 1) // bands) for i in range(bands)]
+        self.tables = [{} for _ in self.bands]
+
+    def _keys(self, fingerprint):
+        for start, end in self.bands:
+            yield fingerprint >> start & ((1 << (end - start)) - 1)
+
+    def find(self, fingerprint):
+        """A stored fingerprint within `distance` bits, or None"""
+        for table, key in zip(self.tables, self._keys(fingerprint)):
+            for other in table.get(key, ()):
+                if (other ^ fingerprint).bit_count() <= self.distance:
+                    return other
+        return None
+
+    def add(self, fingerprint):
+        for table, key in zip(self.tables, self._keys(fingerprint)):
+            table.setdefault(key, []).append(fingerprint)
+
+
+def collapse(results, distance=NEAR_DUP_DISTANCE, min_tokens=NEAR_DUP_MIN_TOKENS):
+    """
+    First of each group of duplicate results, in order, plus counts of
+    results dropped by reason ({'url': n, 'near': n}).
+    """
+    seen_urls = set()
+    index = NearDuplicateIndex(distance) if distance > 0 else None
+    unique = []
+    dropped = {'url': 0, 'near': 0}
+    for result in results:
+        if not result['url']:
+            continue
+        key = canonical_url(result['url'])
+        if key in seen_urls:
+            dropped['url'] += 1
+            continue
+        fingerprint = None
+        if index is not None:
+            tokens = TOKEN_RE.findall(f"{result['title']} {result['snippet']}".lower())
+            if len(tokens) >= min_tokens:
+                fingerprint = simhash(tokens)
+                if index.find(fingerprint) is not None:
+                    dropped['near'] += 1
+                    continue
+        seen_urls.add(key)
+        if fingerprint is not None:
+            index.add(fingerprint)
+        unique.append(result)
+    return unique, dropped
@@ -0,0 +1,62 @@
+"""
+Rolling per-engine health scores for search fallback
+Every live scrape records whether it returned results and how long it took.
+An engine's score is its recent success rate, discounted by its mean
+latency; when the requested engine comes back empty, /api/search falls
+back to the remaining engines in score order.
+"""
+
+import os
+import threading
+from collections import deque
+
+ENGINE_HEALTH_WINDOW = int(os.environ.get('ENGINE_HEALTH_WINDOW', '50'))
+# Mean latency (seconds) at which an engine's score is halved
+ENGINE_LATENCY_SCALE = float(os.environ.get('ENGINE_LATENCY_SCALE', '3'))
+# Most extra engines tried per search when the requested one is empty
+ENGINE_FALLBACKS = int(os.environ.get('ENGINE_FALLBACKS', '2'))
+
+
+class EngineHealth:
+    def __init__(self, engines, window=ENGINE_HEALTH_WINDOW, latency_scale=ENGINE_LATENCY_SCALE):
+        self.engines = list(engines)  # also the tie-break order
+        self.latency_scale = latency_scale
+        self._outcomes = {engine: deque(maxlen=window) for engine in self.engines}
+        self._lock = threading.Lock()
+
+    def record(self, engine, ok, seconds):
+        with self._lock:
+            outcomes = self._outcomes.get(engine)
+            if outcomes is not None:
+                outcomes.append((ok, seconds))
+
+    def score(self, engine):
+        """0..1: smoothed success rate / (1 + mean latency / scale)"""
+        with self._lock:
+            outcomes = list(self._outcomes.get(engine, ()))
+        successes = sum(1 for ok, _ in outcomes if ok)
+        rate = (successes + 1) / (len(outcomes) + 2)
+        mean_latency = sum(s for _, s in outcomes) / len(outcomes) if outcomes else 0.0
+        return rate / (1 + mean_latency / self.latency_scale)
+
+    def fallbacks(self, engine, limit=ENGINE_FALLBACKS):
+        """Other engines to try after `engine`, healthiest first"""
+        others = [e for e in self.engines if e != engine]
+        others.sort(key=lambda e: (-self.score(e), self.engines.index(e)))
+        return others[:limit]
+
+    def scores(self):
+        return {(engine,): round(self.score(engine), 4) for engine in self.engines}
+
+    def stats(self):
+        stats = {}
+        for engine in self.engines:
+            with self._lock:
+                outcomes = list(self._outcomes[engine])
+            stats[engine] = {
+                'score': round(self.score(engine), 4),
+                'recent_scrapes': len(outcomes),
+                'recent_successes': sum(1 for ok, _ in outcomes if ok),
+                'mean_latency_ms': round(sum(s for _, s in outcomes) / len(outcomes) * 1000, 1) if outcomes else None,
+            }
+        return stats
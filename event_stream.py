@@ -0,0 +1,41 @@
+"""
+Server-sent events / NDJSON framing for streamed search responses
+Streams are a sequence of (event, data) pairs. As SSE each becomes an
+`event:` + `data:` block, which EventSource understands; as NDJSON each
+becomes one {"event": ..., "data": ...} line, for fetch() readers.
+"""
+
+import json
+
+from result_model import json_default
+
+SSE = 'sse'
+NDJSON = 'ndjson'
+
+MIMETYPES = {
+    SSE: 'text/event-stream',
+    NDJSON: 'application/x-ndjson',
+}
+
+# Keep proxies (nginx, Vercel) from buffering the stream
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def negotiate(accept, requested=None):
+    """SSE or NDJSON from an explicit ?format= or the Accept header (SSE by default)"""
+    if requested in MIMETYPES:
+        return requested
+    if accept and 'application/x-ndjson' in accept and 'text/event-stream' not in accept:
+        return NDJSON
+    return SSE
+
+
+def encode(fmt, event, data):
+    """One event as the text to write to the stream"""
+    if fmt == NDJSON:
+        return json.dumps({'event': event, 'data': data}, ensure_ascii=False, default=json_default) + '\n'
+    # JSON never contains raw newlines, so each event is a single data line
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=json_default)}\n\n'
@@ -0,0 +1,101 @@
+"""
+Selectable HTML parser backend for the result scrapers
+'lxml' (default) parses with libxml2 and answers CSS selectors through
+cssselect-compiled XPath, behind the small slice of the BeautifulSoup API
+the scrapers use (select, select_one, get, get_text). 'html.parser' is the
+original pure-Python BeautifulSoup path.
+
+Pick one with HTML_PARSER_BACKEND; lxml falls back to html.parser if
+lxml or cssselect is not installed.
+"""
+
+import os
+from functools import lru_cache
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+    from cssselect import GenericTranslator
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+BACKENDS = ('lxml', 'html.parser')
+
+# Strings BeautifulSoup leaves out of get_text() on ordinary tags
+_SKIP_TEXT = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+
+
+_translator = GenericTranslator() if HAS_LXML else None
+
+
+@lru_cache(maxsize=256)
+def _compile(selector):
+    # descendant:: rather than cssselect's default descendant-or-self::, so
+    # a node never matches itself - BeautifulSoup only searches below it
+    return etree.XPath(_translator.css_to_xpath(selector, prefix='descendant::'))
+
+
+class LxmlNode:
+    """BeautifulSoup-compatible wrapper around an lxml element"""
+
+    __slots__ = ('el',)
+
+    def __init__(self, el):
+        self.el = el
+
+    def select(self, selector):
+        return [LxmlNode(el) for el in _compile(selector)(self.el)]
+
+    def select_one(self, selector):
+        for el in _compile(selector)(self.el):
+            return LxmlNode(el)
+        return None
+
+    def get(self, attr, default=None):
+        return self.el.get(attr, default)
+
+    def get_text(self, separator='', strip=False):
+        strings = _strings(self.el)
+        if strip:
+            strings = (s.strip() for s in strings)
+            strings = (s for s in strings if s)
+        return separator.join(strings)
+
+
+def _strings(el):
+    """Text of el and its descendants in document order, like BeautifulSoup"""
+    if el.text and el.tag not in _SKIP_TEXT:
+        yield el.text
+    for child in el:
+        # Comments and processing instructions have a non-string tag
+        if isinstance(child.tag, str):
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _parse_lxml(html):
+    try:
+        return LxmlNode(lxml.html.document_fromstring(html))
+    except ValueError:
+        # str input with an XML encoding declaration
+        return LxmlNode(lxml.html.document_fromstring(html.encode('utf-8')))
+    except etree.ParserError:
+        # Empty document
+        return LxmlNode(lxml.html.document_fromstring('<html></html>'))
+
+
+def parse_html(html, backend=None):
+    """Parse a results page with the configured (or given) backend"""
+    backend = backend or BACKEND
+    if backend == 'lxml' and HAS_LXML:
+        return _parse_lxml(html)
+    return BeautifulSoup(html, 'html.parser')
+
+
+BACKEND = os.environ.get('HTML_PARSER_BACKEND', 'lxml')
+if BACKEND not in BACKENDS or (BACKEND == 'lxml' and not HAS_LXML):
+    BACKEND = 'html.parser'
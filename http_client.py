@@ -0,0 +1,139 @@
+"""
+Shared HTTP client - pooled keep-alive connections for upstream fetches
+Every engine/proxy fetch goes through here so repeat requests to the same
+host reuse an open TCP+TLS connection instead of handshaking again.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Number of distinct host pools kept open, and connections kept per host
+POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', '32'))
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '16'))
+
+# Send every upstream fetch to this base URL instead (load tests, see loadtest/)
+UPSTREAM_OVERRIDE = os.environ.get('UPSTREAM_OVERRIDE', '').rstrip('/')
+
+# One adapter (and so one set of urllib3 pools) shared by every thread
+_adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+_local = threading.local()
+
+# Threads that run hedged requests (the original and its duplicate)
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('HEDGE_WORKERS', '32')))
+_hedge_lock = threading.Lock()
+_hedges = {'sent': 0, 'won': 0}
+
+
+def session():
+    """Per-thread Session backed by the shared connection pools"""
+    sess = getattr(_local, 'session', None)
+    if sess is None:
+        sess = requests.Session()
+        # Never carry cookies from one user's fetch into another's
+        sess.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        sess.mount('https://', _adapter)
+        sess.mount('http://', _adapter)
+        _local.session = sess
+    return sess
+
+
+def upstream_url(url):
+    """
+    URL actually fetched for url: unchanged, or with UPSTREAM_OVERRIDE set,
+    https://host/path?query -> UPSTREAM_OVERRIDE/host/path?query
+    """
+    if not UPSTREAM_OVERRIDE:
+        return url
+    parts = urlsplit(url)
+    routed = f'{UPSTREAM_OVERRIDE}/{parts.netloc}{parts.path or "/"}'
+    return f'{routed}?{parts.query}' if parts.query else routed
+
+
+def get(url, **kwargs):
+    """Drop-in replacement for requests.get using pooled connections"""
+    return session().get(upstream_url(url), **kwargs)
+
+
+def _timed_get(url, started, observe, **kwargs):
+    started.set()
+    start = time.perf_counter()
+    response = get(url, **kwargs)
+    if observe is not None:
+        observe(time.perf_counter() - start)
+    return response
+
+
+def hedged_get(url, hedge_after, observe=None, **kwargs):
+    """
+    get(), but if no response has arrived `hedge_after` seconds after the
+    request went out, send a duplicate and return whichever answers first.
+    The slower response is closed when it arrives. `observe(seconds)` is
+    called with each request's own time to response, the loser's included.
+    """
+    started = threading.Event()
+    first = _hedge_pool.submit(_timed_get, url, started, observe, **kwargs)
+    # Time spent queued for a pool thread doesn't count towards the delay:
+    # hedging a request that hasn't been sent would only add load
+    started.wait()
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+    second = _hedge_pool.submit(_timed_get, url, threading.Event(), observe, **kwargs)
+    with _hedge_lock:
+        _hedges['sent'] += 1
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            for other in pending | (done - {future}):
+                other.add_done_callback(_close_loser)
+            if future is second:
+                with _hedge_lock:
+                    _hedges['won'] += 1
+            return response
+    raise error
+
+
+def _close_loser(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def hedge_stats():
+    with _hedge_lock:
+        return dict(_hedges)
+
+
+def stats():
+    """Per-host request/connection counts for the live pools"""
+    pools = _adapter.poolmanager.pools
+    hosts = []
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        hosts.append({
+            'host': f'{pool.scheme}://{pool.host}:{pool.port}',
+            'requests': pool.num_requests,
+            'connections': pool.num_connections,
+            'reused': max(0, pool.num_requests - pool.num_connections),
+        })
+    return {
+        'pool_connections': POOL_CONNECTIONS,
+        'pool_maxsize': POOL_MAXSIZE,
+        'hosts': hosts,
+        'hedges': hedge_stats(),
+    }
@@ -0,0 +1,110 @@
+"""
+Rolling per-host upstream latency, and the timeouts and hedge delays
+derived from it
+Each host keeps its last LATENCY_WINDOW response times. Once enough are in,
+fetches to it time out at a multiple of its p99 (capped by the caller's own
+timeout) instead of a fixed 15s, and hedged requests fire at its p95.
+A request that times out counts as taking as long as it was allowed, so a
+host that slows down past its timeout pushes the timeout up again.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+
+from circuit import host_of
+
+LATENCY_WINDOW = int(os.environ.get('LATENCY_WINDOW', '200'))
+LATENCY_MIN_SAMPLES = int(os.environ.get('LATENCY_MIN_SAMPLES', '20'))
+# Hosts tracked; the least recently used is dropped past this
+LATENCY_MAX_HOSTS = int(os.environ.get('LATENCY_MAX_HOSTS', '1024'))
+
+# Timeout = clamp(p99 * factor, floor, caller's timeout); 0 disables
+ADAPTIVE_TIMEOUTS = os.environ.get('ADAPTIVE_TIMEOUTS', '1') == '1'
+ADAPTIVE_TIMEOUT_FACTOR = float(os.environ.get('ADAPTIVE_TIMEOUT_FACTOR', '3'))
+ADAPTIVE_TIMEOUT_MIN = float(os.environ.get('ADAPTIVE_TIMEOUT_MIN', '2'))
+
+# Send a duplicate request once the first has taken longer than the host's p95
+HEDGE_REQUESTS = os.environ.get('HEDGE_REQUESTS', '0') == '1'
+HEDGE_MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', '0.05'))
+
+
+class LatencyTracker:
+    def __init__(self, window=LATENCY_WINDOW, min_samples=LATENCY_MIN_SAMPLES):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._sorted = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            self._sorted = None
+
+    def percentile(self, pct):
+        """pct-th percentile of recent latencies, or None until min_samples"""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self.samples)
+            ordered = self._sorted
+        index = min(len(ordered) - 1, int(pct / 100 * len(ordered)))
+        return ordered[index]
+
+    def timeout(self, default):
+        """Timeout for the next request to this host (at most `default`)"""
+        if not ADAPTIVE_TIMEOUTS:
+            return default
+        p99 = self.percentile(99)
+        if p99 is None:
+            return default
+        return min(default, max(ADAPTIVE_TIMEOUT_MIN, p99 * ADAPTIVE_TIMEOUT_FACTOR))
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None if hedging is off/unknown"""
+        if not HEDGE_REQUESTS:
+            return None
+        p95 = self.percentile(95)
+        if p95 is None:
+            return None
+        return max(HEDGE_MIN_DELAY, p95)
+
+    def stats(self):
+        p50, p95, p99 = (self.percentile(p) for p in (50, 95, 99))
+        return {
+            'samples': len(self.samples),
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            'p99_ms': round(p99 * 1000, 1) if p99 is not None else None,
+        }
+
+
+class LatencyTrackers:
+    """One LatencyTracker per upstream host, for at most max_hosts hosts (LRU)"""
+
+    def __init__(self, max_hosts=LATENCY_MAX_HOSTS):
+        self.max_hosts = max_hosts
+        self._trackers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        host = host_of(url)
+        with self._lock:
+            tracker = self._trackers.get(host)
+            if tracker is None:
+                tracker = self._trackers[host] = LatencyTracker()
+                while len(self._trackers) > self.max_hosts:
+                    self._trackers.popitem(last=False)
+            else:
+                self._trackers.move_to_end(host)
+        return tracker
+
+    def stats(self):
+        with self._lock:
+            trackers = list(self._trackers.items())
+        return {host: tracker.stats() for host, tracker in sorted(trackers)}
+
+
+# Shared by every fetch path in the process
+trackers = LatencyTrackers()
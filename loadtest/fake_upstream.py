@@ -0,0 +1,170 @@
+"""
+Local stand-in for the search engines and proxied sites
+Serves the benchmark fixture pages for engine result URLs, instant answer
+JSON, article HTML and static assets, with configurable latency, error rate
+and payload size. Point the backend at it with UPSTREAM_OVERRIDE, which
+routes https://host/path?query to <override>/host/path?query.
+
+Usage:
+    python loadtest/fake_upstream.py --port 9000 --latency 150 --jitter 100 --error-rate 0.02
+    UPSTREAM_OVERRIDE=http://127.0.0.1:9000 gunicorn -w 4 --threads 16 app:app
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+
+# Which fixture answers which engine's result URL (host, path prefix)
+ENGINE_ROUTES = [
+    ('html.duckduckgo.com', '/html', 'duckduckgo'),
+    ('www.google.com', '/search', 'google'),
+    ('search.brave.com', '/search', 'brave'),
+    ('www.startpage.com', '/sp/search', 'startpage'),
+]
+
+ASSET_TYPES = {
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.woff2': 'font/woff2',
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, f'{name}.html'), 'rb') as f:
+        return f.read()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, route, status):
+        with self.lock:
+            key = f'{route} {status}'
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def report(self):
+        with self.lock:
+            return dict(sorted(self.counts.items()))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeUpstream/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        options = self.server.options
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip('/').partition('/')
+        path = '/' + path
+        route, status, body, headers = self.route(host, path, parse_qs(parts.query))
+
+        # Latency first so errors and timeouts cost what they would upstream
+        delay = options.latency + random.uniform(-options.jitter, options.jitter)
+        if options.slow_rate and random.random() < options.slow_rate:
+            delay = options.slow_latency
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if options.error_rate and random.random() < options.error_rate:
+            route, status, body, headers = 'error', 503, b'upstream unavailable', {'Content-Type': 'text/plain'}
+        elif status == 200 and headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+            status, body = 304, b''
+
+        self.server.stats.add(route, status)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self, host, path, query):
+        """(route name, status, body, headers) for a request to host/path"""
+        options = self.server.options
+        pages = self.server.pages
+
+        if host == 'api.duckduckgo.com':
+            term = query.get('q', [''])[0]
+            answer = {'Abstract': '', 'AbstractText': '', 'Answer': '', 'Definition': '', 'Heading': term}
+            if random.random() < options.answer_rate:
+                # no_html=1 responses carry the same text in Abstract and AbstractText
+                abstract = f'{term} is a starchy tuber. ' * 8
+                answer.update(Abstract=abstract, AbstractText=abstract, AbstractURL='https://en.wikipedia.org/wiki/Potato',
+                              AbstractSource='Wikipedia', Image='/i/potato.jpg')
+            return 'instant_answer', 200, json.dumps(answer).encode(), {'Content-Type': 'application/x-javascript'}
+
+        for engine_host, prefix, engine in ENGINE_ROUTES:
+            if host == engine_host and path.startswith(prefix):
+                return engine, 200, pages[engine], {'Content-Type': 'text/html; charset=utf-8'}
+
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ASSET_TYPES:
+            body = self.server.asset
+            headers = {
+                'Content-Type': ASSET_TYPES[ext],
+                'Cache-Control': f'public, max-age={options.asset_max_age}',
+                'ETag': f'"{hashlib.sha256(path.encode()).hexdigest()[:16]}"',
+            }
+            return 'asset', 200, body, headers
+
+        headers = {'Content-Type': 'text/html; charset=utf-8'}
+        if options.page_etag:
+            headers['ETag'] = f'"{options.page}"'
+        return 'page', 200, pages['page'], headers
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=9000)
+    ap.add_argument('--latency', type=float, default=100, help='mean response delay in ms')
+    ap.add_argument('--jitter', type=float, default=50, help='+/- ms added to each delay')
+    ap.add_argument('--slow-rate', type=float, default=0, help='fraction of requests delayed by --slow-latency')
+    ap.add_argument('--slow-latency', type=float, default=10000, help='delay in ms for slow requests')
+    ap.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with 503')
+    ap.add_argument('--answer-rate', type=float, default=0.5, help='fraction of instant answer lookups with an answer')
+    ap.add_argument('--page', default='article_medium', help='fixture served for proxied HTML pages')
+    ap.add_argument('--page-etag', action='store_true', help='send an ETag with proxied HTML pages')
+    ap.add_argument('--asset-size', type=int, default=64 * 1024, help='bytes per static asset')
+    ap.add_argument('--asset-max-age', type=int, default=300, help='Cache-Control max-age for assets')
+    ap.add_argument('--verbose', action='store_true', help='log every request')
+    options = ap.parse_args()
+
+    server = ThreadingHTTPServer((options.host, options.port), Handler)
+    server.daemon_threads = True
+    server.options = options
+    server.stats = Stats()
+    server.pages = {name: load_fixture(name) for _, _, name in ENGINE_ROUTES}
+    server.pages['page'] = load_fixture(options.page)
+    server.asset = random.Random(0).randbytes(options.asset_size)
+
+    print(f'Fake upstream on http://{options.host}:{options.port} '
+          f'(latency {options.latency:.0f}±{options.jitter:.0f} ms, errors {options.error_rate:.0%})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats.report(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Load generator for /api/search and /api/proxy
+Drives a running backend (app.py, parser.py or asgi.py) with a fixed number
+of concurrent clients for a set duration and reports requests/sec, latency
+percentiles and error rates per endpoint. Pair it with fake_upstream.py so
+no real engine is contacted.
+
+Usage:
+    python loadtest/loadgen.py --target http://127.0.0.1:5000 --concurrency 64 --duration 30
+    python loadtest/loadgen.py --mix search=1 --engines duckduckgo,google --queries 500
+"""
+
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+
+import requests
+
+
+def parse_mix(value):
+    """'search=80,proxy=20' -> [('search', 80.0), ('proxy', 20.0)]"""
+    mix = []
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    index = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint, shared by all client threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def add(self, endpoint, elapsed, outcome):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            self.statuses.setdefault(endpoint, {})
+            self.statuses[endpoint][outcome] = self.statuses[endpoint].get(outcome, 0) + 1
+            if outcome != 'ok':
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration):
+        rows = {}
+        with self.lock:
+            endpoints = sorted(self.latencies)
+            everything = []
+            for endpoint in endpoints:
+                everything += self.latencies[endpoint]
+                rows[endpoint] = self._row(self.latencies[endpoint], self.errors.get(endpoint, 0), duration)
+                rows[endpoint]['outcomes'] = dict(sorted(self.statuses[endpoint].items()))
+            rows['total'] = self._row(everything, sum(self.errors.values()), duration)
+        return rows
+
+    @staticmethod
+    def _row(latencies, errors, duration):
+        samples = sorted(latencies)
+        count = len(samples)
+        return {
+            'requests': count,
+            'rps': round(count / duration, 1),
+            'error_rate': round(errors / count, 4) if count else 0.0,
+            'p50_ms': round(percentile(samples, 50), 1),
+            'p90_ms': round(percentile(samples, 90), 1),
+            'p99_ms': round(percentile(samples, 99), 1),
+            'max_ms': round(samples[-1], 1) if samples else 0.0,
+        }
+
+
+class Client(threading.Thread):
+    def __init__(self, options, recorder, stop_at, seed):
+        super().__init__(daemon=True)
+        self.options = options
+        self.recorder = recorder
+        self.stop_at = stop_at
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        self.names = [name for name, _ in options.mix]
+        self.weights = [weight for _, weight in options.mix]
+
+    def search_request(self):
+        query = f'potato homework {self.rng.randrange(self.options.queries)}'
+        engine = self.rng.choice(self.options.engines)
+        return f'{self.options.target}/api/search', {'q': query, 'engine': engine}
+
+    def proxy_request(self):
+        n = self.rng.randrange(self.options.pages)
+        if self.rng.random() < self.options.asset_share:
+            url = f'https://cdn.example.org/static/{n}.{self.rng.choice(("css", "js", "png"))}'
+        else:
+            url = f'https://en.example.org/wiki/Page_{n}'
+        return f'{self.options.target}/api/proxy', {'url': base64.b64encode(url.encode()).decode()}
+
+    def run(self):
+        while time.monotonic() < self.stop_at:
+            endpoint = self.rng.choices(self.names, self.weights)[0]
+            url, params = self.proxy_request() if endpoint == 'proxy' else self.search_request()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.options.timeout)
+                response.content
+                outcome = 'ok' if response.status_code < 400 else str(response.status_code)
+                if outcome == 'ok' and endpoint == 'search':
+                    data = response.json()
+                    if not data.get('success') or not data.get('results'):
+                        outcome = 'empty'
+            except requests.Timeout:
+                outcome = 'timeout'
+            except requests.RequestException:
+                outcome = 'connection_error'
+            except ValueError:
+                outcome = 'bad_json'
+            self.recorder.add(endpoint, (time.perf_counter() - start) * 1000, outcome)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument('--target', default='http://127.0.0.1:5000', help='backend base URL')
+    ap.add_argument('--concurrency', type=int, default=32, help='concurrent clients')
+    ap.add_argument('--duration', type=float, default=30, help='seconds to run')
+    ap.add_argument('--mix', type=parse_mix, default=parse_mix('search=70,proxy=30'),
+                    help='endpoint weights, e.g. search=70,proxy=30')
+    ap.add_argument('--engines', type=lambda v: v.split(','), default=['duckduckgo', 'google', 'brave', 'startpage'])
+    ap.add_argument('--queries', type=int, default=1000, help='distinct queries (fewer = more cache hits)')
+    ap.add_argument('--pages', type=int, default=200, help='distinct proxied URLs')
+    ap.add_argument('--asset-share', type=float, default=0.5, help='fraction of proxy requests for static assets')
+    ap.add_argument('--timeout', type=float, default=30, help='client timeout in seconds')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--json', help='also write the summary to this file')
+    options = ap.parse_args()
+    options.target = options.target.rstrip('/')
+
+    recorder = Recorder()
+    started = time.monotonic()
+    clients = [Client(options, recorder, started + options.duration, options.seed + i) for i in range(options.concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.monotonic() - started
+
+    summary = recorder.summary(elapsed)
+    print(f'{options.concurrency} clients, {elapsed:.1f}s against {options.target}\n')
+    print(f"{'endpoint':<10}{'requests':>10}{'req/s':>9}{'errors':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, row in summary.items():
+        print(f"{endpoint:<10}{row['requests']:>10}{row['rps']:>9.1f}{row['error_rate']:>9.2%}"
+              f"{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    for endpoint, row in summary.items():
+        if endpoint != 'total':
+            print(f"  {endpoint}: {', '.join(f'{k}={v}' for k, v in row['outcomes'].items())}")
+
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump({'target': options.target, 'concurrency': options.concurrency,
+                       'duration': round(elapsed, 2), 'endpoints': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Prometheus metrics in the text exposition format
+Counters, histograms and callback gauges with labels, kept in a Registry
+that renders /metrics. Hand-rolled and thread-safe so the backends need no
+extra dependency.
+"""
+
+import bisect
+import threading
+import time
+
+# Upstream/parse latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f'{self.name} takes labels {self.label_names}')
+        return tuple(str(v) for v in labels)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f'{self.name}{_labels(self.label_names, k)} {_number(v)}' for k, v in items]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = _labels(self.label_names, key, [('le', _number(float(bound)))])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            base = _labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{base} {_number(total)}')
+            lines.append(f'{self.name}_count{base} {count}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class CallbackGauge(Metric):
+    """Value(s) read at scrape time: func() -> number or {label tuple: number}"""
+    kind = 'gauge'
+
+    def __init__(self, name, help, func, labels=(), kind='gauge'):
+        super().__init__(name, help, labels)
+        self.func = func
+        self.kind = kind
+
+    def render(self):
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = self.header()
+        for key, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f'{self.name}{_labels(self.label_names, key)} {_number(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, func, labels=(), kind='gauge'):
+        return self.register(CallbackGauge(name, help, func, labels, kind))
+
+    def cache_metrics(self, prefix, caches):
+        """Hit ratio, hit/miss/eviction counters and size for named caches' stats()"""
+        def stat(field):
+            return lambda: {(name,): stats().get(field) for name, stats in caches.items()}
+        self.gauge(f'{prefix}_cache_hit_ratio', 'Cache hits / lookups since start', stat('hit_ratio'), ('cache',))
+        self.gauge(f'{prefix}_cache_hits_total', 'Cache hits', stat('hits'), ('cache',), kind='counter')
+        self.gauge(f'{prefix}_cache_misses_total', 'Cache misses', stat('misses'), ('cache',), kind='counter')
+        self.gauge(f'{prefix}_cache_evictions_total', 'Cache evictions', stat('evictions'), ('cache',), kind='counter')
+        self.gauge(f'{prefix}_cache_entries', 'Entries currently cached', stat('entries'), ('cache',))
+        self.gauge(f'{prefix}_cache_bytes', 'Bytes currently cached', stat('bytes'), ('cache',))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
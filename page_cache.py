@@ -0,0 +1,175 @@
+"""
+Cache of rewritten proxy HTML
+Keyed on the target URL and checked against the upstream ETag/Last-Modified,
+or a hash of the page body when the origin sends neither, so repeat views
+of an unchanged page skip parsing and rewriting entirely.
+"""
+
+import hashlib
+
+import compression
+from asset_cache import parse_cache_control
+from cache import TTLCache
+
+
+class PageCache:
+    def __init__(self, ttl=3600, max_entries=512, max_bytes=128 * 1024 * 1024, max_page_bytes=4 * 1024 * 1024):
+        self.cache = TTLCache('proxy_page', ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+        self.max_page_bytes = max_page_bytes
+        self.hits = 0
+        self.changed = 0
+
+    def lookup(self, url):
+        """Last rewritten version of url, or None"""
+        return self.cache.get(url)
+
+    def body(self, url, entry, encoding=None):
+        """
+        The stored page as bytes, compressed with `encoding` if given. Each
+        compressed variant is made once and kept on the entry beside the HTML.
+        """
+        if encoding is None:
+            return entry['html'].encode('utf-8')
+        variants = entry['variants']
+        body = variants.get(encoding)
+        if body is None:
+            body = variants[encoding] = compression.compress(entry['html'].encode('utf-8'), encoding)
+            self.cache.grow(url, len(body))
+        return body
+
+    @staticmethod
+    def validators(entry):
+        """Conditional request headers for the stored version"""
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    @staticmethod
+    def has_validators(headers):
+        return bool(headers.get('ETag') or headers.get('Last-Modified'))
+
+    def unchanged(self, entry, headers):
+        """Do the upstream validators match the stored version?"""
+        if not self.has_validators(headers):
+            return False
+        same = (headers.get('ETag'), headers.get('Last-Modified')) == (entry['etag'], entry['last_modified'])
+        self.count(same)
+        return same
+
+    def same_body(self, entry, body):
+        """Does a validator-less body hash to the stored version?"""
+        same = hashlib.sha256(body).hexdigest() == entry['content_hash']
+        self.count(same)
+        return same
+
+    def count(self, hit):
+        """Record a view served from (hit) or past (changed) the stored version"""
+        if hit:
+            self.hits += 1
+        else:
+            self.changed += 1
+
+    @staticmethod
+    def cacheable(headers):
+        cc = parse_cache_control(headers.get('Cache-Control', ''))
+        return 'no-store' not in cc and 'private' not in cc
+
+    @staticmethod
+    def is_ranged(request_headers):
+        """Did the client ask for part of the page?"""
+        return 'Range' in request_headers or 'If-Range' in request_headers
+
+    def storable(self, status, headers, ranged=False):
+        """Is this a whole page (200, not for a ranged request) that may be stored?"""
+        return status == 200 and not ranged and 'Content-Range' not in headers and self.cacheable(headers)
+
+    def recorder(self, url, status, headers, ranged=False):
+        """PageRecorder for a page about to be rewritten, or None if it can't be stored"""
+        if not self.storable(status, headers, ranged):
+            return None
+        return PageRecorder(self, url, headers)
+
+    def record(self, url, status, headers, body, rewrite, ranged=False, done=None):
+        """
+        Yield rewrite(body) while hashing the body and keeping the output;
+        the page is stored only once it has streamed through completely.
+        done(stored) is called once it is stored or known not to be.
+        """
+        recorder = self.recorder(url, status, headers, ranged)
+        if recorder is None:
+            if done is not None:
+                done(False)
+            yield from rewrite(body)
+            return
+
+        def hashed():
+            for chunk in body:
+                recorder.body(chunk)
+                yield chunk
+
+        for out in rewrite(hashed()):
+            recorder.output(out)
+            if recorder.dropped and done is not None:
+                done(False)
+                done = None
+            yield out
+        recorder.finish()
+        if done is not None:
+            done(True)
+
+    def stats(self):
+        stats = self.cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'validated_hits': self.hits,
+            'changed': self.changed,
+            # Views served from the stored page, of all proxied HTML lookups
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        })
+        return stats
+
+
+class PageRecorder:
+    """Collects one page's body hash and rewritten output as it streams"""
+
+    def __init__(self, cache, url, headers):
+        self.cache = cache
+        self.url = url
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+        self.digest = hashlib.sha256()
+        self.parts = []
+        self.size = 0
+
+    @property
+    def dropped(self):
+        """Has the page outgrown max_page_bytes (so it won't be stored)?"""
+        return self.parts is None
+
+    def body(self, chunk):
+        self.digest.update(chunk)
+
+    def output(self, text):
+        if self.parts is None:
+            return
+        self.size += len(text)
+        if self.size > self.cache.max_page_bytes:
+            self.parts = None
+        else:
+            self.parts.append(text)
+
+    def finish(self):
+        if self.parts is None:
+            return
+        html = ''.join(self.parts)
+        entry = {
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'content_hash': self.digest.hexdigest(),
+            'html': html,
+            'variants': {},  # encoding -> compressed html, filled in on demand
+        }
+        self.cache.cache.set(self.url, entry, size=len(html))
@@ -4,23 +4,135 @@ Used when Rust hot path is unavailable
 Leverages Python's superior BeautifulSoup parsing for complex sites
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import http_client
+from cache import TTLCache, normalize_query
+from html_backend import parse_html
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+import timing
+import compression
+import relevance
+import dedup
+import event_stream
+import result_model
+from result_model import Result
+from singleflight import SingleFlight
+import singleflight
+import circuit
+import latency
+import contextvars
 import requests
-from bs4 import BeautifulSoup
 import urllib.parse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import functools
+import os
 import re
+import time
 
 app = Flask(__name__)
 CORS(app)
+app.json.default = functools.partial(result_model.json_default, fallback=app.json.default)
+
+def json_response(payload, status=200):
+    """jsonify(payload), encoded through result_model's fast path"""
+    return Response(result_model.dumps(payload) + '\n', status=status, mimetype='application/json')
 
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
 }
 
-def calculate_relevance(result: dict, keywords: list[str]) -> int:
+# Multi-page fetching: pages in flight per query, overall deadline (seconds)
+# and the number of unique results after which we stop fetching more pages
+PAGE_FANOUT = int(os.environ.get('PAGE_FANOUT', '4'))
+PAGE_DEADLINE = float(os.environ.get('PAGE_DEADLINE', '10'))
+TARGET_RESULTS = 100
+
+# Result ranking: 'classic' (keyword hit weights) or 'bm25'
+RELEVANCE_MODE = os.environ.get('RELEVANCE_MODE', 'classic')
+
+page_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('PAGE_WORKERS', '32')))
+
+# Ranked results keyed on (normalized query, engine, page depth)
+search_cache = TTLCache(
+    'search',
+    ttl=int(os.environ.get('SEARCH_CACHE_TTL', '300')),
+    stale_ttl=int(os.environ.get('SEARCH_CACHE_STALE_TTL', '1800')),
+    max_entries=int(os.environ.get('SEARCH_CACHE_ENTRIES', '2048')),
+    max_bytes=int(os.environ.get('SEARCH_CACHE_BYTES', str(64 * 1024 * 1024))),
+)
+# Identical concurrent misses share one multi-page scrape
+search_flights = SingleFlight('search')
+
+# Prometheus metrics served on /metrics
+metrics = Registry()
+upstream_latency = metrics.histogram('omnisearch_parser_upstream_request_seconds', 'Result page fetch time', ('engine',))
+upstream_requests = metrics.counter('omnisearch_parser_upstream_requests_total', 'Result page fetches by outcome', ('engine', 'outcome'))
+parse_seconds = metrics.histogram('omnisearch_parser_parse_seconds', 'Result page parse time', ('engine',))
+pages_fetched = metrics.histogram('omnisearch_parser_pages_fetched', 'Result pages parsed per search', ('engine',),
+                                  buckets=(1, 2, 3, 4, 5, 6, 8, 10))
+search_results = metrics.histogram('omnisearch_parser_search_results', 'Ranked results per search', ('engine',),
+                                   buckets=(0, 1, 10, 25, 50, 75, 100))
+page_deadline_exceeded = metrics.counter('omnisearch_parser_page_deadline_exceeded_total',
+                                         'Searches cut off by PAGE_DEADLINE with pages outstanding', ('engine',))
+duplicates_collapsed = metrics.counter('omnisearch_parser_duplicates_collapsed_total',
+                                      'Results dropped as duplicates, by reason (url, near)', ('reason',))
+metrics.cache_metrics('omnisearch_parser', {'search': search_cache.stats})
+compressed_bytes = metrics.counter('omnisearch_parser_compression_bytes_total',
+                                   'Response body bytes before (in) and after (out) compression', ('encoding', 'stage'))
+metrics.gauge('omnisearch_parser_upstream_circuit_state', 'Circuit per host: 0 closed, 1 half-open, 2 open',
+              circuit.breakers.states, ('host',))
+metrics.gauge('omnisearch_parser_coalesced_requests_total', 'Searches that led a scrape or shared one in flight',
+              singleflight.counts, ('group', 'role'), kind='counter')
+
+@app.before_request
+def start_request_timer():
+    timing.start(f'{request.method} {request.full_path.rstrip("?")}')
+
+@app.after_request
+def add_server_timing(response):
+    """Server-Timing for the request's phases; slow-request log once sent"""
+    timer = timing.current()
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.header()
+        response.call_on_close(timer.finish)
+    return response
+
+def count_compressed(encoding: str, raw: int, compressed: int) -> None:
+    compressed_bytes.inc(encoding, 'in', amount=raw)
+    compressed_bytes.inc(encoding, 'out', amount=compressed)
+
+@app.after_request
+def compress_response(response: Response) -> Response:
+    """
+    gzip/br for JSON and event streams, as the client accepts. Every body
+    carries a fresh timestamp, so there is no compressed copy worth keeping.
+    """
+    if response.direct_passthrough or response.mimetype not in compression.COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compression.compress_stream(response.response, encoding,
+                                                        functools.partial(count_compressed, encoding))
+    else:
+        body = response.get_data()
+        if len(body) < compression.COMPRESS_MIN_BYTES:
+            return response
+        with timing.phase('compress'):
+            compressed = compression.compress(body, encoding)
+        count_compressed(encoding, len(body), len(compressed))
+        response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def calculate_relevance(result: Result, keywords: list[str]) -> int:
     """Python's string operations for relevance scoring"""
     score = 0
     title_lower = result['title'].lower()
@@ -46,9 +158,9 @@ def calculate_relevance(result: dict, keywords: list[str]) -> int:
     
     return score
 
-def parse_duckduckgo(html: str) -> list[dict]:
+def parse_duckduckgo(html: str) -> list[Result]:
     """Advanced DDG parsing with BeautifulSoup"""
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = parse_html(html)
     results = []
     
     for result in soup.select('.result__body')[:100]:
@@ -64,19 +176,19 @@ def parse_duckduckgo(html: str) -> list[dict]:
                 if match:
                     url = urllib.parse.unquote(match.group(1))
             
-            results.append({
-                'title': link.get_text(strip=True),
-                'url': url,
-                'display_url': urllib.parse.urlparse(url).netloc.replace('www.', ''),
-                'snippet': snippet.get_text(strip=True) if snippet else '',
-                'is_instant': False,
-            })
+            results.append(Result(
+                title=link.get_text(strip=True),
+                url=url,
+                display_url=urllib.parse.urlparse(url).netloc.replace('www.', ''),
+                snippet=snippet.get_text(strip=True) if snippet else '',
+                is_instant=False,
+            ))
     
     return results
 
-def parse_google(html: str) -> list[dict]:
+def parse_google(html: str) -> list[Result]:
     """Advanced Google parsing - Python excels at this"""
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = parse_html(html)
     results = []
     
     for result in soup.select('div.g')[:100]:
@@ -93,19 +205,19 @@ def parse_google(html: str) -> list[dict]:
                 url = parsed.get('q', [''])[0]
             
             if url and not url.startswith('/search'):
-                results.append({
-                    'title': title_elem.get_text(strip=True),
-                    'url': url,
-                    'display_url': urllib.parse.urlparse(url).netloc.replace('www.', ''),
-                    'snippet': snippet_elem.get_text(strip=True) if snippet_elem else '',
-                    'is_instant': False,
-                })
+                results.append(Result(
+                    title=title_elem.get_text(strip=True),
+                    url=url,
+                    display_url=urllib.parse.urlparse(url).netloc.replace('www.', ''),
+                    snippet=snippet_elem.get_text(strip=True) if snippet_elem else '',
+                    is_instant=False,
+                ))
     
     return results
 
-def parse_brave(html: str) -> list[dict]:
+def parse_brave(html: str) -> list[Result]:
     """Brave search parsing"""
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = parse_html(html)
     results = []
     
     for result in soup.select('div.snippet')[:100]:
@@ -115,16 +227,163 @@ def parse_brave(html: str) -> list[dict]:
         
         if title and link:
             url = link.get('href', '')
-            results.append({
-                'title': title.get_text(strip=True),
-                'url': url,
-                'display_url': urllib.parse.urlparse(url).netloc.replace('www.', ''),
-                'snippet': snippet.get_text(strip=True) if snippet else '',
-                'is_instant': False,
-            })
+            results.append(Result(
+                title=title.get_text(strip=True),
+                url=url,
+                display_url=urllib.parse.urlparse(url).netloc.replace('www.', ''),
+                snippet=snippet.get_text(strip=True) if snippet else '',
+                is_instant=False,
+            ))
     
     return results
 
+def page_url(engine: str, query: str, page: int) -> str:
+    """Results URL for one page of an engine"""
+    if engine == 'duckduckgo':
+        url = f'https://html.duckduckgo.com/html/?q={urllib.parse.quote_plus(query)}'
+        if page > 0:
+            url += f'&s={page * 30}'
+    elif engine == 'google':
+        url = f'https://www.google.com/search?q={urllib.parse.quote_plus(query)}&num=10&start={page * 10}'
+    elif engine == 'brave':
+        url = f'https://search.brave.com/search?q={urllib.parse.quote_plus(query)}&offset={page}'
+    else:
+        url = f'https://html.duckduckgo.com/html/?q={urllib.parse.quote_plus(query)}'
+    return url
+
+def parse_page(engine: str, html: str) -> list[Result]:
+    """Use appropriate parser"""
+    if engine == 'duckduckgo':
+        return parse_duckduckgo(html)
+    elif engine == 'google':
+        return parse_google(html)
+    elif engine == 'brave':
+        return parse_brave(html)
+    return parse_duckduckgo(html)
+
+def fetch_page(engine: str, query: str, page: int) -> list[Result]:
+    """Fetch and parse a single results page"""
+    url = page_url(engine, query, page)
+    breaker = circuit.breakers.get(url)
+    if not breaker.allow():
+        upstream_requests.inc(engine, 'circuit_open')
+        raise circuit.CircuitOpen(circuit.host_of(url))
+    tracker = latency.trackers.get(url)
+    start = time.perf_counter()
+    timer = timing.current()
+    try:
+        hedge_after = tracker.hedge_delay()
+        if hedge_after is not None:
+            # Each of the hedged requests records its own latency
+            response = http_client.hedged_get(url, hedge_after, observe=tracker.observe, headers=HEADERS,
+                                              timeout=tracker.timeout(8))
+        else:
+            response = http_client.get(url, headers=HEADERS, timeout=tracker.timeout(8))
+            tracker.observe(time.perf_counter() - start)
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        upstream_requests.inc(engine, f'http_{e.response.status_code // 100}xx')
+        breaker.record(not circuit.is_failure_status(e.response.status_code))
+        raise
+    except requests.Timeout:
+        upstream_requests.inc(engine, 'timeout')
+        # It took at least this long; leaving it out would pin the timeout
+        tracker.observe(time.perf_counter() - start)
+        breaker.record(False)
+        raise
+    except Exception:
+        upstream_requests.inc(engine, 'error')
+        breaker.record(False)
+        raise
+    finally:
+        upstream_latency.observe(time.perf_counter() - start, engine)
+        if timer is not None:
+            timer.add('fetch', time.perf_counter() - start)
+    upstream_requests.inc(engine, 'ok')
+    breaker.record(True)
+    with parse_seconds.time(engine), timing.phase('parse'):
+        return parse_page(engine, response.text)
+
+def iter_pages(engine: str, query: str, pages: int):
+    """
+    Fetch up to `pages` pages concurrently, at most PAGE_FANOUT at a time,
+    yielding (page, results) as each finishes. Stops early once
+    TARGET_RESULTS unique URLs are in or PAGE_DEADLINE passes; pages not
+    yet started are cancelled.
+    """
+    deadline = time.monotonic() + PAGE_DEADLINE
+    fetched = 0
+    seen_urls = set()
+    pending = {}
+    next_page = 0
+    
+    try:
+        while True:
+            while next_page < pages and len(pending) < PAGE_FANOUT:
+                future = page_pool.submit(contextvars.copy_context().run, fetch_page, engine, query, next_page)
+                pending[future] = next_page
+                next_page += 1
+            
+            remaining = deadline - time.monotonic()
+            if not pending:
+                break
+            if remaining <= 0:
+                page_deadline_exceeded.inc(engine)
+                break
+            
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"⚠️ Page {page} failed: {e}")
+                    continue
+                fetched += 1
+                seen_urls.update(dedup.canonical_url(r['url']) for r in results if r['url'])
+                yield page, results
+            
+            if len(seen_urls) >= TARGET_RESULTS:
+                break
+    finally:
+        for future in pending:
+            future.cancel()
+        pages_fetched.observe(fetched, engine)
+
+def fetch_pages(engine: str, query: str, pages: int) -> list[Result]:
+    """Every page's results from iter_pages, in page order"""
+    page_results = dict(iter_pages(engine, query, pages))
+    all_results = []
+    for page in sorted(page_results):
+        all_results.extend(page_results[page])
+    return all_results
+
+def rank_results(engine: str, query: str, pages: int) -> list[Result]:
+    """Fetch, de-duplicate and rank the top 100 results for a query"""
+    return rank_fetched(engine, query, fetch_pages(engine, query, pages))
+
+def rank_fetched(engine: str, query: str, all_results: list[Result]) -> list[Result]:
+    """De-duplicate and rank fetched results (in page order), keeping the top 100"""
+    with timing.phase('rank'):
+        # Remove duplicates: same canonical URL, or near-identical title + snippet
+        unique_results, dropped = dedup.collapse(all_results)
+        for reason, count in dropped.items():
+            if count:
+                duplicates_collapsed.inc(reason, amount=count)
+        
+        # Calculate relevance scores
+        keywords = [w for w in query.split() if len(w) > 2]
+        scores = relevance.score_results(unique_results, keywords, RELEVANCE_MODE)
+        for result, score in zip(unique_results, scores):
+            result['relevance_score'] = score
+        
+        # Sort by relevance
+        unique_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+    
+    # Top 100
+    search_results.observe(min(len(unique_results), 100), engine)
+    return unique_results[:100]
+
 @app.route('/api/search', methods=['GET', 'POST'])
 def search():
     """Python fallback search - used when Rust is unavailable"""
@@ -142,84 +401,108 @@ def search():
         
         print(f"🐍 Python parsing: {query} via {engine}")
         
-        all_results = []
-        
         # Multi-page scraping
         pages = 5 if engine != 'google' else 10
+        key = (normalize_query(query), engine, pages)
         
-        for page in range(pages):
-            try:
-                if engine == 'duckduckgo':
-                    url = f'https://html.duckduckgo.com/html/?q={urllib.parse.quote_plus(query)}'
-                    if page > 0:
-                        url += f'&s={page * 30}'
-                elif engine == 'google':
-                    url = f'https://www.google.com/search?q={urllib.parse.quote_plus(query)}&num=10&start={page * 10}'
-                elif engine == 'brave':
-                    url = f'https://search.brave.com/search?q={urllib.parse.quote_plus(query)}&offset={page}'
-                else:
-                    url = f'https://html.duckduckgo.com/html/?q={urllib.parse.quote_plus(query)}'
-                
-                response = requests.get(url, headers=HEADERS, timeout=8)
-                response.raise_for_status()
-                
-                # Use appropriate parser
-                if engine == 'duckduckgo':
-                    results = parse_duckduckgo(response.text)
-                elif engine == 'google':
-                    results = parse_google(response.text)
-                elif engine == 'brave':
-                    results = parse_brave(response.text)
-                else:
-                    results = parse_duckduckgo(response.text)
-                
-                all_results.extend(results)
-                
-            except Exception as e:
-                print(f"⚠️ Page {page} failed: {e}")
-                continue
-        
-        # Remove duplicates
-        seen_urls = set()
-        unique_results = []
-        for result in all_results:
-            if result['url'] not in seen_urls and result['url']:
-                seen_urls.add(result['url'])
-                unique_results.append(result)
-        
-        # Calculate relevance scores
-        keywords = [w for w in query.split() if len(w) > 2]
-        for result in unique_results:
-            result['relevance_score'] = calculate_relevance(result, keywords)
+        def load():
+            timing.note('cache', 'miss')
+            return rank_results(engine, query, pages)
         
-        # Sort by relevance
-        unique_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+        def coalesced_load():
+            results, leader = search_flights.do(key, load)
+            if not leader:
+                timing.note('cache', 'coalesced')
+            return results
         
-        # Top 100
-        final_results = unique_results[:100]
+        timing.note('cache', 'hit')
+        final_results = search_cache.get_or_load(key, coalesced_load)
         
-        return jsonify({
-            "success": True,
-            "query": query,
-            "engine": engine,
-            "results": final_results,
-            "total_count": len(final_results),
-            "method": "python-advanced-parser",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        with timing.phase('serialize'):
+            return json_response({
+                "success": True,
+                "query": query,
+                "engine": engine,
+                "results": final_results,
+                "total_count": len(final_results),
+                "method": "python-advanced-parser",
+                "timestamp": datetime.utcnow().isoformat()
+            })
     
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/search/stream', methods=['GET'])
+def search_stream():
+    """
+    /api/search as SSE or NDJSON: each page's results as soon as it is
+    parsed, then a summary with the de-duplicated, ranked order
+    """
+    query = request.args.get('q', '')
+    engine = request.args.get('engine', 'duckduckgo')
+    fmt = event_stream.negotiate(request.headers.get('Accept'), request.args.get('format'))
+    
+    def respond(events, status=200):
+        return Response(events, status=status, mimetype=event_stream.MIMETYPES[fmt],
+                        headers=event_stream.STREAM_HEADERS)
+    
+    if not query:
+        return respond([event_stream.encode(fmt, 'summary', {"success": False, "error": "No query", "order": []})], 400)
+    
+    print(f"🐍 Python streaming: {query} via {engine}")
+    pages = 5 if engine != 'google' else 10
+    key = (normalize_query(query), engine, pages)
+    cached = search_cache.get(key)
+    timing.note('cache', 'miss' if cached is None else 'hit')
+    
+    def generate():
+        try:
+            if cached is not None:
+                final_results = cached
+                yield event_stream.encode(fmt, 'results', {"engine": engine, "page": None, "results": cached})
+            else:
+                page_results = {}
+                for page, results in iter_pages(engine, query, pages):
+                    page_results[page] = results
+                    yield event_stream.encode(fmt, 'results', {"engine": engine, "page": page, "results": results})
+                all_results = [r for page in sorted(page_results) for r in page_results[page]]
+                final_results = rank_fetched(engine, query, all_results)
+                if final_results:
+                    search_cache.set(key, final_results)
+            yield event_stream.encode(fmt, 'summary', {
+                "success": True,
+                "query": query,
+                "engine": engine,
+                "order": [r['url'] for r in final_results],
+                "relevance_scores": [r['relevance_score'] for r in final_results],
+                "total_count": len(final_results),
+                "method": "python-advanced-parser",
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        except Exception as e:
+            yield event_stream.encode(fmt, 'summary', {"success": False, "error": str(e), "order": []})
+    
+    return respond(generate())
+
 @app.route('/api/health', methods=['GET'])
 def health():
     return jsonify({
         "status": "healthy",
         "service": "python-parser",
         "version": "3.14.x",
+        "http_pool": http_client.stats(),
+        "cache": search_cache.stats(),
+        "circuits": circuit.breakers.stats(),
+        "latency": latency.trackers.stats(),
+        "coalescing": singleflight.stats(),
         "timestamp": datetime.utcnow().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return metrics.render(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
 if __name__ == '__main__':
     print("🐍 Python 3.14 Advanced Parser starting on port 5000...")
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,129 @@
+"""
+Batch relevance scoring for ranked results
+Scores a whole result list against the query keywords in one call, so
+per-query work (lowercasing keywords, BM25 document frequencies) happens
+once per batch instead of once per result.
+`classic` scores are identical to parser.calculate_relevance; `bm25` ranks
+by Okapi BM25 over the same batch. fuse_rankings merges several engines'
+ranked lists with reciprocal rank fusion.
+"""
+
+import math
+import re
+from collections import Counter
+
+from dedup import canonical_url
+
+# calculate_relevance weights
+TITLE_HIT = 10
+TITLE_EXACT = 20
+SNIPPET_HIT = 5
+URL_HIT = 3
+ALL_KEYWORDS = 15
+
+# BM25 parameters; title terms count TITLE_BOOST times
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_BOOST = 2
+
+# Reciprocal rank fusion: a result at rank r in one list scores 1 / (RRF_K + r)
+RRF_K = 60
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def classic_scores(results, keywords):
+    """calculate_relevance(result, keywords) for every result, in order"""
+    # Lowercase the query once for the whole batch rather than per result
+    lowered = [k.lower() for k in keywords]
+    exact = Counter(lowered)
+    scores = []
+    for result in results:
+        title = result['title'].lower()
+        snippet = result['snippet'].lower()
+        url = result['url'].lower()
+        score = 0
+        for keyword in lowered:
+            if keyword in title:
+                score += TITLE_HIT
+            if keyword in snippet:
+                score += SNIPPET_HIT
+            if keyword in url:
+                score += URL_HIT
+        if title in exact:
+            score += TITLE_EXACT * exact[title]
+        combined = title + ' ' + snippet
+        if all(keyword in combined for keyword in lowered):
+            score += ALL_KEYWORDS
+        scores.append(score)
+    return scores
+
+
+def bm25_scores(results, keywords, k1=BM25_K1, b=BM25_B):
+    """Okapi BM25 of each result's title + snippet for the keyword terms"""
+    terms = {t for k in keywords for t in TOKEN_RE.findall(k.lower())}
+    docs = []
+    for result in results:
+        tf = Counter(TOKEN_RE.findall(result['snippet'].lower()))
+        for token in TOKEN_RE.findall(result['title'].lower()):
+            tf[token] += TITLE_BOOST
+        docs.append(tf)
+    if not docs or not terms:
+        return [0.0] * len(docs)
+
+    lengths = [sum(tf.values()) for tf in docs]
+    avg_length = sum(lengths) / len(docs) or 1
+    n = len(docs)
+    idf = {}
+    for term in terms:
+        df = sum(1 for tf in docs if term in tf)
+        idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    scores = []
+    for tf, length in zip(docs, lengths):
+        norm = k1 * (1 - b + b * length / avg_length)
+        score = 0.0
+        for term in terms:
+            f = tf.get(term)
+            if f:
+                score += idf[term] * f * (k1 + 1) / (f + norm)
+        scores.append(round(score, 4))
+    return scores
+
+
+def score_results(results, keywords, mode='classic'):
+    """Relevance score per result, in order ('classic' or 'bm25')"""
+    if mode == 'bm25':
+        return bm25_scores(results, keywords)
+    return classic_scores(results, keywords)
+
+
+def fuse_rankings(rankings, k=RRF_K):
+    """
+    Reciprocal rank fusion of {source: ranked results}. Results whose URLs
+    canonicalize alike are merged, keeping the copy from its best-ranked
+    source. Returns new dicts, best first, with the sources that returned
+    each result under 'engines' and its fused score under 'fusion_score'.
+    """
+    fused = {}  # canonical url -> [score, best rank, result, sources]
+    for source, results in rankings.items():
+        for rank, result in enumerate(results, 1):
+            if not result.get('url'):
+                continue
+            key = canonical_url(result['url'])
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = [0.0, rank, result, []]
+            elif source in entry[3]:
+                continue
+            elif rank < entry[1]:
+                entry[1], entry[2] = rank, result
+            entry[0] += 1 / (k + rank)
+            entry[3].append(source)
+    merged = []
+    for score, _, result, sources in sorted(fused.values(), key=lambda entry: (-entry[0], entry[1])):
+        result = result.copy()
+        result['engines'] = sources
+        result['fusion_score'] = round(score, 6)
+        merged.append(result)
+    return merged
@@ -0,0 +1,126 @@
+"""
+Search result model shared by app.py, asgi.py and parser.py
+A Result is a slotted record with a dict-like interface (result['url'],
+.get(), `in`, assignment), so code written against the old result dicts
+keeps working. Optional fields that were never set are absent, exactly as
+missing dict keys were. Each Result caches its own JSON encoding, so
+results served again from the search cache are not re-encoded.
+
+dumps() writes the same bytes as Flask's jsonify (sorted keys, compact
+separators, ASCII escapes) without walking every result through the
+encoder; add the trailing newline jsonify appends when building a response.
+"""
+
+import json
+
+# Field order is the key order of the dicts results used to be, so
+# insertion-ordered encoders (Starlette's JSONResponse) see no change
+FIELDS = ('title', 'url', 'display_url', 'snippet', 'engine', 'is_instant', 'relevance_score', 'engines',
+          'fusion_score')
+_FIELD_SET = frozenset(FIELDS)
+
+
+def json_default(value, fallback=None):
+    """`default=` hook for json.dumps and Flask's JSON provider"""
+    if isinstance(value, Result):
+        return value.to_dict()
+    if fallback is not None:
+        return fallback(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+# Matches Flask's DefaultJSONProvider outside debug mode
+_encoder = json.JSONEncoder(ensure_ascii=True, sort_keys=True, separators=(',', ':'), default=json_default)
+
+
+class Result:
+    __slots__ = FIELDS + ('_json',)
+
+    def __init__(self, title, url, display_url, snippet, **fields):
+        self.title = title
+        self.url = url
+        self.display_url = display_url
+        self.snippet = snippet
+        self._json = None
+        for name, value in fields.items():
+            self[name] = value
+
+    def __getitem__(self, name):
+        if name not in _FIELD_SET:
+            raise KeyError(name)
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name, value):
+        if name not in _FIELD_SET:
+            raise KeyError(name)
+        setattr(self, name, value)
+        self._json = None
+
+    def __contains__(self, name):
+        return name in _FIELD_SET and hasattr(self, name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [name for name in FIELDS if hasattr(self, name)]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in FIELDS if hasattr(self, name)]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def copy(self):
+        clone = Result.__new__(Result)
+        for name, value in self.items():
+            setattr(clone, name, value)
+        clone._json = self._json
+        return clone
+
+    def json(self):
+        """This result as jsonify would encode it (cached until a field changes)"""
+        if self._json is None:
+            self._json = _encoder.encode(self.to_dict())
+        return self._json
+
+    def __eq__(self, other):
+        if isinstance(other, (Result, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'Result({self.to_dict()!r})'
+
+
+def _dumps_list(values):
+    return '[' + ','.join(v.json() if isinstance(v, Result) else _encoder.encode(v) for v in values) + ']'
+
+
+def dumps(payload):
+    """
+    jsonify-identical JSON text for a response payload. Result lists one
+    level down (payload['results']) are joined from each Result's cached
+    encoding; everything else goes through the stdlib encoder.
+    """
+    if isinstance(payload, list):
+        return _dumps_list(payload)
+    if not isinstance(payload, dict):
+        return _encoder.encode(payload)
+    parts = []
+    for key in sorted(payload):
+        value = payload[key]
+        if isinstance(value, list) and value and isinstance(value[0], Result):
+            encoded = _dumps_list(value)
+        else:
+            encoded = _encoder.encode(value)
+        parts.append(_encoder.encode(key) + ':' + encoded)
+    return '{' + ','.join(parts) + '}'
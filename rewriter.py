@@ -0,0 +1,185 @@
+"""
+Streaming HTML rewriter for /api/proxy
+Tokenizes the page as chunks arrive, rewrites URL attributes to go back
+through the proxy and injects the proxy bar right after <body>, emitting
+output per chunk instead of building a whole-document tree.
+"""
+
+import base64
+import codecs
+import time
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from requests.utils import get_encodings_from_content
+
+# Same rules the BeautifulSoup rewrite used
+REWRITE_TAGS = frozenset(('a', 'link', 'script', 'img', 'iframe'))
+REWRITE_ATTRS = frozenset(('href', 'src', 'action'))
+SKIP_PREFIXES = ('data:', 'javascript:', 'mailto:', '#')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def proxy_url(base_url, url):
+    """Proxied form of a (possibly relative) URL found in the page"""
+    abs_url = urljoin(base_url, url)
+    encoded = base64.b64encode(abs_url.encode()).decode()
+    return f'/api/proxy?url={encoded}'
+
+
+class ProxyRewriter(HTMLParser):
+    """
+    Incremental rewriter: feed() text, get rewritten text back.
+    Markup that needs no rewriting is passed through as written.
+    """
+
+    def __init__(self, base_url, bar=''):
+        super().__init__(convert_charrefs=False)
+        self.base_url = base_url
+        self.bar = bar
+        self._out = []
+        self.rewrite_seconds = 0.0  # time spent rewriting URL attributes
+
+    def feed(self, data):
+        super().feed(data)
+        return self._flush()
+
+    def close(self):
+        super().close()
+        return self._flush()
+
+    def _flush(self):
+        out = ''.join(self._out)
+        self._out.clear()
+        return out
+
+    def _start(self, tag, attrs):
+        raw = self.get_starttag_text()
+        if tag in REWRITE_TAGS:
+            start = time.perf_counter()
+            rewritten = False
+            new_attrs = []
+            for name, value in attrs:
+                if name in REWRITE_ATTRS and value and not value.startswith(SKIP_PREFIXES):
+                    value = proxy_url(self.base_url, value)
+                    rewritten = True
+                new_attrs.append((name, value))
+            if rewritten:
+                raw = self._build_tag(tag, new_attrs, raw.endswith('/>'))
+            self.rewrite_seconds += time.perf_counter() - start
+        self._out.append(raw)
+        if tag == 'body' and self.bar:
+            self._out.append(self.bar)
+            self.bar = ''
+
+    @staticmethod
+    def _build_tag(tag, attrs, self_closing):
+        parts = [tag]
+        for name, value in attrs:
+            parts.append(name if value is None else f'{name}="{escape(value, quote=True)}"')
+        return '<' + ' '.join(parts) + (' />' if self_closing else '>')
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._out.append(f'</{tag}>')
+
+    def handle_data(self, data):
+        self._out.append(data)
+
+    def handle_entityref(self, name):
+        self._out.append(f'&{name};')
+
+    def handle_charref(self, name):
+        self._out.append(f'&#{name};')
+
+    def handle_comment(self, data):
+        self._out.append(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self._out.append(f'<!{decl}>')
+
+    def handle_pi(self, data):
+        self._out.append(f'<?{data}>')
+
+    def unknown_decl(self, data):
+        # data is e.g. 'CDATA[x' for <![CDATA[x]]>
+        self._out.append(f'<![{data}]]>')
+
+
+def sniff_encoding(response, head):
+    """Charset from the Content-Type header, else a <meta> tag, else UTF-8"""
+    if 'charset' in response.headers.get('Content-Type', '').lower() and response.encoding:
+        encoding = response.encoding
+    else:
+        found = get_encodings_from_content(head.decode('ascii', 'ignore'))
+        encoding = found[0] if found else 'utf-8'
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = 'utf-8'
+    return encoding
+
+
+class StreamRewriter:
+    """Decodes upstream byte chunks and runs them through ProxyRewriter"""
+
+    def __init__(self, response, base_url, bar=''):
+        self.response = response
+        self.rewriter = ProxyRewriter(base_url, bar)
+        self.decoder = None
+        self.seconds = 0.0
+
+    def feed(self, chunk):
+        start = time.perf_counter()
+        if self.decoder is None:
+            encoding = sniff_encoding(self.response, chunk)
+            self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        out = self.rewriter.feed(self.decoder.decode(chunk))
+        self.seconds += time.perf_counter() - start
+        return out
+
+    def close(self):
+        start = time.perf_counter()
+        out = ''
+        if self.decoder is not None:
+            out = self.rewriter.feed(self.decoder.decode(b'', final=True))
+        out += self.rewriter.close()
+        self.seconds += time.perf_counter() - start
+        return out
+
+    def timings(self):
+        """(parse, rewrite) seconds: decoding/tokenizing vs. rewriting URLs"""
+        rewrite = self.rewriter.rewrite_seconds
+        return max(0.0, self.seconds - rewrite), rewrite
+
+
+def rewrite_stream(response, base_url, bar='', body=None, timer=None):
+    """
+    Yield the rewritten page chunk by chunk as it arrives from upstream.
+    `body` overrides the byte chunks read from response (e.g. already read).
+    Parse and rewrite time are added to `timer` once the page is done.
+    """
+    if body is None:
+        body = response.iter_content(CHUNK_SIZE)
+    rewriter = StreamRewriter(response, base_url, bar)
+    try:
+        for chunk in body:
+            out = rewriter.feed(chunk)
+            if out:
+                yield out
+        out = rewriter.close()
+        if out:
+            yield out
+    finally:
+        response.close()
+        if timer is not None:
+            parse, rewrite = rewriter.timings()
+            timer.add('parse', parse)
+            timer.add('rewrite', rewrite)
@@ -0,0 +1,314 @@
+"""
+Request coalescing (single-flight)
+Concurrent requests for the same key share one upstream operation: the
+first caller (the leader) does the work, later callers (followers) wait
+for it and reuse its result instead of fetching and parsing again.
+"""
+
+import asyncio
+import contextvars
+import threading
+from collections import deque
+
+# Every group by name, so stats cover both the thread and asyncio apps
+_groups = []
+
+
+class Flight:
+    """One in-progress operation that followers can wait on"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def finish(self, value=None, error=None):
+        """Record the outcome; only the first call counts"""
+        if self._done.is_set():
+            return
+        self.value = value
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """True once the leader has finished, False if `timeout` ran out first"""
+        return self._done.wait(timeout)
+
+
+class SingleFlight:
+    """
+    `timeout`: longest a follower of do() waits for the leader before
+    running fn itself (None waits for as long as the leader takes)
+    """
+
+    def __init__(self, name, timeout=None):
+        self.name = name
+        self.timeout = timeout
+        _groups.append(self)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+
+    def begin(self, key):
+        """(flight, is_leader). The leader must call end(key, ...) when done."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.followers += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.leaders += 1
+            return flight, True
+
+    def end(self, key, flight, value=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(value, error)
+
+    def wait(self, key, flight, timeout=None):
+        """Follower side of begin(): did the leader finish within `timeout`?"""
+        if flight.wait(timeout):
+            return True
+        with self._lock:
+            self.timeouts += 1
+            # Don't queue later requests behind a leader that never ended
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        return False
+
+    def do(self, key, fn):
+        """(fn(), is_leader), running fn only once across concurrent callers with the same key"""
+        flight, leader = self.begin(key)
+        if not leader:
+            if not self.wait(key, flight, self.timeout):
+                # The leader is stuck: do the work here rather than wait any longer
+                return fn(), True
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, False
+        try:
+            value = fn()
+        except BaseException as e:
+            self.end(key, flight, error=e)
+            raise
+        self.end(key, flight, value)
+        return value, True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'coalesced': self.followers,
+                'wait_timeouts': self.timeouts,
+            }
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop"""
+
+    def __init__(self, name, timeout=None):
+        self.name = name
+        self.timeout = timeout
+        _groups.append(self)
+        self._flights = {}
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+
+    def begin(self, key):
+        """(future, is_leader). The leader must call end(key, ...) when done."""
+        future = self._flights.get(key)
+        if future is not None:
+            self.followers += 1
+            return future, False
+        future = self._flights[key] = asyncio.get_running_loop().create_future()
+        self.leaders += 1
+        return future, True
+
+    def end(self, key, future, value=None, error=None):
+        if self._flights.get(key) is future:
+            del self._flights[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Followers may all have given up; don't warn about an unread error
+            future.exception()
+        else:
+            future.set_result(value)
+
+    async def wait(self, key, future, timeout=None):
+        """Follower side of begin(): did the leader finish within `timeout`?"""
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if self._flights.get(key) is future:
+                del self._flights[key]
+            return False
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+        except Exception:
+            pass
+        return True
+
+    async def do(self, key, fn):
+        """(await fn(), is_leader), awaiting fn only once across concurrent callers with the same key"""
+        future, leader = self.begin(key)
+        if not leader:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout), False
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                if self._flights.get(key) is future:
+                    del self._flights[key]
+                return await fn(), True
+            except asyncio.CancelledError:
+                # The leader was cancelled (e.g. by its own deadline), not us: go again
+                task = asyncio.current_task()
+                if not future.cancelled() or getattr(task, 'cancelling', lambda: 0)():
+                    raise
+                return await self.do(key, fn)
+        try:
+            value = await fn()
+        except Exception as e:
+            self.end(key, future, error=e)
+            raise
+        except BaseException:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+            future.cancel()
+            raise
+        self.end(key, future, value)
+        return value, True
+
+    def stats(self):
+        return {
+            'in_flight': len(self._flights),
+            'leaders': self.leaders,
+            'coalesced': self.followers,
+            'wait_timeouts': self.timeouts,
+        }
+
+
+def stats():
+    """Counts per group name, summed over the thread and asyncio groups"""
+    totals = {}
+    for group in list(_groups):
+        merged = totals.setdefault(group.name, {})
+        for key, value in group.stats().items():
+            merged[key] = merged.get(key, 0) + value
+    return totals
+
+
+def counts():
+    """{(group, role): n} for the coalescing metric"""
+    return {
+        (name, role): group[key]
+        for name, group in stats().items()
+        for role, key in (('leader', 'leaders'), ('follower', 'coalesced'), ('wait_timeout', 'wait_timeouts'))
+    }
+
+
+def read_ahead(chunks, max_bytes):
+    """
+    Yield from `chunks`, pulling them on a separate thread up to `max_bytes`
+    ahead of the consumer. A leader streaming its result to a slow client
+    thereby finishes (and releases its followers) at upstream speed.
+    """
+    cond = threading.Condition()
+    buffer = deque()
+    state = {'size': 0, 'done': False, 'error': None, 'closed': False}
+
+    def produce():
+        try:
+            for chunk in chunks:
+                with cond:
+                    while state['size'] >= max_bytes and not state['closed']:
+                        cond.wait()
+                    if state['closed']:
+                        break
+                    buffer.append(chunk)
+                    state['size'] += len(chunk)
+                    cond.notify_all()
+        except BaseException as e:
+            state['error'] = e
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            with cond:
+                state['done'] = True
+                cond.notify_all()
+
+    threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True).start()
+    try:
+        while True:
+            with cond:
+                while not buffer and not state['done']:
+                    cond.wait()
+                if buffer:
+                    chunk = buffer.popleft()
+                    state['size'] -= len(chunk)
+                    cond.notify_all()
+                elif state['error'] is not None:
+                    raise state['error']
+                else:
+                    return
+            yield chunk
+    finally:
+        with cond:
+            state['closed'] = True
+            cond.notify_all()
+
+
+async def async_read_ahead(chunks, max_bytes):
+    """read_ahead() for an async iterator, pulled by a task on the same loop"""
+    buffer = deque()
+    state = {'size': 0, 'done': False, 'error': None}
+    readable = asyncio.Event()
+    writable = asyncio.Event()
+    writable.set()
+
+    async def produce():
+        try:
+            async for chunk in chunks:
+                await writable.wait()
+                buffer.append(chunk)
+                state['size'] += len(chunk)
+                if state['size'] >= max_bytes:
+                    writable.clear()
+                readable.set()
+        except Exception as e:
+            state['error'] = e
+        finally:
+            state['done'] = True
+            readable.set()
+            aclose = getattr(chunks, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+
+    task = asyncio.ensure_future(produce())
+    try:
+        while True:
+            await readable.wait()
+            if buffer:
+                chunk = buffer.popleft()
+                state['size'] -= len(chunk)
+                if state['size'] < max_bytes:
+                    writable.set()
+                if not buffer and not state['done']:
+                    readable.clear()
+                yield chunk
+            elif state['error'] is not None:
+                raise state['error']
+            else:
+                return
+    finally:
+        if not task.done():
+            task.cancel()
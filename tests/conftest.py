@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The backend is a set of top-level modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Upstream(ThreadingHTTPServer):
+    """
+    Local origin for proxy tests: serves registered bodies, honors
+    single-range Range requests and records what each request sent
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), UpstreamHandler)
+        self.pages = {}     # path -> (content type, body bytes, honor Range?, extra headers)
+        self.requests = []  # (path, headers) in arrival order
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def add(self, path, body, content_type='text/html; charset=utf-8', ranges=True, **headers):
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        self.pages[path] = (content_type, body, ranges, headers)
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # UPSTREAM_OVERRIDE routes https://host/path to <override>/host/path
+        path = '/' + self.path.lstrip('/').partition('/')[2]
+        self.server.requests.append((path, dict(self.headers)))
+        if path not in self.server.pages:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content_type, body, ranges, headers = self.server.pages[path]
+        status = 200
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match and ranges:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+            headers = dict(headers, **{'Content-Range': f'bytes {start}-{end}/{len(body)}'})
+            body = body[start:end + 1]
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        for name, value in headers.items():
+            self.send_header(name.replace('_', '-'), value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def upstream():
+    server = Upstream()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def proxy_app(upstream, monkeypatch, tmp_path):
+    """app.py routed at the local upstream, with empty proxy caches"""
+    import app
+    import http_client
+    from asset_cache import AssetCache
+    from page_cache import PageCache
+
+    monkeypatch.setattr(http_client, 'UPSTREAM_OVERRIDE', upstream.url)
+    monkeypatch.setattr(app, 'asset_cache', AssetCache(str(tmp_path / 'assets')))
+    monkeypatch.setattr(app, 'page_cache', PageCache())
+    monkeypatch.setattr(app.proxy_flights, '_flights', {})
+    return app.app.test_client()
+
+
+@pytest.fixture
+def search_app(monkeypatch):
+    """app.py with empty search caches, fresh engine health and no instant answers;
+    tests stub app.scrape_engine"""
+    import app
+    from engine_health import EngineHealth
+
+    app.search_cache.clear()
+    app.answer_cache.clear()
+    monkeypatch.setattr(app, 'engine_health', EngineHealth(app.EXTRACTORS))
+    monkeypatch.setattr(app.search_flights, '_flights', {})
+    monkeypatch.setattr(app, 'get_duckduckgo_instant_answer', lambda query: {'has_answer': False})
+    return app.app.test_client()
+
+
+@pytest.fixture
+def asgi_client(upstream, monkeypatch, tmp_path):
+    """asgi.py routed at the local upstream, with empty proxy caches"""
+    from starlette.testclient import TestClient
+
+    import asgi
+    import http_client
+    from asset_cache import AssetCache
+    from page_cache import PageCache
+
+    monkeypatch.setattr(http_client, 'UPSTREAM_OVERRIDE', upstream.url)
+    monkeypatch.setattr(asgi, 'asset_cache', AssetCache(str(tmp_path / 'assets')))
+    monkeypatch.setattr(asgi, 'page_cache', PageCache())
+    with TestClient(asgi.app) as client:
+        yield client
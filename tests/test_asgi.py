@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('httpx')
+
+from test_proxy import PAGE, proxied  # noqa: E402
+from test_html_backend import load  # noqa: E402
+
+
+def test_html_is_rewritten_and_then_served_from_the_page_cache(asgi_client, upstream):
+    upstream.add('/page', PAGE, ETag='"v1"')
+    first = asgi_client.get(proxied('https://site.test/page'))
+    assert first.status_code == 200
+    assert 'id="pxbar"' in first.text
+    assert proxied('https://site.test/next') in first.text
+    second = asgi_client.get(proxied('https://site.test/page'))
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.text == first.text
+
+
+def test_html_range_is_relayed_unmodified(asgi_client, upstream):
+    upstream.add('/page', PAGE, ETag='"v1"')
+    response = asgi_client.get(proxied('https://site.test/page'), headers={'Range': 'bytes=0-99'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 0-99/{len(PAGE)}'
+    assert response.text == PAGE[:100]
+    assert 'X-Cache' not in asgi_client.get(proxied('https://site.test/page')).headers
+
+
+def test_assets_are_stored_and_served_from_disk(asgi_client, upstream):
+    upstream.add('/app.css', 'body{}' * 50, content_type='text/css', Cache_Control='max-age=60')
+    first = asgi_client.get(proxied('https://site.test/app.css'))
+    second = asgi_client.get(proxied('https://site.test/app.css'))
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.content == first.content == b'body{}' * 50
+    assert len(upstream.requests) == 1
+
+
+def test_rewritten_html_is_compressed(asgi_client, upstream):
+    upstream.add('/page', PAGE * 20)
+    response = asgi_client.get(proxied('https://site.test/page'), headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    # httpx has already decoded the body
+    assert response.text.count('x' * 500) == 20
+
+
+def test_passthrough_bodies_are_not_compressed(asgi_client, upstream):
+    # Compressing would change the representation that ETag and Range refer to
+    upstream.add('/data.json', '{"a": 1}' * 200, content_type='application/json', ETag='"v1"')
+    upstream.add('/app.css', 'body{}' * 500, content_type='text/css', Cache_Control='max-age=60')
+    for url in ('https://site.test/data.json', 'https://site.test/app.css', 'https://site.test/app.css'):
+        response = asgi_client.get(proxied(url), headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert 'Content-Encoding' not in response.headers
+    assert response.headers['X-Cache'] == 'HIT'
+    response = asgi_client.get(proxied('https://site.test/data.json'), headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['ETag'] == '"v1"' and response.headers['Accept-Ranges'] == 'bytes'
+
+
+def test_rewriting_runs_off_the_event_loop(asgi_client, upstream, monkeypatch):
+    import asgi
+
+    threads = {'rewrite': set(), 'loop': set()}
+    rewrite_chunk, encoded = asgi.rewrite_chunk, asgi.encoded
+
+    def tracked_rewrite(*args):
+        threads['rewrite'].add(threading.get_ident())
+        return rewrite_chunk(*args)
+
+    def tracked_encoded(*args):
+        threads['loop'].add(threading.get_ident())
+        return encoded(*args)
+
+    monkeypatch.setattr(asgi, 'rewrite_chunk', tracked_rewrite)
+    monkeypatch.setattr(asgi, 'encoded', tracked_encoded)
+    upstream.add('/page', PAGE)
+    assert 'id="pxbar"' in asgi_client.get(proxied('https://site.test/page')).text
+    assert threads['rewrite'] and threads['loop']
+    assert not threads['rewrite'] & threads['loop']
+
+
+def test_search_and_proxy_report_server_timing(asgi_client, upstream, monkeypatch, capsys):
+    import timing
+
+    monkeypatch.setattr(timing, 'SLOW_REQUEST_MS', 0.001)
+    upstream.add('/html/?q=timing%20potato', load('duckduckgo'))
+    upstream.add('/?q=timing%20potato&format=json&no_html=1&skip_disambig=1', '{}', content_type='application/json')
+    search = asgi_client.get('/api/search', params={'q': 'timing potato'})
+    assert search.json()['count'] > 0
+    for phase in ('fetch;dur=', 'parse;dur=', 'instant_answer;dur=', 'serialize;dur=', 'cache;desc="miss"'):
+        assert phase in search.headers['Server-Timing']
+
+    upstream.add('/page', PAGE)
+    proxy = asgi_client.get(proxied('https://site.test/page'))
+    assert 'fetch;dur=' in proxy.headers['Server-Timing']
+    log = capsys.readouterr().out
+    assert 'Slow request GET /api/search?q=timing+potato' in log
+    assert 'rewrite=' in log.splitlines()[-1]
+
+
+def test_scrape_that_misses_the_deadline_still_fills_the_cache(asgi_client, monkeypatch):
+    import asyncio
+
+    import asgi
+    from result_model import Result
+
+    async def scrape_engine(engine, query):
+        await asyncio.sleep(0.3)
+        return [Result(title='t', url='https://r.test/', display_url='r.test', snippet='s', engine=engine)]
+
+    async def no_answer(query):
+        return {'has_answer': False}
+
+    asgi.search_cache.clear()
+    asgi.answer_cache.clear()
+    monkeypatch.setattr(asgi, 'scrape_engine', scrape_engine)
+    monkeypatch.setattr(asgi, 'get_duckduckgo_instant_answer', no_answer)
+    monkeypatch.setattr(asgi, 'SEARCH_DEADLINE', 0.1)
+    assert asgi_client.get('/api/search?q=late+potato').json()['count'] == 0
+    deadline = time.monotonic() + 5
+    while asgi.search_cache.get(('late potato', 'duckduckgo', 1)) is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert asgi_client.get('/api/search?q=late+potato').json()['count'] == 1
@@ -0,0 +1,99 @@
+import os
+import time
+
+from requests.structures import CaseInsensitiveDict
+
+from asset_cache import AssetCache, freshness_lifetime
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, **headers):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict({'Content-Type': 'text/css', 'Cache-Control': 'max-age=60', **headers})
+
+
+def store(cache, url, body, **headers):
+    writer = cache.writer(url, FakeResponse(**headers))
+    assert writer is not None
+    writer.write(body)
+    writer.commit()
+
+
+def disk_bytes(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith('.body'))
+
+
+def test_freshness_lifetime():
+    now = time.time()
+    assert freshness_lifetime({'Cache-Control': 'public, max-age=120'}, now) == 120
+    assert freshness_lifetime({'Cache-Control': 'no-store'}, now) is None
+    assert freshness_lifetime({'Cache-Control': 'no-cache', 'ETag': '"v1"'}, now) == 0
+    assert freshness_lifetime({'Cache-Control': 'private, max-age=60'}, now) is None
+    assert freshness_lifetime({}, now) is None
+
+
+def test_stores_and_looks_up_complete_bodies(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    store(cache, 'https://site.test/a.css', b'body{}', ETag='"v1"')
+    entry = cache.lookup('https://site.test/a.css')
+    assert entry.is_fresh()
+    assert entry.validators() == {'If-None-Match': '"v1"'}
+    with open(entry.path, 'rb') as f:
+        assert f.read() == b'body{}'
+
+
+def test_skips_partial_and_truncated_bodies(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    assert cache.writer('https://site.test/a.css', FakeResponse(206)) is None
+    writer = cache.writer('https://site.test/b.css', FakeResponse(**{'Content-Length': '10'}))
+    writer.write(b'short')
+    writer.commit()
+    assert cache.lookup('https://site.test/b.css') is None
+    assert not os.listdir(tmp_path)
+
+
+def test_budget_covers_every_worker_sharing_the_directory(tmp_path):
+    # Two caches on one directory stand in for two gunicorn workers
+    workers = [AssetCache(str(tmp_path), max_bytes=1000, scan_interval=0) for _ in range(2)]
+    for i in range(10):
+        store(workers[i % 2], f'https://site.test/{i}.css', b'x' * 300)
+        assert disk_bytes(tmp_path) <= 1000
+    assert workers[0].stats()['bytes'] == disk_bytes(tmp_path)
+
+
+def test_hits_in_one_worker_protect_entries_from_eviction_by_another(tmp_path):
+    first = AssetCache(str(tmp_path), max_bytes=1000, scan_interval=0)
+    second = AssetCache(str(tmp_path), max_bytes=1000, scan_interval=0)
+    for i in range(3):
+        store(first, f'https://site.test/{i}.css', b'x' * 300)
+        past = time.time() - 100 + i
+        os.utime(first.lookup(f'https://site.test/{i}.css').path, (past, past))
+    first.touch(first.lookup('https://site.test/0.css'))
+    store(second, 'https://site.test/3.css', b'x' * 300)
+    assert first.lookup('https://site.test/0.css') is not None
+    assert first.lookup('https://site.test/1.css') is None
+
+
+def test_touch_keeps_the_modification_time(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    store(cache, 'https://site.test/a.css', b'body{}')
+    entry = cache.lookup('https://site.test/a.css')
+    os.utime(entry.path, (1000, 1000))
+    cache.touch(entry)
+    st = os.stat(entry.path)
+    assert st.st_mtime == 1000 and st.st_atime > 1000
+
+
+def test_concurrent_writers_for_one_url_do_not_share_a_file(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    first = cache.writer('https://site.test/a.css', FakeResponse())
+    second = cache.writer('https://site.test/a.css', FakeResponse())
+    assert first.tmp != second.tmp
+    first.write(b'AA')
+    second.write(b'BB')
+    first.write(b'AA')
+    second.commit()
+    first.commit()
+    with open(cache.lookup('https://site.test/a.css').path, 'rb') as f:
+        assert f.read() == b'AAAA'
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
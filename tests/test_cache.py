@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from cache import TTLCache, normalize_query
+
+
+def test_normalize_query_ignores_case_and_whitespace():
+    assert normalize_query('  Potato   HOMEWORK ') == 'potato homework'
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache('t', ttl=10)
+    cache.set('k', [1])
+    assert cache.get('k') == [1]
+    now[0] += 11
+    assert cache.get('k') is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache('t', max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_budget_is_enforced():
+    cache = TTLCache('t', max_bytes=100)
+    cache.set('a', 'x', size=60)
+    cache.set('b', 'y', size=60)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 60
+
+
+def test_stale_entry_is_served_while_refreshing(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache('t', ttl=10, stale_ttl=60)
+    cache.set('k', 'old')
+    now[0] += 20
+    refreshed = []
+
+    def loader():
+        refreshed.append(True)
+        return 'new'
+
+    assert cache.get_or_load('k', loader) == 'old'
+    deadline = time.perf_counter() + 5
+    while cache.stats()['refreshes'] == 0 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert refreshed and cache.get('k') == 'new'
+
+
+def test_async_stale_entry_is_served_while_refreshing():
+    cache = TTLCache('t', ttl=0.01, stale_ttl=60)
+    cache.set('k', 'old')
+    time.sleep(0.02)
+    refreshed = []
+
+    async def loader():
+        refreshed.append(True)
+        return 'new'
+
+    async def main():
+        assert await cache.aget_or_load('k', loader) == 'old'
+        assert await cache.aget_or_load('k', loader) == 'old'
+        while cache.stats()['refreshes'] == 0:
+            await asyncio.sleep(0.001)
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    # One refresh however many stale reads came in meanwhile
+    assert refreshed == [True] and cache.get('k') == 'new'
+
+
+def test_empty_loads_are_not_cached():
+    cache = TTLCache('t')
+    assert cache.get_or_load('k', list) == []
+    assert cache.get('k') is None
@@ -0,0 +1,121 @@
+import time
+
+import circuit
+from circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers
+
+
+class Clock:
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(time, 'monotonic', lambda: self.now)
+
+
+def breaker(**settings):
+    settings = dict(dict(window=10, min_requests=4, error_rate=0.5, open_seconds=30, half_open_probes=1), **settings)
+    return CircuitBreaker(**settings)
+
+
+def test_stays_closed_below_min_requests_or_error_rate():
+    b = breaker()
+    for ok in (False, False, False):
+        b.record(ok)
+    assert b.state == CLOSED
+    b = breaker()
+    for ok in (True, True, True, False, True):
+        b.record(ok)
+    assert b.state == CLOSED and b.allow()
+
+
+def test_opens_at_error_rate_and_rejects():
+    b = breaker()
+    for ok in (True, False, True, False):
+        b.record(ok)
+    assert b.state == OPEN
+    assert not b.allow()
+    assert b.stats()['rejected'] == 1 and b.stats()['trips'] == 1
+
+
+def test_half_open_after_timeout_lets_one_probe_through(monkeypatch):
+    clock = Clock(monkeypatch)
+    b = breaker()
+    for _ in range(4):
+        b.record(False)
+    clock.now += 31
+    assert b.allow()
+    assert b.state == HALF_OPEN
+    assert not b.allow()
+
+
+def test_successful_probe_closes(monkeypatch):
+    clock = Clock(monkeypatch)
+    b = breaker()
+    for _ in range(4):
+        b.record(False)
+    clock.now += 31
+    b.allow()
+    b.record(True)
+    assert b.state == CLOSED
+    assert b.stats()['recent_requests'] == 0
+
+
+def test_failed_probe_reopens(monkeypatch):
+    clock = Clock(monkeypatch)
+    b = breaker()
+    for _ in range(4):
+        b.record(False)
+    clock.now += 31
+    b.allow()
+    b.record(False)
+    assert b.state == OPEN
+    assert not b.allow()
+    assert b.stats()['trips'] == 2
+
+
+def test_lost_probe_stops_counting_after_open_seconds(monkeypatch):
+    clock = Clock(monkeypatch)
+    b = breaker()
+    for _ in range(4):
+        b.record(False)
+    clock.now += 31
+    assert b.allow()
+    clock.now += 31
+    assert b.allow()
+
+
+def test_breakers_are_per_host():
+    breakers = CircuitBreakers(window=10, min_requests=1, error_rate=0.5)
+    breakers.record('https://down.test/a', False)
+    assert not breakers.allow('https://down.test/b')
+    assert breakers.allow('https://up.test/a')
+    assert breakers.states() == {('down.test',): 2, ('up.test',): 0}
+
+
+def test_failure_statuses():
+    assert circuit.is_failure_status(503)
+    assert circuit.is_failure_status(429)
+    assert not circuit.is_failure_status(404)
+
+
+def test_backoff_is_jittered_under_an_exponential_cap(monkeypatch):
+    monkeypatch.setattr(circuit, 'RETRY_BACKOFF_BASE', 0.25)
+    monkeypatch.setattr(circuit, 'RETRY_BACKOFF_MAX', 1.0)
+    for attempt, cap in ((1, 0.25), (2, 0.5), (3, 1.0), (6, 1.0)):
+        delays = [circuit.backoff(attempt) for _ in range(200)]
+        assert all(0 <= d <= cap for d in delays)
+        assert len(set(delays)) > 1
+
+
+def test_least_recently_used_hosts_are_dropped():
+    breakers = CircuitBreakers(max_hosts=2)
+    a = breakers.get('https://a.test/x')
+    breakers.get('https://b.test/x')
+    assert breakers.get('https://a.test/y') is a
+    breakers.get('https://c.test/x')
+    assert sorted(breakers.stats()) == ['a.test', 'c.test']
+
+
+def test_states_can_be_limited_to_some_hosts():
+    breakers = CircuitBreakers()
+    breakers.get('https://engine.test/')
+    breakers.get('https://proxied.test/')
+    assert breakers.states({'engine.test'}) == {('engine.test',): 0}
@@ -0,0 +1,77 @@
+import gzip
+import zlib
+
+import pytest
+
+import compression
+from page_cache import PageCache
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(compression, 'COMPRESSION', True)
+
+
+def test_negotiate_prefers_server_order_among_equal_weights():
+    assert compression.negotiate('gzip, deflate') == 'gzip'
+    assert compression.negotiate('gzip;q=0, identity') is None
+    assert compression.negotiate('*') == compression.ENCODINGS[0]
+    assert compression.negotiate('') is None
+    if 'br' in compression.ENCODINGS:
+        assert compression.negotiate('gzip, br') == 'br'
+        assert compression.negotiate('gzip;q=1, br;q=0.5') == 'gzip'
+
+
+def test_negotiate_respects_the_switch(monkeypatch):
+    monkeypatch.setattr(compression, 'COMPRESSION', False)
+    assert compression.negotiate('gzip') is None
+
+
+def test_gzip_output_is_deterministic():
+    data = b'potato ' * 1000
+    assert compression.compress(data, 'gzip') == compression.compress(data, 'gzip')
+    assert gzip.decompress(compression.compress(data, 'gzip')) == data
+
+
+def test_stream_chunks_are_decodable_as_they_arrive():
+    decoder = zlib.decompressobj(31)
+    chunks = ['event: a\n\n', b'event: b\n\n', '', 'event: c\n\n']
+    sizes = []
+    out = []
+    for piece in compression.compress_stream(chunks, 'gzip', lambda raw, packed: sizes.append(raw)):
+        out.append(decoder.decompress(piece))
+    assert out[:3] == [b'event: a\n\n', b'event: b\n\n', b'event: c\n\n']
+    assert b''.join(out) == b'event: a\n\nevent: b\n\nevent: c\n\n'
+    assert decoder.eof
+    assert sum(sizes) == 30
+
+
+def test_cached_variant_is_reused_until_the_body_changes(monkeypatch):
+    compression.variants.clear()
+    calls = []
+    real = compression.compress
+    monkeypatch.setattr(compression, 'compress', lambda data, encoding: calls.append(1) or real(data, encoding))
+    body = b'{"results":[]}' * 100
+    first = compression.cached_variant('/api/search?q=a', body, 'gzip')
+    assert compression.cached_variant('/api/search?q=a', body, 'gzip') is first
+    assert len(calls) == 1
+    compression.cached_variant('/api/search?q=a', body + b' ', 'gzip')
+    assert len(calls) == 2
+
+
+def test_page_cache_keeps_each_compressed_variant():
+    cache = PageCache()
+    list(cache.record('https://site.test/', 200, {}, [b'x' * 5000], lambda chunks: (c.decode() for c in chunks)))
+    entry = cache.lookup('https://site.test/')
+    body = cache.body('https://site.test/', entry, 'gzip')
+    assert cache.body('https://site.test/', entry, 'gzip') is body
+    assert gzip.decompress(body) == b'x' * 5000
+    assert cache.cache.stats()['bytes'] == 5000 + len(body)
+
+
+def test_json_responses_are_compressed_when_accepted(proxy_app):
+    response = proxy_app.get('/health', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()).startswith(b'{')
+    assert 'Content-Encoding' not in proxy_app.get('/health').headers
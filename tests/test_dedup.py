@@ -0,0 +1,55 @@
+from dedup import NearDuplicateIndex, canonical_url, collapse, simhash, TOKEN_RE
+from result_model import Result
+
+
+def result(url, title='', snippet=''):
+    return Result(title=title, url=url, display_url='', snippet=snippet)
+
+
+def test_canonical_url_ignores_presentation_differences():
+    same = [
+        'https://www.site.test/a/b/?utm_source=x&q=1#frag',
+        'http://site.test:80/a/b?q=1&fbclid=123',
+        'https://SITE.test:443/a/b?q=1',
+    ]
+    assert len({canonical_url(url) for url in same}) == 1
+    assert canonical_url('https://site.test:8443/a') != canonical_url('https://site.test/a')
+    assert canonical_url('https://site.test/a?q=1') != canonical_url('https://site.test/a?q=2')
+    assert canonical_url('mailto:me@site.test') == 'mailto:me@site.test'
+
+
+def test_simhash_of_similar_text_is_close():
+    base = TOKEN_RE.findall('how to grow potatoes in a small garden with containers and good soil')
+    edit = TOKEN_RE.findall('how to grow potatoes in a small garden with buckets and good soil')
+    other = TOKEN_RE.findall('stock market report for the third quarter shows modest gains overall')
+    assert (simhash(base) ^ simhash(edit)).bit_count() < (simhash(base) ^ simhash(other)).bit_count()
+
+
+def test_near_duplicate_index_finds_hashes_within_distance():
+    index = NearDuplicateIndex(distance=3)
+    index.add(0b1111 << 40)
+    assert index.find((0b1111 << 40) ^ 0b101) is not None
+    assert index.find((0b1111 << 40) ^ 0b1111) is None
+
+
+def test_collapse_keeps_first_of_each_group():
+    snippet = 'how to grow potatoes in a small garden with containers and good soil'
+    results = [
+        result('https://a.test/page', 'Grow potatoes', snippet),
+        result('https://www.a.test/page/?utm_campaign=x', 'Grow potatoes again', 'other words entirely here'),
+        result('https://b.test/copy', 'Grow potatoes', snippet),
+        result('https://c.test/', 'Stock report', 'stock market report for the third quarter shows modest gains'),
+        result('', 'No url'),
+    ]
+    unique, dropped = collapse(results)
+    assert [r['url'] for r in unique] == ['https://a.test/page', 'https://c.test/']
+    assert dropped == {'url': 1, 'near': 1}
+
+
+def test_short_results_and_zero_distance_skip_near_duplicates():
+    results = [result('https://a.test/', 'Potato'), result('https://b.test/', 'Potato')]
+    assert len(collapse(results)[0]) == 2
+    snippet = 'how to grow potatoes in a small garden with containers and good soil'
+    results = [result('https://a.test/', 'x', snippet), result('https://b.test/', 'x', snippet)]
+    assert len(collapse(results, distance=0)[0]) == 2
+    assert len(collapse(results)[0]) == 1
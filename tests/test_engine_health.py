@@ -0,0 +1,74 @@
+import time
+
+import app
+from engine_health import EngineHealth
+from result_model import Result
+
+
+def result(engine):
+    return Result(title='t', url=f'https://{engine}.test/', display_url=f'{engine}.test', snippet='s', engine=engine)
+
+
+def scrapes(monkeypatch, working):
+    """Stub scrape_engine: engines in `working` return one result, the rest none"""
+    calls = []
+
+    def scrape_engine(engine, query):
+        calls.append(engine)
+        return [result(engine)] if engine in working else []
+
+    monkeypatch.setattr(app, 'scrape_engine', scrape_engine)
+    return calls
+
+
+def test_unknown_engines_score_neutral_and_keep_their_order():
+    health = EngineHealth(['a', 'b', 'c'])
+    assert health.score('a') == 0.5
+    assert health.fallbacks('a') == ['b', 'c']
+    assert health.fallbacks('b', limit=1) == ['a']
+
+
+def test_failures_and_latency_lower_the_score():
+    health = EngineHealth(['a', 'b', 'c'], latency_scale=1)
+    for _ in range(5):
+        health.record('a', True, 0.1)
+        health.record('b', False, 0.1)
+        health.record('c', True, 2.0)
+    assert health.score('a') > health.score('c') > health.score('b')
+    assert health.fallbacks('b') == ['a', 'c']
+    stats = health.stats()['c']
+    assert stats['recent_scrapes'] == 5 and stats['recent_successes'] == 5 and stats['mean_latency_ms'] == 2000.0
+
+
+def test_window_forgets_old_outcomes():
+    health = EngineHealth(['a'], window=3)
+    for ok in (False, False, False, True, True, True):
+        health.record('a', ok, 0)
+    assert health.stats()['a']['recent_successes'] == 3
+
+
+def test_empty_primary_falls_back_to_the_healthiest_engine(search_app, monkeypatch):
+    for _ in range(5):
+        app.engine_health.record('brave', True, 0.1)
+    calls = scrapes(monkeypatch, {'brave', 'startpage'})
+    results, served_by = app.search_with_fallback('google', 'potato', time.monotonic() + 5)
+    assert served_by == 'brave' and results[0].engine == 'brave'
+    assert calls == ['google', 'brave']
+
+
+def test_fallback_stops_at_the_deadline(search_app, monkeypatch):
+    calls = scrapes(monkeypatch, set())
+    assert app.search_with_fallback('google', 'potato', time.monotonic() - 1) == ([], None)
+    assert calls == ['google']
+
+
+def test_search_reports_a_fallback(search_app, monkeypatch):
+    scrapes(monkeypatch, {'duckduckgo'})
+    body = search_app.get('/api/search?q=potato&engine=google').get_json()
+    assert body['served_by'] == 'duckduckgo' and body['fallback'] is True
+
+
+def test_unknown_engine_served_by_its_default_is_not_a_fallback(search_app, monkeypatch):
+    scrapes(monkeypatch, {'duckduckgo'})
+    body = search_app.get('/api/search?q=potato&engine=bing').get_json()
+    assert body['served_by'] == 'duckduckgo' and body['fallback'] is False
@@ -0,0 +1,41 @@
+import json
+
+import event_stream
+from result_model import Result
+from test_html_backend import load
+
+
+def test_negotiate():
+    assert event_stream.negotiate(None) == event_stream.SSE
+    assert event_stream.negotiate('application/x-ndjson') == event_stream.NDJSON
+    assert event_stream.negotiate('application/x-ndjson, text/event-stream') == event_stream.SSE
+    assert event_stream.negotiate('text/event-stream', 'ndjson') == event_stream.NDJSON
+
+
+def test_sse_event_is_one_data_line():
+    data = {'text': 'line one\nline two', 'result': Result(title='ü', url='u', display_url='d', snippet='s')}
+    text = event_stream.encode(event_stream.SSE, 'results', data)
+    event, payload, blank, end = text.split('\n')
+    assert event == 'event: results' and blank == end == ''
+    assert json.loads(payload[len('data: '):])['result']['title'] == 'ü'
+
+
+def test_ndjson_event_is_one_line():
+    text = event_stream.encode(event_stream.NDJSON, 'summary', {'order': ['a']})
+    assert text.endswith('\n') and text.count('\n') == 1
+    assert json.loads(text) == {'event': 'summary', 'data': {'order': ['a']}}
+
+
+def test_search_stream_sends_results_then_summary(proxy_app, upstream):
+    upstream.add('/html/?q=stream%20potato', load('duckduckgo'))
+    upstream.add('/?q=stream%20potato&format=json&no_html=1&skip_disambig=1',
+                 json.dumps({'AbstractText': 'A tuber.', 'Heading': 'Potato'}), content_type='application/json')
+    response = proxy_app.get('/api/search/stream?q=stream+potato&format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    kinds = [e['event'] for e in events]
+    assert sorted(kinds[:-1]) == ['instant_answer', 'results'] and kinds[-1] == 'summary'
+    results = next(e['data'] for e in events if e['event'] == 'results')
+    summary = events[-1]['data']
+    assert summary['has_instant_answer'] and summary['served_by'] == 'duckduckgo'
+    assert summary['order'] == [r['url'] for r in results['results']]
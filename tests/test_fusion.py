@@ -0,0 +1,37 @@
+from relevance import fuse_rankings
+from result_model import Result
+
+
+def result(url, title='t'):
+    return Result(title=title, url=url, display_url='', snippet='')
+
+
+def test_results_found_by_several_engines_rank_first():
+    fused = fuse_rankings({
+        'google': [result('https://a.test/'), result('https://b.test/'), result('https://c.test/')],
+        'brave': [result('https://c.test/'), result('https://d.test/')],
+    }, k=60)
+    assert [r['url'] for r in fused] == ['https://c.test/', 'https://a.test/', 'https://b.test/', 'https://d.test/']
+    assert fused[0]['engines'] == ['google', 'brave']
+    assert fused[0]['fusion_score'] == round(1 / 63 + 1 / 61, 6)
+
+
+def test_ties_go_to_the_better_rank_and_canonical_urls_merge():
+    fused = fuse_rankings({
+        'google': [result('https://www.a.test/page/?utm_source=x', 'from google'), result('https://b.test/')],
+        'brave': [result('https://b.test/#top'), result('http://a.test/page', 'from brave')],
+    })
+    assert [r['title'] for r in fused] == ['from google', 't']
+    assert fused[0]['url'] == 'https://www.a.test/page/?utm_source=x'
+    assert all(r['engines'] == ['google', 'brave'] for r in fused)
+
+
+def test_duplicate_within_one_engine_counts_once():
+    fused = fuse_rankings({'google': [result('https://a.test/'), result('https://a.test')]}, k=0)
+    assert len(fused) == 1 and fused[0]['fusion_score'] == 1.0
+
+
+def test_inputs_are_not_modified():
+    original = result('https://a.test/')
+    fuse_rankings({'google': [original]})
+    assert 'engines' not in original and 'fusion_score' not in original
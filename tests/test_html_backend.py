@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import app
+import html_backend
+import parser as py_parser
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+
+# Result containers that also match the selectors run inside them; a
+# descendant-or-self match would pick the container itself
+SELF_MATCHING = '''<html><body>
+<a class="g" href="https://self.example/google"><h3>Google container link</h3></a>
+<div class="g VwiC3b"><h3>Google snippet container</h3><a href="https://self.example/google2">x</a></div>
+<a class="result" href="https://self.example/brave"><span class="title">Brave container link</span></a>
+<div class="snippet snippet-title"><a class="result-header" href="https://self.example/brave2">Brave</a></div>
+<a class="w-gl__result" href="https://self.example/startpage"><h3>Startpage container link</h3></a>
+<div class="result__body result__a" href="https://self.example/ddg">DDG container link</div>
+<div class="result__body result__snippet"><a class="result__a" href="https://self.example/ddg2">DDG</a></div>
+</body></html>'''
+
+EXTRACTORS = {
+    **{f'app.extract_{engine}': (func, engine) for engine, func in app.EXTRACTORS.items()},
+    'parser.parse_duckduckgo': (py_parser.parse_duckduckgo, 'duckduckgo'),
+    'parser.parse_google': (py_parser.parse_google, 'google'),
+    'parser.parse_brave': (py_parser.parse_brave, 'brave'),
+}
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, f'{name}.html'), encoding='utf-8') as f:
+        return f.read()
+
+
+def extract(monkeypatch, func, html, backend):
+    monkeypatch.setattr(html_backend, 'BACKEND', backend)
+    return [result.to_dict() for result in func(html)]
+
+
+@pytest.mark.skipif(not html_backend.HAS_LXML, reason='lxml/cssselect not installed')
+@pytest.mark.parametrize('name', sorted(EXTRACTORS))
+@pytest.mark.parametrize('page', ['fixture', 'self_matching'])
+def test_lxml_extracts_what_html_parser_does(monkeypatch, name, page):
+    func, engine = EXTRACTORS[name]
+    html = load(engine) if page == 'fixture' else SELF_MATCHING
+    expected = extract(monkeypatch, func, html, 'html.parser')
+    assert extract(monkeypatch, func, html, 'lxml') == expected
+    if page == 'fixture':
+        assert expected
+
+
+@pytest.mark.skipif(not html_backend.HAS_LXML, reason='lxml/cssselect not installed')
+def test_select_matches_descendants_only():
+    for backend in html_backend.BACKENDS:
+        soup = html_backend.parse_html('<div id="outer"><div id="inner"></div></div>', backend)
+        outer = soup.select_one('#outer')
+        assert outer.select_one('div').get('id') == 'inner'
+        assert [div.get('id') for div in outer.select('div')] == ['inner']
+
+
+@pytest.mark.skipif(not html_backend.HAS_LXML, reason='lxml/cssselect not installed')
+def test_get_text_matches_beautifulsoup():
+    html = '<p> Hello <b>potato</b><script>x()</script> world <!-- c --></p>'
+    texts = {backend: html_backend.parse_html(html, backend).select_one('p').get_text(' ', strip=True)
+             for backend in html_backend.BACKENDS}
+    assert texts['lxml'] == texts['html.parser'] == 'Hello potato world'
@@ -0,0 +1,158 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import app
+import circuit
+import http_client
+import latency
+from latency import LatencyTracker, LatencyTrackers
+
+
+class FakeResponse:
+    def __init__(self, name):
+        self.name = name
+        self.status_code = 200
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def slow_get(delays):
+    """http_client.get stand-in: the n-th call takes delays[n] seconds"""
+    calls = []
+    lock = threading.Lock()
+
+    def get(url, **kwargs):
+        with lock:
+            n = len(calls)
+            calls.append(n)
+        time.sleep(delays[n])
+        return FakeResponse(n)
+
+    return get, calls
+
+
+def tracker_with(samples):
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for seconds in samples:
+        tracker.observe(seconds)
+    return tracker
+
+
+def test_percentiles_need_min_samples():
+    tracker = tracker_with([0.1] * 9)
+    assert tracker.percentile(50) is None
+    assert tracker.timeout(15) == 15
+    tracker.observe(0.1)
+    assert tracker.percentile(50) == 0.1
+
+
+def test_timeout_follows_p99_within_bounds(monkeypatch):
+    monkeypatch.setattr(latency, 'ADAPTIVE_TIMEOUTS', True)
+    monkeypatch.setattr(latency, 'ADAPTIVE_TIMEOUT_MIN', 2)
+    monkeypatch.setattr(latency, 'ADAPTIVE_TIMEOUT_FACTOR', 3)
+    assert tracker_with([1.0] * 20).timeout(15) == 3.0
+    assert tracker_with([0.1] * 20).timeout(15) == 2
+    assert tracker_with([10.0] * 20).timeout(15) == 15
+
+
+def test_hedge_delay_is_p95(monkeypatch):
+    monkeypatch.setattr(latency, 'HEDGE_REQUESTS', True)
+    monkeypatch.setattr(latency, 'HEDGE_MIN_DELAY', 0.05)
+    assert tracker_with([0.2] * 19 + [5.0]).hedge_delay() == 5.0
+    assert tracker_with([0.2] * 100).hedge_delay() == 0.2
+    assert tracker_with([0.01] * 100).hedge_delay() == 0.05
+    monkeypatch.setattr(latency, 'HEDGE_REQUESTS', False)
+    assert tracker_with([0.2] * 100).hedge_delay() is None
+
+
+def test_fast_first_request_is_not_hedged(monkeypatch):
+    get, calls = slow_get([0.01])
+    monkeypatch.setattr(http_client, 'get', get)
+    observed = []
+    assert http_client.hedged_get('https://a.test/', 0.5, observe=observed.append).name == 0
+    assert len(calls) == 1 and len(observed) == 1
+
+
+def test_hedge_wins_and_each_request_records_its_own_latency(monkeypatch):
+    get, calls = slow_get([0.5, 0.01])
+    monkeypatch.setattr(http_client, 'get', get)
+    observed = []
+    sent = http_client.hedge_stats()['sent']
+    response = http_client.hedged_get('https://a.test/', 0.05, observe=observed.append)
+    assert response.name == 1
+    assert http_client.hedge_stats()['sent'] == sent + 1
+    deadline = time.perf_counter() + 2
+    while len(observed) < 2 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    # The slow original is recorded as slow, not as the hedge's fast time
+    assert sorted(observed)[0] < 0.1 and sorted(observed)[1] >= 0.5
+
+
+def test_time_queued_for_a_thread_does_not_trigger_a_hedge(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(http_client, '_hedge_pool', pool)
+    get, calls = slow_get([0.01])
+    monkeypatch.setattr(http_client, 'get', get)
+    pool.submit(time.sleep, 0.3)
+    sent = http_client.hedge_stats()['sent']
+    assert http_client.hedged_get('https://a.test/', 0.05).name == 0
+    assert http_client.hedge_stats()['sent'] == sent
+    assert len(calls) == 1
+    pool.shutdown()
+
+
+def test_timeout_recovers_when_a_host_slows_down(monkeypatch):
+    monkeypatch.setattr(latency, 'ADAPTIVE_TIMEOUTS', True)
+    monkeypatch.setattr(latency, 'ADAPTIVE_TIMEOUT_MIN', 0.02)
+    monkeypatch.setattr(latency, 'ADAPTIVE_TIMEOUT_FACTOR', 3)
+    monkeypatch.setattr(latency, 'HEDGE_REQUESTS', False)
+    monkeypatch.setattr(latency, 'trackers', LatencyTrackers())
+    monkeypatch.setattr(circuit, 'breakers', circuit.CircuitBreakers(min_requests=1000))
+    tracker = latency.trackers.get('https://slow.test/')
+    for _ in range(50):
+        tracker.observe(0.005)
+    assert tracker.timeout(15) == 0.02
+
+    def get(url, timeout, **kwargs):
+        # The host now takes 0.3s to answer
+        if timeout < 0.3:
+            time.sleep(timeout)
+            raise requests.Timeout()
+        return FakeResponse(0)
+
+    monkeypatch.setattr(http_client, 'get', get)
+    timeouts = []
+    response = None
+    while response is None and len(timeouts) < 10:
+        timeouts.append(tracker.timeout(15))
+        response = app.fetch_with_retry('https://slow.test/', retries=1)
+    assert response is not None
+    # Each timeout counts as a sample at least that long, so the timeout grows
+    assert timeouts == sorted(timeouts) and timeouts[-1] >= 0.3
+
+
+def test_streamed_reads_keep_the_callers_timeout(monkeypatch):
+    monkeypatch.setattr(latency, 'ADAPTIVE_TIMEOUTS', True)
+    monkeypatch.setattr(latency, 'trackers', LatencyTrackers())
+    tracker = latency.trackers.get('https://media.test/')
+    for _ in range(50):
+        tracker.observe(0.1)
+    seen = []
+    monkeypatch.setattr(http_client, 'get', lambda url, timeout, **kwargs: seen.append(timeout) or FakeResponse(0))
+    app.fetch_with_retry('https://media.test/a.mp4', timeout=15, stream=True)
+    app.fetch_with_retry('https://media.test/page', timeout=15)
+    assert seen == [(tracker.timeout(15), 15), tracker.timeout(15)]
+
+
+def test_least_recently_used_hosts_are_dropped():
+    trackers = LatencyTrackers(max_hosts=2)
+    a = trackers.get('https://a.test/x')
+    trackers.get('https://b.test/x')
+    assert trackers.get('https://a.test/y') is a
+    trackers.get('https://c.test/x')
+    assert sorted(trackers.stats()) == ['a.test', 'c.test']
@@ -0,0 +1,55 @@
+from page_cache import PageCache
+
+HEADERS = {'ETag': '"v1"', 'Content-Type': 'text/html'}
+
+
+def rewrite(chunks):
+    for chunk in chunks:
+        yield chunk.decode().upper()
+
+
+def record(cache, status=200, headers=HEADERS, ranged=False):
+    return ''.join(cache.record('https://site.test/', status, headers, [b'<p>a', b'b</p>'], rewrite, ranged))
+
+
+def test_whole_page_is_stored_after_streaming():
+    cache = PageCache()
+    assert record(cache) == '<P>AB</P>'
+    entry = cache.lookup('https://site.test/')
+    assert entry['html'] == '<P>AB</P>'
+    assert cache.unchanged(entry, HEADERS)
+    assert not cache.unchanged(entry, {'ETag': '"v2"'})
+
+
+def test_partial_and_ranged_pages_are_not_stored():
+    cache = PageCache()
+    record(cache, status=206, headers=dict(HEADERS, **{'Content-Range': 'bytes 0-8/100'}))
+    record(cache, ranged=True)
+    record(cache, status=203)
+    assert cache.lookup('https://site.test/') is None
+
+
+def test_uncacheable_pages_are_not_stored():
+    cache = PageCache()
+    record(cache, headers=dict(HEADERS, **{'Cache-Control': 'private'}))
+    assert cache.lookup('https://site.test/') is None
+
+
+def test_oversized_pages_are_not_stored():
+    cache = PageCache(max_page_bytes=4)
+    record(cache)
+    assert cache.lookup('https://site.test/') is None
+
+
+def test_validator_less_pages_compare_by_body_hash():
+    cache = PageCache()
+    list(cache.record('https://site.test/', 200, {}, [b'<p>a', b'b</p>'], rewrite))
+    entry = cache.lookup('https://site.test/')
+    assert cache.same_body(entry, b'<p>ab</p>')
+    assert not cache.same_body(entry, b'<p>ac</p>')
+
+
+def test_is_ranged():
+    assert PageCache.is_ranged({'Range': 'bytes=0-1'})
+    assert PageCache.is_ranged({'If-Range': '"v1"'})
+    assert not PageCache.is_ranged({})
@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import parser as py_parser
+from result_model import Result
+
+
+def page_of(page, count=10):
+    return [Result(title=f'{page}-{i}', url=f'https://r.test/{page}/{i}', display_url='r.test', snippet='s')
+            for i in range(count)]
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    """Stub fetch_page on a private pool; `blocked` pages wait for `release`"""
+    release = threading.Event()
+    state = {'calls': [], 'blocked': set(), 'release': release, 'running': 0, 'most_running': 0}
+    lock = threading.Lock()
+
+    def fetch_page(engine, query, page):
+        with lock:
+            state['calls'].append(page)
+            state['running'] += 1
+            state['most_running'] = max(state['most_running'], state['running'])
+        try:
+            if page in state['blocked']:
+                release.wait(5)
+            else:
+                time.sleep(0.01)
+            return page_of(page)
+        finally:
+            with lock:
+                state['running'] -= 1
+
+    pool = ThreadPoolExecutor(max_workers=8)
+    monkeypatch.setattr(py_parser, 'fetch_page', fetch_page)
+    monkeypatch.setattr(py_parser, 'page_pool', pool)
+    monkeypatch.setattr(py_parser, 'TARGET_RESULTS', 1000)
+    monkeypatch.setattr(py_parser, 'PAGE_FANOUT', 2)
+    yield state
+    release.set()
+    pool.shutdown(wait=True)
+
+
+def test_every_page_is_fetched_at_most_fanout_at_a_time(pages):
+    fetched = dict(py_parser.iter_pages('duckduckgo', 'q', 5))
+    assert sorted(fetched) == [0, 1, 2, 3, 4]
+    assert pages['most_running'] <= 2
+    assert [r['title'] for r in py_parser.fetch_pages('duckduckgo', 'q', 3)][::10] == ['0-0', '1-0', '2-0']
+
+
+def test_stops_once_enough_unique_results_are_in(pages, monkeypatch):
+    monkeypatch.setattr(py_parser, 'TARGET_RESULTS', 10)
+    monkeypatch.setattr(py_parser, 'PAGE_FANOUT', 1)
+    assert [page for page, _ in py_parser.iter_pages('duckduckgo', 'q', 5)] == [0]
+    assert pages['calls'] == [0]
+
+
+def test_stops_at_the_page_deadline(pages, monkeypatch):
+    monkeypatch.setattr(py_parser, 'PAGE_DEADLINE', 0.2)
+    pages['blocked'].add(1)
+    started = time.monotonic()
+    assert [page for page, _ in py_parser.iter_pages('duckduckgo', 'q', 2)] == [0]
+    assert time.monotonic() - started < 2
+
+
+def test_pages_not_started_are_cancelled(pages, monkeypatch):
+    monkeypatch.setattr(py_parser, 'page_pool', ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(py_parser, 'TARGET_RESULTS', 10)
+    monkeypatch.setattr(py_parser, 'PAGE_FANOUT', 3)
+    # Page 1 holds the only worker, so page 2 is still queued when page 0 meets the target
+    pages['blocked'].add(1)
+    assert [page for page, _ in py_parser.iter_pages('duckduckgo', 'q', 3)] == [0]
+    pages['release'].set()
+    py_parser.page_pool.shutdown(wait=True)
+    assert pages['calls'] == [0, 1]
+
+
+def test_failed_pages_are_skipped(pages, monkeypatch):
+    fetch = py_parser.fetch_page
+
+    def flaky(engine, query, page):
+        if page == 1:
+            raise OSError('reset')
+        return fetch(engine, query, page)
+
+    monkeypatch.setattr(py_parser, 'fetch_page', flaky)
+    assert sorted(page for page, _ in py_parser.iter_pages('duckduckgo', 'q', 3)) == [0, 2]
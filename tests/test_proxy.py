@@ -0,0 +1,73 @@
+import base64
+import time
+
+PAGE = '<html><head><title>Potato</title></head><body><a href="/next">next</a>' + 'x' * 500 + '</body></html>'
+
+
+def proxied(url):
+    return '/api/proxy?url=' + base64.b64encode(url.encode()).decode()
+
+
+def test_html_is_rewritten(proxy_app, upstream):
+    upstream.add('/page', PAGE)
+    response = proxy_app.get(proxied('https://site.test/page'))
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'id="pxbar"' in body
+    assert proxied('https://site.test/next') in body
+
+
+def test_html_range_is_relayed_unmodified(proxy_app, upstream):
+    upstream.add('/page', PAGE)
+    response = proxy_app.get(proxied('https://site.test/page'), headers={'Range': 'bytes=0-99'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 0-99/{len(PAGE)}'
+    assert response.get_data(as_text=True) == PAGE[:100]
+
+
+def test_asset_range_is_forwarded(proxy_app, upstream):
+    upstream.add('/app.js', 'console.log(1);' * 10, content_type='application/javascript')
+    response = proxy_app.get(proxied('https://site.test/app.js'), headers={'Range': 'bytes=5-9'})
+    assert response.status_code == 206
+    assert response.get_data(as_text=True) == ('console.log(1);' * 10)[5:10]
+    assert upstream.requests[-1][1]['Range'] == 'bytes=5-9'
+
+
+def test_unchanged_page_is_served_from_the_page_cache(proxy_app, upstream):
+    upstream.add('/page', PAGE, ETag='"v1"')
+    first = proxy_app.get(proxied('https://site.test/page'))
+    assert 'X-Cache' not in first.headers
+    page = first.get_data()
+    second = proxy_app.get(proxied('https://site.test/page'))
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_data() == page
+
+
+def test_range_request_does_not_fill_the_page_cache(proxy_app, upstream):
+    upstream.add('/page', PAGE, ETag='"v1"')
+    proxy_app.get(proxied('https://site.test/page'), headers={'Range': 'bytes=0-99'}).get_data()
+    response = proxy_app.get(proxied('https://site.test/page'))
+    assert response.status_code == 200
+    assert 'X-Cache' not in response.headers
+    assert response.get_data(as_text=True).endswith('x' * 500 + '</body></html>')
+
+
+def test_page_fetched_for_a_range_request_is_not_stored(proxy_app, upstream):
+    # Upstream ignores Range and sends the whole page; it is rewritten but not kept
+    upstream.add('/page', PAGE, ranges=False, ETag='"v1"')
+    ranged = proxy_app.get(proxied('https://site.test/page'), headers={'Range': 'bytes=0-99'})
+    assert ranged.status_code == 200 and 'id="pxbar"' in ranged.get_data(as_text=True)
+    assert 'X-Cache' not in proxy_app.get(proxied('https://site.test/page')).headers
+
+
+def test_followers_do_not_wait_for_the_leaders_client(proxy_app, upstream):
+    upstream.add('/page', PAGE, ETag='"v1"')
+    # The leader's client hasn't read a byte; the page is still fetched and stored
+    leader = proxy_app.get(proxied('https://site.test/page'))
+    started = time.monotonic()
+    follower = proxy_app.get(proxied('https://site.test/page'))
+    assert time.monotonic() - started < 5
+    assert follower.headers['X-Cache'] == 'HIT'
+    assert follower.get_data() == leader.get_data()
+    # Revalidated against the stored copy rather than fetched again
+    assert upstream.requests[-1][1]['If-None-Match'] == '"v1"'
@@ -0,0 +1,38 @@
+import pytest
+
+import parser as py_parser
+import relevance
+from result_model import Result
+from test_html_backend import load
+
+
+def result(title, snippet='', url='https://site.test/'):
+    return Result(title=title, url=url, display_url='site.test', snippet=snippet)
+
+
+@pytest.mark.parametrize('engine', ['duckduckgo', 'google', 'brave'])
+def test_classic_scores_match_calculate_relevance(engine):
+    results = py_parser.parse_page(engine, load(engine))
+    for keywords in (['potato'], ['Potato', 'homework'], ['help', 'HELP'], ['x']):
+        expected = [py_parser.calculate_relevance(r, keywords) for r in results]
+        assert relevance.classic_scores(results, keywords) == expected
+
+
+def test_classic_exact_title_bonus_counts_repeated_keywords():
+    r = result('potato')
+    assert relevance.classic_scores([r], ['potato', 'POTATO']) == [py_parser.calculate_relevance(r, ['potato', 'POTATO'])]
+
+
+def test_bm25_ranks_focused_documents_first():
+    results = [
+        result('Cooking', 'a long snippet about many things including one potato mention and more words'),
+        result('Potato potato', 'potato farming'),
+        result('Unrelated', 'nothing to see'),
+    ]
+    scores = relevance.score_results(results, ['potato'], mode='bm25')
+    assert scores[1] > scores[0] > scores[2] == 0
+
+
+def test_bm25_handles_empty_input():
+    assert relevance.bm25_scores([], ['potato']) == []
+    assert relevance.bm25_scores([result('a')], []) == [0.0]
@@ -0,0 +1,70 @@
+import pytest
+
+import app
+import result_model
+from result_model import Result
+from test_html_backend import load
+
+
+def payload(results):
+    return {
+        'success': True,
+        'query': 'Pötato "homework" <help>',
+        'engine': 'all',
+        'served_by': None,
+        'fallback': False,
+        'has_instant_answer': True,
+        'instant_answer': {'has_answer': True, 'answer': 'A tuber – 🥔', 'type': 'abstract'},
+        'results': results,
+        'count': len(results),
+        'engines': {'google': {'outcome': 'ok', 'ms': 12.5, 'results': 3}},
+    }
+
+
+def jsonify_text(value):
+    with app.app.app_context():
+        return app.jsonify(value).get_data(as_text=True)
+
+
+def fixture_results():
+    results = app.extract_duckduckgo(load('duckduckgo'))
+    results[0]['relevance_score'] = 42
+    results[1]['engines'] = ['google', 'brave']
+    results[1]['fusion_score'] = 0.032787
+    results[2]['is_instant'] = True
+    return results
+
+
+def test_dumps_matches_jsonify_byte_for_byte():
+    results = fixture_results()
+    assert result_model.dumps(payload(results)) + '\n' == jsonify_text(payload(results))
+    # Cached encodings are dropped when a field changes
+    results[0]['title'] = 'Changed'
+    assert result_model.dumps(payload(results)) + '\n' == jsonify_text(payload(results))
+
+
+@pytest.mark.parametrize('value', [[], {}, {'results': []}, [Result(title='a', url='b', display_url='c', snippet='d')],
+                                   'text', 1.5, None])
+def test_dumps_matches_jsonify_for_other_shapes(value):
+    assert result_model.dumps(value) + '\n' == jsonify_text(value)
+
+
+def test_json_response_matches_jsonify():
+    results = fixture_results()
+    with app.app.app_context():
+        assert app.json_response(payload(results)).get_data() == app.jsonify(payload(results)).get_data()
+
+
+def test_result_behaves_like_the_old_dict():
+    r = Result(title='t', url='u', display_url='d', snippet='s', engine='google')
+    assert r['engine'] == 'google' and r.get('is_instant') is None
+    assert 'is_instant' not in r and 'engine' in r
+    assert r == {'title': 't', 'url': 'u', 'display_url': 'd', 'snippet': 's', 'engine': 'google'}
+    with pytest.raises(KeyError):
+        r['is_instant']
+    with pytest.raises(KeyError):
+        r['bogus'] = 1
+    clone = r.copy()
+    clone['engine'] = 'brave'
+    assert r['engine'] == 'google'
+    assert list(r.keys()) == ['title', 'url', 'display_url', 'snippet', 'engine']
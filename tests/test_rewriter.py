@@ -0,0 +1,68 @@
+from requests.structures import CaseInsensitiveDict
+
+from rewriter import ProxyRewriter, proxy_url, rewrite_stream
+
+BASE = 'https://site.test/dir/page'
+
+
+class FakeResponse:
+    def __init__(self, content_type='text/html', encoding=None):
+        self.headers = CaseInsensitiveDict({'Content-Type': content_type})
+        self.encoding = encoding
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def rewrite(html, bar=''):
+    rewriter = ProxyRewriter(BASE, bar)
+    return rewriter.feed(html) + rewriter.close()
+
+
+def test_url_attributes_go_through_the_proxy():
+    out = rewrite('<a href="../up?a=1&amp;b=2">x</a><img src="/i.png"><form action="post">')
+    assert f'href="{proxy_url(BASE, "../up?a=1&b=2")}"' in out
+    assert proxy_url(BASE, '../up?a=1&b=2') == proxy_url(BASE, 'https://site.test/up?a=1&b=2')
+    assert f'src="{proxy_url(BASE, "/i.png")}"' in out
+    # Only the rewritten tags are touched
+    assert '<form action="post">' in out
+
+
+def test_special_links_are_left_alone():
+    html = '<a href="#top">a</a><a href="mailto:x@y.test">b</a><img src="data:image/png;base64,AA=="><a href="javascript:void(0)">c</a>'
+    assert rewrite(html) == html
+
+
+def test_other_markup_passes_through_as_written():
+    html = ('<!DOCTYPE html><html><head><?xml-stylesheet href="a"?><!-- note --></head>'
+            '<p class=x>&amp; &#169; &copy; <b>bold</b></p>'
+            '<svg><![CDATA[x < y]]><style><![CDATA[.a > .b { fill: red }]]></style></svg><br/></html>')
+    assert rewrite(html) == html
+
+
+def test_bar_goes_right_after_body_once():
+    out = rewrite('<html><body class="x"><p>hi</p><body></html>', bar='<div id="pxbar"></div>')
+    assert out == '<html><body class="x"><div id="pxbar"></div><p>hi</p><body></html>'
+
+
+def test_output_does_not_depend_on_chunking():
+    html = '<html><body><a href="/a">a</a><![CDATA[x]]><img src="b.png"/></body></html>'
+    whole = rewrite(html)
+    rewriter = ProxyRewriter(BASE)
+    pieces = ''.join(rewriter.feed(html[i:i + 3]) for i in range(0, len(html), 3)) + rewriter.close()
+    assert pieces == whole
+
+
+def test_stream_decodes_with_the_pages_charset():
+    # The charset is sniffed from the first chunk
+    page = '<html><head><meta charset="iso-8859-1"></head><body>café</body></html>'.encode('latin-1')
+    response = FakeResponse()
+    assert ''.join(rewrite_stream(response, BASE, body=[page[:50], page[50:]])).endswith('<body>café</body></html>')
+    assert response.closed
+
+
+def test_stream_keeps_characters_split_across_chunks():
+    page = '<p>naïve café</p>'.encode('utf-8')
+    chunks = [page[i:i + 3] for i in range(0, len(page), 3)]
+    assert ''.join(rewrite_stream(FakeResponse('text/html; charset=utf-8', 'utf-8'), BASE, body=chunks)) == '<p>naïve café</p>'
@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+from result_model import Result
+
+
+def results_for(engine):
+    return [Result(title='t', url=f'https://{engine}.test/', display_url=f'{engine}.test', snippet='s', engine=engine)]
+
+
+def answer(query):
+    return {'has_answer': True, 'answer': f'{query} is a tuber', 'title': query, 'source': 'Test', 'url': ''}
+
+
+def slow(seconds, value):
+    def run(*args):
+        time.sleep(seconds)
+        return value(*args)
+    return run
+
+
+def test_answer_and_results_are_fetched_concurrently(search_app, monkeypatch):
+    monkeypatch.setattr(app, 'scrape_engine', slow(0.3, lambda engine, query: results_for(engine)))
+    monkeypatch.setattr(app, 'get_duckduckgo_instant_answer', slow(0.3, answer))
+    started = time.monotonic()
+    body = search_app.get('/api/search?q=potato').get_json()
+    assert time.monotonic() - started < 0.55
+    assert body['has_instant_answer'] and body['count'] == 2
+
+
+def test_answer_may_trail_the_results_until_the_deadline(search_app, monkeypatch):
+    monkeypatch.setattr(app, 'scrape_engine', lambda engine, query: results_for(engine))
+    monkeypatch.setattr(app, 'get_duckduckgo_instant_answer', slow(0.7, answer))
+    monkeypatch.setattr(app, 'SEARCH_DEADLINE', 3)
+    monkeypatch.setattr(app, 'INSTANT_ANSWER_GRACE', None)
+    assert search_app.get('/api/search?q=potato').get_json()['has_instant_answer']
+
+
+def test_grace_caps_the_wait_for_the_answer(search_app, monkeypatch):
+    monkeypatch.setattr(app, 'scrape_engine', lambda engine, query: results_for(engine))
+    monkeypatch.setattr(app, 'get_duckduckgo_instant_answer', slow(0.7, answer))
+    monkeypatch.setattr(app, 'SEARCH_DEADLINE', 3)
+    monkeypatch.setattr(app, 'INSTANT_ANSWER_GRACE', 0.1)
+    started = time.monotonic()
+    body = search_app.get('/api/search?q=potato').get_json()
+    assert time.monotonic() - started < 0.5
+    assert not body['has_instant_answer'] and body['count'] == 1
+
+
+def test_response_is_sent_at_the_deadline(search_app, monkeypatch):
+    monkeypatch.setattr(app, 'scrape_engine', slow(1, lambda engine, query: results_for(engine)))
+    monkeypatch.setattr(app, 'get_duckduckgo_instant_answer', slow(1, answer))
+    monkeypatch.setattr(app, 'SEARCH_DEADLINE', 0.2)
+    started = time.monotonic()
+    body = search_app.get('/api/search?q=potato').get_json()
+    assert time.monotonic() - started < 0.7
+    assert body['count'] == 0 and not body['has_instant_answer']
+
+
+def test_work_still_queued_at_the_deadline_is_dropped(search_app, monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(app, 'search_pool', pool)
+    monkeypatch.setattr(app, 'SEARCH_DEADLINE', 0.2)
+    calls = []
+    monkeypatch.setattr(app, 'scrape_engine', lambda engine, query: calls.append(engine) or results_for(engine))
+    monkeypatch.setattr(app, 'get_duckduckgo_instant_answer', lambda query: calls.append('answer') or answer(query))
+    # Saturated: the only worker is busy past the deadline
+    busy = threading.Event()
+    pool.submit(busy.wait, 5)
+    for path in ('/api/search?q=potato', '/api/search/stream?q=tuber'):
+        assert search_app.get(path).get_data()
+    busy.set()
+    pool.shutdown(wait=True)
+    assert calls == []
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight, async_read_ahead, read_ahead
+
+
+def test_followers_share_the_leaders_result():
+    group = SingleFlight('test')
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'page'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do('k', fetch)))
+    leader.start()
+    while not group._flights:
+        time.sleep(0.001)
+    followers = [threading.Thread(target=lambda: results.append(group.do('k', fetch))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    while group.followers < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+    assert calls == [1]
+    assert sorted(results) == [('page', False)] * 3 + [('page', True)]
+    assert group.stats() == {'in_flight': 0, 'leaders': 1, 'coalesced': 3, 'wait_timeouts': 0}
+
+
+def test_leader_error_reaches_followers():
+    group = SingleFlight('test')
+    flight, _ = group.begin('k')
+    group.end('k', flight, error=ValueError('upstream'))
+    follower, leader = group.begin('k')
+    assert leader and follower is not flight
+    assert flight.wait(0) and isinstance(flight.error, ValueError)
+
+
+def test_follower_gives_up_on_a_stuck_leader():
+    group = SingleFlight('test', timeout=0.05)
+    stuck, _ = group.begin('k')
+    started = time.monotonic()
+    assert group.do('k', lambda: 'direct') == ('direct', True)
+    assert time.monotonic() - started < 1
+    assert group.stats()['wait_timeouts'] == 1
+    # The stuck flight no longer queues anyone
+    assert group.do('k', lambda: 'again') == ('again', True)
+    group.end('k', stuck, 'late')
+
+
+def test_async_followers_share_the_leaders_result():
+    group = AsyncSingleFlight('test')
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'page'
+
+    async def main():
+        return await asyncio.gather(*(group.do('k', fetch) for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert sorted(results) == [('page', False)] * 3 + [('page', True)]
+
+
+def test_async_follower_gives_up_on_a_stuck_leader():
+    group = AsyncSingleFlight('test', timeout=0.05)
+
+    async def direct():
+        return 'direct'
+
+    async def main():
+        stuck, _ = group.begin('k')
+        result = await group.do('k', direct)
+        group.end('k', stuck, 'late')
+        return result
+
+    assert asyncio.run(main()) == ('direct', True)
+    assert group.stats()['wait_timeouts'] == 1
+
+
+def test_read_ahead_runs_ahead_of_the_consumer():
+    finished = threading.Event()
+
+    def chunks():
+        for i in range(5):
+            yield b'%d' % i
+        finished.set()
+
+    body = read_ahead(chunks(), max_bytes=100)
+    assert next(body) == b'0'
+    # The rest is pulled without the consumer asking for it
+    assert finished.wait(5)
+    assert list(body) == [b'1', b'2', b'3', b'4']
+
+
+def test_read_ahead_stops_when_the_consumer_closes():
+    closed = threading.Event()
+
+    def chunks():
+        try:
+            while True:
+                yield b'x'
+        finally:
+            closed.set()
+
+    body = read_ahead(chunks(), max_bytes=10)
+    assert next(body) == b'x'
+    body.close()
+    assert closed.wait(5)
+
+
+def test_read_ahead_raises_producer_errors():
+    def chunks():
+        yield b'a'
+        raise OSError('reset')
+
+    body = read_ahead(chunks(), max_bytes=10)
+    assert next(body) == b'a'
+    with pytest.raises(OSError):
+        next(body)
+
+
+def test_async_read_ahead():
+    finished = []
+
+    async def chunks():
+        for i in range(5):
+            yield b'%d' % i
+        finished.append(1)
+
+    async def main():
+        body = async_read_ahead(chunks(), max_bytes=100)
+        first = await body.__anext__()
+        await asyncio.sleep(0.01)
+        assert finished
+        return [first] + [chunk async for chunk in body]
+
+    assert asyncio.run(main()) == [b'0', b'1', b'2', b'3', b'4']
@@ -0,0 +1,111 @@
+"""
+Per-request phase timing
+Phases (fetch, parse, rewrite, ...) accumulate into a RequestTimer that
+renders a Server-Timing header and, past SLOW_REQUEST_MS, logs one line
+with the full breakdown. The current request's timer lives in a context
+variable so helpers deep in the call stack - and pool threads started with
+contextvars.copy_context() - can add to it without it being passed around.
+"""
+
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+# Log requests slower than this (milliseconds); 0 disables the log
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '0'))
+
+_current = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.phases = {}  # name -> seconds, in first-seen order
+        self.notes = {}   # name -> description (no duration)
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def note(self, name, desc):
+        with self._lock:
+            self.notes[name] = desc
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        """Server-Timing value for the phases recorded so far"""
+        with self._lock:
+            parts = [f'{name};desc="{desc}"' for name, desc in self.notes.items()]
+            parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.phases.items()]
+        parts.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(parts)
+
+    def finish(self):
+        """Request fully sent: log it if it was slow"""
+        if self._finished:
+            return
+        self._finished = True
+        total = self.elapsed() * 1000
+        if SLOW_REQUEST_MS and total >= SLOW_REQUEST_MS:
+            with self._lock:
+                breakdown = ' '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in self.phases.items())
+                notes = ' '.join(f'{name}={desc}' for name, desc in self.notes.items())
+            print(f'🐢 Slow request {self.label} {total:.1f}ms: {breakdown} {notes}'.rstrip(), flush=True)
+
+
+def start(label):
+    """Begin timing a request in the current context"""
+    timer = RequestTimer(label)
+    _current.set(timer)
+    return timer
+
+
+def current():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a block into the current request's timer, if any"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+def note(name, desc):
+    timer = _current.get()
+    if timer is not None:
+        timer.note(name, desc)
+
+
+def timed_iter(iterable, timer, name):
+    """Yield from iterable, adding the time spent waiting on it to `name`"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            if timer is not None:
+                timer.add(name, time.perf_counter() - start)
+        yield item